@@ -0,0 +1,158 @@
+import asyncio
+import os
+import random
+import time
+
+import httpx
+from dotenv import load_dotenv
+from loguru import logger
+
+from metrics import API_SECONDS, observe_api_wait
+
+load_dotenv()
+
+
+class MatchRankingClient:
+    """
+    赛事后台 match_ranking 接口的客户端。
+
+    - 复用 keep-alive 连接池，连接/读取分别设置超时
+    - 连接失败、超时或 5xx 时按指数退避 + 随机抖动重试，重试次数有上限
+    - 结果在 cache_ttl 秒内直接复用，同一时刻的并发请求共享一次拉取；
+      缓存过期后带上 If-None-Match 重新请求，后台返回 304 时沿用缓存数据
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.2,
+        cache_ttl: float = 2.0,
+        max_connections: int = 10,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=read_timeout,
+            pool=connect_timeout,
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+        )
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cache_ttl = cache_ttl
+        self.transport = transport
+
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._inflight: asyncio.Task | None = None
+        self._data: list[dict] | None = None
+        self._etag: str | None = None
+        self._fetched_at = 0.0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # httpx.AsyncClient 绑定在创建它的事件循环上，check() 每次都会新建事件循环
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._discard_client()
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport,
+            )
+            self._loop = loop
+            self._inflight = None
+        return self._client
+
+    def _discard_client(self):
+        """
+        关闭绑定在旧事件循环上的客户端，释放其连接池。
+        连接只能在旧循环上关闭：旧循环仍在其它线程运行时提交到该循环；
+        已经关闭时无法再关闭连接，因此在事件循环结束前应调用 aclose()（见 graph.check）
+        """
+        client, loop = self._client, self._loop
+        self._client = None
+        if client is None or client.is_closed:
+            return
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            logger.warning("match_ranking 客户端所在的事件循环已结束，未能关闭其连接")
+
+    async def fetch_match_ranking(self) -> list[dict]:
+        if (
+            self._data is not None
+            and time.monotonic() - self._fetched_at < self.cache_ttl
+        ):
+            return self._data
+
+        self._get_client()
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+        started = time.perf_counter()
+        try:
+            return await asyncio.shield(self._inflight)
+        finally:
+            observe_api_wait(time.perf_counter() - started)
+
+    async def _refresh(self) -> list[dict]:
+        client = self._get_client()
+        headers = {"If-None-Match": self._etag} if self._etag else {}
+
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                response = await client.get("/match_ranking", headers=headers)
+                API_SECONDS.labels(outcome=str(response.status_code)).observe(
+                    time.perf_counter() - started
+                )
+                if response.status_code == 304 and self._data is not None:
+                    self._fetched_at = time.monotonic()
+                    return self._data
+                response.raise_for_status()
+                break
+            except httpx.HTTPError as e:
+                if not isinstance(e, httpx.HTTPStatusError):
+                    API_SECONDS.labels(outcome="error").observe(
+                        time.perf_counter() - started
+                    )
+                retryable = not isinstance(e, httpx.HTTPStatusError) or (
+                    e.response.status_code >= 500
+                )
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.backoff * 2**attempt)
+                logger.warning(
+                    f"请求 match_ranking 失败({e!r})，{delay:.2f}s 后第 {attempt + 1} 次重试"
+                )
+                await asyncio.sleep(delay)
+
+        self._data = response.json()["data"]
+        self._etag = response.headers.get("ETag")
+        self._fetched_at = time.monotonic()
+        return self._data
+
+    async def aclose(self):
+        if self._client is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._client.aclose()
+                self._client = None
+            else:
+                self._discard_client()
+            self._inflight = None
+
+
+match_ranking_client = MatchRankingClient(
+    base_url=os.getenv("MATCH_RANKING_API_BASE_URL", "http://139.196.72.70:8111"),
+    connect_timeout=float(os.getenv("MATCH_RANKING_API_CONNECT_TIMEOUT", "3")),
+    read_timeout=float(os.getenv("MATCH_RANKING_API_READ_TIMEOUT", "10")),
+    max_retries=int(os.getenv("MATCH_RANKING_API_MAX_RETRIES", "2")),
+    cache_ttl=float(os.getenv("MATCH_RANKING_API_CACHE_TTL", "2")),
+)
@@ -0,0 +1,441 @@
+"""
+离线性能基准：不调用 LLM、不连接线上数据库和赛事后台接口。
+
+- LLM 替换为假模型，按配置的延迟返回预先录制（或自动生成）的 GameResult
+- 数据库使用 SQLite 临时库（或 --db-url 指定的容器内 MySQL），预先写入一个赛季的 MatchRanking
+- match_ranking 接口由本地 HTTP 服务模拟
+
+    python benchmark.py
+    python benchmark.py --teams 16,20 --concurrency 1,4,8 --runs 40 --output bench.json
+    python benchmark.py --baseline bench_main.json --max-regression 0.2
+        与基线结果比较，任一场景端到端 p95 变慢超过 20% 时以非零状态退出，可用于 CI
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p * len(ordered)) - 1)]
+
+
+def summarize(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+        "mean": sum(values) / len(values) if values else 0.0,
+    }
+
+
+def team_names(team_count: int) -> list[str]:
+    return [f"Team {index:02d}" for index in range(1, team_count + 1)]
+
+
+def make_screenshot(seed: int) -> bytes:
+    """生成与真实截图尺寸相近、内容各不相同的图片，避免命中解析缓存"""
+    rng = random.Random(seed)
+    image = Image.new("RGB", (1920, 1080), tuple(rng.randrange(256) for _ in range(3)))
+    for _ in range(20):
+        x, y = rng.randrange(1800), rng.randrange(1000)
+        image.paste(
+            tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 120, y + 80)
+        )
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def seed_season(bind, stages: int, matches_per_stage: int, team_count: int):
+    """
+    写入一个赛季的 MatchRanking：每个赛段若干场比赛，每场所有队伍各一行；
+    队伍和选手同时登记到 team、player 表，供名字索引使用
+    """
+    from sqlalchemy.orm import Session
+
+    from models import OCR, MatchRanking, Player, PlayerResultStats, Team
+
+    for model in (MatchRanking, Team, Player, OCR, PlayerResultStats):
+        model.__table__.create(bind, checkfirst=True)
+    rng = random.Random(0)
+    names = team_names(team_count)
+    start = datetime(2025, 1, 1)
+    with Session(bind) as session:
+        for team_code, team_name in enumerate(names, start=1):
+            session.merge(
+                Team(team_code=team_code, team_id=str(team_code), team_name=team_name)
+            )
+            for index in range(1, 5):
+                session.merge(
+                    Player(
+                        uid=f"{team_code}_{index}",
+                        player_name=f"{team_name} P{index}",
+                        team_code=team_code,
+                        team_name=team_name,
+                    )
+                )
+        for stage in range(1, stages + 1):
+            for match in range(matches_per_stage):
+                created_at = start + timedelta(days=stage * 30, hours=match)
+                for ingame_rank, team_name in enumerate(rng.sample(names, len(names))):
+                    kill_pts = rng.randint(0, 12)
+                    place_pts = max(0, 12 - ingame_rank * 2)
+                    session.add(
+                        MatchRanking(
+                            war_id=f"bench_{stage}_{match}",
+                            team_name=team_name,
+                            stage=stage,
+                            rank=ingame_rank + 1,
+                            ingame_rank=ingame_rank + 1,
+                            kill_pts=kill_pts,
+                            place_pts=place_pts,
+                            total_pts=kill_pts + place_pts,
+                            created_at=created_at,
+                            updated_at=created_at,
+                        )
+                    )
+        session.commit()
+
+
+def synthetic_game_results(team_count: int, count: int) -> list[str]:
+    """没有录制数据时，按队伍数生成 GameResult JSON"""
+    from schemas import GameResult, PlayerResult, TeamResult, empty_tiebreak_stats
+
+    rng = random.Random(team_count)
+    results = []
+    for _ in range(count):
+        teams = []
+        for ranking, team_name in enumerate(
+            rng.sample(team_names(team_count), team_count)
+        ):
+            players = [
+                PlayerResult(
+                    player_name=f"{team_name} P{index}", elims=rng.randint(0, 4)
+                )
+                for index in range(1, 5)
+            ]
+            teams.append(
+                TeamResult(
+                    team_name=team_name,
+                    ranking=ranking + 1,
+                    total_elims=sum(player.elims for player in players),
+                    players=players,
+                    tiebreak_stats=empty_tiebreak_stats(),
+                )
+            )
+        results.append(GameResult(teams=teams).model_dump_json())
+    return results
+
+
+class FakeGameResultModel:
+    """代替 llm.with_structured_output(GameResult)，按顺序循环返回录制的结果"""
+
+    def __init__(self, recordings: list[str], latency: float, jitter: float):
+        from schemas import GameResult
+
+        self.results = [GameResult.model_validate_json(item) for item in recordings]
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        from schemas import GameResult
+
+        result = self.results[self.calls % len(self.results)]
+        self.calls += 1
+        await asyncio.sleep(
+            max(0.0, self.latency + random.uniform(-1, 1) * self.jitter)
+        )
+        # 每次返回副本，rank_teams 会修改结果
+        return GameResult.model_validate(result.model_dump())
+
+
+class StubMatchRankingAPI:
+    """在本地线程中运行的 match_ranking 接口"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.data: list[dict] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stub.latency)
+                body = json.dumps({"data": stub.data}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def set_teams(self, team_count: int):
+        self.data = [
+            {
+                "team_name": team_name,
+                "rank": index + 1,
+                "ingame_rank": index + 1,
+                "kill_pts": 0,
+            }
+            for index, team_name in enumerate(team_names(team_count))
+        ]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class QueryCounter:
+    def __init__(self, bind):
+        from sqlalchemy import event
+
+        self.count = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        event.listen(bind, "before_cursor_execute", self._before)
+        event.listen(bind, "after_cursor_execute", self._after)
+
+    def _before(self, *args):
+        self._local.start = time.perf_counter()
+
+    def _after(self, *args):
+        with self._lock:
+            self.count += 1
+            self.seconds += time.perf_counter() - self._local.start
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            self.seconds = 0.0
+
+
+async def timed_check(graph, game_id: str, stage: int, uploads, use_cache: bool):
+    """与 graph.acheck 相同的调用方式，同时记录每个节点的耗时"""
+    node_seconds = defaultdict(list)
+    started = {}
+    start = time.perf_counter()
+    with graph.new_session() as session:
+        async for chunk in graph.get_graph().astream(
+            {
+                "game_id": game_id,
+                "stage": stage,
+                "use_cache": use_cache,
+                "uploads": uploads,
+            },
+            config={
+                "max_concurrency": graph.PARSE_CONCURRENCY,
+                "configurable": {"session": session},
+            },
+            stream_mode="tasks",
+        ):
+            if "input" in chunk:
+                started[chunk["id"]] = time.perf_counter()
+            else:
+                node_seconds[chunk["name"]].append(
+                    time.perf_counter() - started.pop(chunk["id"])
+                )
+    return time.perf_counter() - start, node_seconds
+
+
+async def run_scenario(graph, args, team_count: int, concurrency: int, counter):
+    recordings = (
+        json.load(open(args.recordings))
+        if args.recordings
+        else synthetic_game_results(team_count, 8)
+    )
+    model = FakeGameResultModel(recordings, args.llm_latency, args.llm_jitter)
+    graph.get_game_result_llm = lambda: model
+
+    # 每个场景使用新的截图，保证走完整的预处理 + 模型调用路径
+    seed_base = team_count * 100_000 + concurrency * 1000
+    screenshots = [
+        make_screenshot(seed_base + index) for index in range(args.runs * args.images)
+    ]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    e2e, nodes = [], defaultdict(list)
+
+    async def one(run: int):
+        game_id = f"bench{team_count}_{concurrency}_{run}"
+        uploads = [
+            (f"{game_id}_rank_{index + 1}.png", screenshots[run * args.images + index])
+            for index in range(args.images)
+        ]
+        async with semaphore:
+            seconds, node_seconds = await timed_check(
+                graph, game_id, args.stage, uploads, args.use_cache
+            )
+        e2e.append(seconds)
+        for name, values in node_seconds.items():
+            nodes[name].extend(values)
+
+    counter.reset()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(run) for run in range(args.runs)))
+    wall = time.perf_counter() - start
+    # 每个场景运行在新的事件循环上，结束前关闭绑定在本循环上的 API 客户端
+    await graph.match_ranking_client.aclose()
+
+    return {
+        "teams": team_count,
+        "concurrency": concurrency,
+        "runs": args.runs,
+        "e2e_seconds": summarize(e2e),
+        "node_seconds": {name: summarize(values) for name, values in nodes.items()},
+        "throughput_per_second": args.runs / wall,
+        "db_queries_per_check": counter.count / args.runs,
+        "db_seconds_per_check": counter.seconds / args.runs,
+        "llm_calls": model.calls,
+    }
+
+
+def compare_with_baseline(
+    results: list[dict], baseline_path: str, max_regression: float
+):
+    with open(baseline_path) as f:
+        baseline = {
+            (item["teams"], item["concurrency"]): item
+            for item in json.load(f)["scenarios"]
+        }
+    regressions = []
+    for item in results:
+        base = baseline.get((item["teams"], item["concurrency"]))
+        if base is None:
+            continue
+        before, after = base["e2e_seconds"]["p95"], item["e2e_seconds"]["p95"]
+        if before > 0 and (after - before) / before > max_regression:
+            regressions.append(
+                f"teams={item['teams']} concurrency={item['concurrency']}: "
+                f"p95 {before * 1000:.1f}ms -> {after * 1000:.1f}ms"
+            )
+    return regressions
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查流程的离线性能基准")
+    parser.add_argument("--teams", type=parse_ints, default=[16, 20])
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 4])
+    parser.add_argument("--runs", type=int, default=20, help="每个场景的检查次数")
+    parser.add_argument("--images", type=int, default=2, help="每场比赛的截图数")
+    parser.add_argument("--stage", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-jitter", type=float, default=0.1)
+    parser.add_argument("--api-latency", type=float, default=0.02)
+    parser.add_argument("--recordings", help="录制的 GameResult JSON 列表文件")
+    parser.add_argument("--use-cache", action="store_true", help="启用解析缓存")
+    parser.add_argument(
+        "--db-url", help="使用指定数据库（如容器内 MySQL），默认 SQLite 临时库"
+    )
+    parser.add_argument("--stages", type=int, default=4)
+    parser.add_argument("--matches-per-stage", type=int, default=30)
+    parser.add_argument("--output", help="结果写入该 JSON 文件")
+    parser.add_argument("--baseline", help="与该 JSON 结果比较")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="resultschecker-bench-")
+    with StubMatchRankingAPI(args.api_latency) as api:
+        # graph 及其依赖在导入时读取这些配置，必须先设置再导入
+        os.environ["MATCH_RANKING_API_BASE_URL"] = api.base_url
+        os.environ["PARSE_CACHE_PATH"] = os.path.join(workdir, "parse_cache.sqlite3")
+        os.environ["SCREENSHOT_STORE_PATH"] = os.path.join(workdir, "images")
+        # 检查历史在请求路径之外批量写入，不计入测量
+        os.environ["CHECK_HISTORY_ENABLED"] = "false"
+        os.environ["STORAGE_BACKEND"] = "local"
+        os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+        from loguru import logger
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+
+        import graph
+
+        logger.remove()
+        logger.add(sys.stderr, level="WARNING")
+
+        db_url = args.db_url or f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}"
+        bind = create_engine(db_url)
+        seed_season(bind, args.stages, args.matches_per_stage, max(args.teams))
+        graph.get_session_factory = lambda: sessionmaker(bind=bind, autoflush=False)
+        counter = QueryCounter(bind)
+
+        results = []
+        for team_count in args.teams:
+            api.set_teams(team_count)
+            for concurrency in args.concurrency:
+                result = asyncio.run(
+                    run_scenario(graph, args, team_count, concurrency, counter)
+                )
+                results.append(result)
+                nodes = " ".join(
+                    f"{name}={stats['p50'] * 1000:.0f}/{stats['p95'] * 1000:.0f}"
+                    for name, stats in result["node_seconds"].items()
+                )
+                print(
+                    f"teams={team_count:<3} concurrency={concurrency:<3} "
+                    f"e2e p50={result['e2e_seconds']['p50'] * 1000:.1f}ms "
+                    f"p95={result['e2e_seconds']['p95'] * 1000:.1f}ms "
+                    f"throughput={result['throughput_per_second']:.2f}/s "
+                    f"queries/check={result['db_queries_per_check']:.1f} "
+                    f"nodes(p50/p95 ms): {nodes}"
+                )
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline")
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
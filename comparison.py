@@ -0,0 +1,219 @@
+import unicodedata
+from typing import Callable
+
+from schemas import (
+    DataError,
+    ErrorList,
+    GameResult,
+    TeamResult,
+    TieBreakStats,
+    empty_tiebreak_stats,
+)
+
+to_ranking_score = {
+    1: 16,
+    2: 12,
+    3: 10,
+    4: 8,
+    5: 6,
+    6: 5,
+    7: 4,
+    8: 3,
+    9: 2,
+    10: 1,
+}
+
+# 错误类型
+FINAL_RANKING_ERROR = 1
+INGAME_RANKING_ERROR = 2
+TOTAL_ELIMS_ERROR = 3
+TEAM_MISSING_IN_GAME = 4
+TEAM_MISSING_IN_API = 5
+PLAYER_ELIMS_ERROR = 6
+PLAYER_MISSING_IN_API = 7
+ERROR_TYPES = range(FINAL_RANKING_ERROR, PLAYER_MISSING_IN_API + 1)
+
+
+def normalize_team_name(name: str) -> str:
+    """统一全角/半角、大小写和首尾空白，作为队伍匹配的 key"""
+    return unicodedata.normalize("NFKC", name).strip().casefold()
+
+
+def ranking_key(team_result: TeamResult) -> tuple:
+    return (
+        to_ranking_score.get(team_result.ranking, 0) + team_result.total_elims,
+        team_result.tiebreak_stats["wwcd_count"],
+        team_result.total_elims,
+        # team_result.tiebreak_stats["stage_total_kill"],
+        team_result.tiebreak_stats["stage_max_single_match_pts"],
+        team_result.tiebreak_stats["stage_max_single_match_kill"],
+        team_result.tiebreak_stats["last_match_total_pts"],
+        team_result.tiebreak_stats["last_match_total_kill"],
+        team_result.tiebreak_stats["last_match_place_pts"],
+    )
+
+
+def rank_teams(game_result: GameResult, tiebreak_stats: dict[str, TieBreakStats]):
+    """按本场积分和同分规则排序，并写入每个队伍的 final_ranking"""
+    for team_result in game_result.teams:
+        team_result.tiebreak_stats = tiebreak_stats.get(
+            team_result.team_name, empty_tiebreak_stats()
+        )
+
+    game_result.teams.sort(key=ranking_key, reverse=True)
+    for index, team_result in enumerate(game_result.teams):
+        team_result.final_ranking = index + 1
+
+
+def compare_results(teams: list[TeamResult], api_result: list[dict]) -> ErrorList:
+    """
+    对比游戏客户端的结果与 API 数据，线性扫描一遍得到全部错误。
+
+    两边按规范化后的队伍名建立索引：
+    双方都有的队伍依次检查最终排名、游戏内排名和淘汰数；
+    只出现在 API 中的队伍记为 TEAM_MISSING_IN_GAME，
+    只出现在截图中的队伍记为 TEAM_MISSING_IN_API。
+    规范化后同名的多支队伍各自只对应一条 API 数据，名字完全相同的优先对应，
+    多出来的一方按缺失记录，不会被合并掉。
+    """
+    api_by_name: dict[str, list[int]] = {}
+    for index, team in enumerate(api_result):
+        api_by_name.setdefault(normalize_team_name(team["team_name"]), []).append(index)
+    seen = set()
+
+    error_list = ErrorList(errors=[])
+    for team_result in teams:
+        free = [
+            index
+            for index in api_by_name.get(normalize_team_name(team_result.team_name), [])
+            if index not in seen
+        ]
+        if not free:
+            error_list.errors.append(
+                DataError(
+                    error_type=TEAM_MISSING_IN_API,
+                    team=team_result.team_name,
+                    original_data="API 中不存在",
+                    correct_data=team_result.final_ranking,
+                )
+            )
+            continue
+        index = next(
+            (
+                index
+                for index in free
+                if api_result[index]["team_name"] == team_result.team_name
+            ),
+            free[0],
+        )
+        seen.add(index)
+        api_team = api_result[index]
+
+        team_name = api_team["team_name"]
+        if team_result.final_ranking != api_team["rank"]:
+            error_list.errors.append(
+                DataError(
+                    error_type=FINAL_RANKING_ERROR,
+                    team=team_name,
+                    original_data=api_team["rank"],
+                    correct_data=team_result.final_ranking,
+                )
+            )
+        if team_result.ranking != api_team["ingame_rank"]:
+            error_list.errors.append(
+                DataError(
+                    error_type=INGAME_RANKING_ERROR,
+                    team=team_name,
+                    original_data=api_team["ingame_rank"],
+                    correct_data=team_result.ranking,
+                )
+            )
+        if team_result.total_elims != api_team["kill_pts"]:
+            error_list.errors.append(
+                DataError(
+                    error_type=TOTAL_ELIMS_ERROR,
+                    team=team_name,
+                    original_data=api_team["kill_pts"],
+                    correct_data=team_result.total_elims,
+                )
+            )
+
+    for index, api_team in enumerate(api_result):
+        if index not in seen:
+            error_list.errors.append(
+                DataError(
+                    error_type=TEAM_MISSING_IN_GAME,
+                    team=api_team["team_name"],
+                    original_data=api_team["rank"],
+                    correct_data="截图中未找到",
+                )
+            )
+
+    return error_list
+
+
+def compare_player_elims(
+    teams: list[TeamResult],
+    player_kills: dict[int, tuple[str, int]],
+    match_name: Callable[[str], str | None],
+) -> list[DataError]:
+    """
+    逐个选手对比截图中的淘汰数与 PlayerResultStats 中的击杀数。
+
+    player_kills 为本场比赛 {uid: (选手名, 击杀数)}，match_name 把截图中的选手名
+    匹配为 player_kills 中的名字（匹配不到返回 None）。
+    每行选手数据只能对应一名截图中的选手，重名时优先对应击杀数相同的那一行。
+    对不上的选手记为 PLAYER_ELIMS_ERROR；找不到的选手，以及与前面的选手
+    匹配到同一行的选手，记为 PLAYER_MISSING_IN_API。
+    """
+    uids_by_name: dict[str, list[int]] = {}
+    for uid in sorted(player_kills):
+        uids_by_name.setdefault(player_kills[uid][0], []).append(uid)
+    # uid -> 对应到这一行的截图中的选手名
+    claimed: dict[int, str] = {}
+
+    errors = []
+    for team_result in teams:
+        for player in team_result.players:
+            player_name = match_name(player.player_name)
+            if player_name is None:
+                errors.append(
+                    DataError(
+                        error_type=PLAYER_MISSING_IN_API,
+                        team=f"{team_result.team_name} / {player.player_name}",
+                        original_data="API 中不存在",
+                        correct_data=player.elims,
+                    )
+                )
+                continue
+            uids = uids_by_name[player_name]
+            free = [uid for uid in uids if uid not in claimed]
+            if not free:
+                errors.append(
+                    DataError(
+                        error_type=PLAYER_MISSING_IN_API,
+                        team=f"{team_result.team_name} / {player.player_name}",
+                        original_data=f"与 {claimed[uids[0]]} 匹配到同一选手 {player_name}",
+                        correct_data=player.elims,
+                    )
+                )
+                continue
+            uid = next(
+                (uid for uid in free if player_kills[uid][1] == player.elims), free[0]
+            )
+            claimed[uid] = player.player_name
+            total_kill = player_kills[uid][1]
+            if total_kill != player.elims:
+                errors.append(
+                    DataError(
+                        error_type=PLAYER_ELIMS_ERROR,
+                        team=f"{team_result.team_name} / {player_name}",
+                        original_data=(
+                            total_kill
+                            if len(uids) == 1
+                            else f"{total_kill}（重名选手，uid {uid}）"
+                        ),
+                        correct_data=player.elims,
+                    )
+                )
+    return errors
@@ -0,0 +1,288 @@
+"""
+结算截图中排名和淘汰数的本地识别（模板匹配）。
+
+游戏结算界面的数字使用固定字体、出现在固定位置，因此可以用从已知截图中裁剪出的
+数字模板做匹配，不必交给 LLM。需要两份配置：
+
+- DIGITS_TEMPLATES_DIR: 目录中放 0.png ~ 9.png 十个数字模板
+- DIGITS_LAYOUT_PATH: JSON，按相对坐标 (left, top, right, bottom) 描述每个队伍结算框的
+  排名格和各选手淘汰数格：{"slots": [{"rank": [...], "elims": [[...], ...]}, ...]}；
+  排名带 "1ST"/"2ND"/"15TH" 这样的后缀时加上 "rank_suffix": true
+
+两者都配置且安装了 numpy 时启用。
+
+    python digits.py templates screenshot.png --box 0.1,0.2,0.3,0.25
+        从截图中 box 区域内依次排列的 0~9 切出数字模板，保存到 DIGITS_TEMPLATES_DIR
+    python digits.py read screenshot.png
+        打印每个结算框的识别结果和置信度
+"""
+
+import argparse
+import io
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from dotenv import load_dotenv
+from loguru import logger
+from PIL import Image
+
+from schemas import GameResult
+
+try:
+    import numpy as np
+except ImportError:  # numpy 为可选依赖，未安装时不启用本地识别
+    np = None
+
+load_dotenv()
+
+Box = tuple[float, float, float, float]
+
+
+@dataclass(frozen=True)
+class CellReading:
+    value: int | None
+    confidence: float
+
+
+@dataclass(frozen=True)
+class SlotReading:
+    rank: CellReading
+    elims: list[CellReading]
+
+    def confident(self, min_confidence: float) -> bool:
+        return all(
+            cell.value is not None and cell.confidence >= min_confidence
+            for cell in [self.rank, *self.elims]
+        )
+
+
+def _binarize(gray: "np.ndarray") -> "np.ndarray":
+    """以最亮与最暗的中点为阈值二值化，笔画（占少数的一类像素）为 True"""
+    if gray.size == 0 or gray.max() - gray.min() < 0.15:
+        return np.zeros(gray.shape, dtype=bool)
+    mask = gray > (gray.max() + gray.min()) / 2
+    return ~mask if mask.mean() > 0.5 else mask
+
+
+def _crop_to_ink(mask: "np.ndarray") -> "np.ndarray":
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    return mask[rows[0] : rows[-1] + 1, cols[0] : cols[-1] + 1]
+
+
+def _segment(mask: "np.ndarray") -> list["np.ndarray"]:
+    """按空白列切分出单个字符"""
+    ink_cols = mask.any(axis=0)
+    glyphs, start = [], None
+    for index, has_ink in enumerate([*ink_cols, False]):
+        if has_ink and start is None:
+            start = index
+        elif not has_ink and start is not None:
+            glyphs.append(_crop_to_ink(mask[:, start:index]))
+            start = None
+    return glyphs
+
+
+def _resize(mask: "np.ndarray", shape: tuple[int, int]) -> "np.ndarray":
+    image = Image.fromarray(mask.astype(np.uint8) * 255)
+    resized = image.resize((shape[1], shape[0]), Image.Resampling.BILINEAR)
+    return np.asarray(resized, dtype=np.float32) / 255
+
+
+def _ncc(a: "np.ndarray", b: "np.ndarray") -> float:
+    a = a - a.mean()
+    b = b - b.mean()
+    denominator = np.sqrt((a * a).sum() * (b * b).sum())
+    return float((a * b).sum() / denominator) if denominator else 0.0
+
+
+class DigitRecognizer:
+    def __init__(
+        self,
+        templates: dict[int, "np.ndarray"],
+        slots: list[dict],
+        min_confidence: float = 0.85,
+        rank_suffix: bool = False,
+    ):
+        self.templates = {
+            digit: _crop_to_ink(_binarize(template)).astype(np.float32)
+            for digit, template in templates.items()
+        }
+        self.slots = slots
+        self.min_confidence = min_confidence
+        self.rank_suffix = rank_suffix
+
+    @classmethod
+    def from_files(
+        cls, templates_dir: str, layout_path: str, min_confidence: float
+    ) -> "DigitRecognizer":
+        templates = {}
+        for digit in range(10):
+            with Image.open(os.path.join(templates_dir, f"{digit}.png")) as image:
+                templates[digit] = (
+                    np.asarray(image.convert("L"), dtype=np.float32) / 255
+                )
+        with open(layout_path) as f:
+            layout = json.load(f)
+        return cls(
+            templates,
+            layout["slots"],
+            min_confidence,
+            rank_suffix=layout.get("rank_suffix", False),
+        )
+
+    def _match(self, glyph: "np.ndarray") -> tuple[int, float]:
+        scores = {
+            digit: _ncc(_resize(glyph, template.shape), template)
+            for digit, template in self.templates.items()
+        }
+        digit = max(scores, key=scores.get)
+        return digit, scores[digit]
+
+    def read_number(self, gray: "np.ndarray", suffix_glyphs: int = 0) -> CellReading:
+        """
+        读取格子中的数字，置信度取各字符中最低的一个。
+        suffix_glyphs 为末尾固定的非数字字符数（排名后缀 "ST"/"ND"/"RD"/"TH" 为 2），
+        先去掉再识别；其余字符都按数字匹配，混入字母时置信度很低，由调用方回退到 LLM，
+        不会把 "1ST" 的 "S" 当成 5 读成 15。
+        """
+        glyphs = [glyph for glyph in _segment(_binarize(gray)) if glyph.size]
+        if not glyphs:
+            # 空格子
+            return CellReading(None, 1.0)
+        if suffix_glyphs:
+            if len(glyphs) <= suffix_glyphs:
+                return CellReading(None, 0.0)
+            glyphs = glyphs[:-suffix_glyphs]
+        matches = [self._match(glyph) for glyph in glyphs]
+        return CellReading(
+            int("".join(str(digit) for digit, _ in matches)),
+            min(score for _, score in matches),
+        )
+
+    @staticmethod
+    def _cell(gray: "np.ndarray", box: Box) -> "np.ndarray":
+        height, width = gray.shape
+        left, top, right, bottom = box
+        return gray[
+            int(top * height) : int(bottom * height),
+            int(left * width) : int(right * width),
+        ]
+
+    def read_slots(self, data: bytes) -> list[SlotReading]:
+        """按布局读取截图中每个结算框，排名格为空的结算框（队伍数不足时）被跳过"""
+        with Image.open(io.BytesIO(data)) as image:
+            gray = np.asarray(image.convert("L"), dtype=np.float32) / 255
+        readings = []
+        for slot in self.slots:
+            rank_cell = self._cell(gray, slot["rank"])
+            rank = self.read_number(rank_cell, 2 if self.rank_suffix else 0)
+            if rank.value is None and not _binarize(rank_cell).any():
+                continue
+            elims = [self.read_number(self._cell(gray, box)) for box in slot["elims"]]
+            readings.append(SlotReading(rank=rank, elims=elims))
+        return readings
+
+
+def apply_digit_readings(
+    names: GameResult, readings: list[SlotReading]
+) -> GameResult | None:
+    """
+    把本地识别的排名和淘汰数填入只含队名/选手名的解析结果。
+    names 中的队伍需与结算框一一按顺序对应，数量不一致时返回 None，由调用方回退到完整解析
+    """
+    if len(names.teams) != len(readings):
+        return None
+    teams = []
+    for team_result, slot in zip(names.teams, readings):
+        if len(team_result.players) != len(slot.elims):
+            return None
+        players = [
+            player.model_copy(update={"elims": cell.value})
+            for player, cell in zip(team_result.players, slot.elims)
+        ]
+        teams.append(
+            team_result.model_copy(
+                update={
+                    "ranking": slot.rank.value,
+                    "players": players,
+                    "total_elims": sum(player.elims for player in players),
+                }
+            )
+        )
+    return names.model_copy(update={"teams": teams})
+
+
+def load_recognizer() -> DigitRecognizer | None:
+    templates_dir = os.getenv("DIGITS_TEMPLATES_DIR")
+    layout_path = os.getenv("DIGITS_LAYOUT_PATH")
+    if not templates_dir or not layout_path:
+        return None
+    if np is None:
+        logger.warning("未安装 numpy，本地数字识别不可用")
+        return None
+    return DigitRecognizer.from_files(
+        templates_dir,
+        layout_path,
+        float(os.getenv("DIGITS_MIN_CONFIDENCE", "0.85")),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_digit_recognizer() -> DigitRecognizer | None:
+    """首次使用时才加载模板，未配置时为 None"""
+    return load_recognizer()
+
+
+def extract_templates(screenshot: str, box: Box, output_dir: str):
+    """box 区域内应恰好依次排列 0~9 十个数字"""
+    with Image.open(screenshot) as image:
+        gray = np.asarray(image.convert("L"), dtype=np.float32) / 255
+    glyphs = _segment(_binarize(DigitRecognizer._cell(gray, box)))
+    if len(glyphs) != 10:
+        raise ValueError(f"区域内切分出 {len(glyphs)} 个字符，应为 10 个")
+    os.makedirs(output_dir, exist_ok=True)
+    for digit, glyph in enumerate(glyphs):
+        Image.fromarray(glyph.astype(np.uint8) * 255).save(
+            os.path.join(output_dir, f"{digit}.png")
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="结算截图数字识别")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    templates_parser = subparsers.add_parser("templates", help="从截图中切出数字模板")
+    templates_parser.add_argument("screenshot")
+    templates_parser.add_argument("--box", required=True, help="left,top,right,bottom")
+    templates_parser.add_argument(
+        "--output", default=os.getenv("DIGITS_TEMPLATES_DIR", "./digit_templates")
+    )
+    read_parser = subparsers.add_parser("read", help="识别截图中的排名和淘汰数")
+    read_parser.add_argument("screenshot")
+    args = parser.parse_args()
+
+    if np is None:
+        raise SystemExit("需要先安装 numpy")
+    if args.command == "templates":
+        box = tuple(float(v) for v in args.box.split(","))
+        extract_templates(args.screenshot, box, args.output)
+        print(f"templates saved to {args.output}")
+        return
+
+    digit_recognizer = get_digit_recognizer()
+    if digit_recognizer is None:
+        raise SystemExit("请先配置 DIGITS_TEMPLATES_DIR 和 DIGITS_LAYOUT_PATH")
+    with open(args.screenshot, "rb") as f:
+        readings = digit_recognizer.read_slots(f.read())
+    for index, slot in enumerate(readings, start=1):
+        elims = ", ".join(f"{cell.value}({cell.confidence:.2f})" for cell in slot.elims)
+        print(
+            f"slot {index}: rank {slot.rank.value}({slot.rank.confidence:.2f})"
+            f" elims [{elims}]"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,92 @@
-from typing import Annotated, TypedDict
-from langchain_openai import ChatOpenAI
+import asyncio
+import contextvars
+import operator
+import time
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Annotated, AsyncIterator, Awaitable, Callable, TypedDict, TypeVar
 from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig
 from dotenv import load_dotenv
 import base64
-import glob
-from pydantic import BaseModel, Field
 from langgraph.graph import MessagesState, StateGraph, add_messages, START, END
-import requests
-from sqlalchemy import func
-from models import MatchRanking, engine
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.types import Send
+from loguru import logger
+from sqlalchemy import Select, case, func, select
+from models import MatchRanking, PlayerResultStats, get_engine
+from api_client import match_ranking_client
+from parse_cache import get_parse_cache
+from preprocess import PreprocessedImage, preprocess_image
+from digits import apply_digit_readings, get_digit_recognizer
+from screenshot_store import get_screenshot_store, parse_game_id
+from standings import TeamStandings, standings_cache
+from names import NameIndex, name_resolver
+from history import check_history, hash_inputs
+from metrics import (
+    checkout_connection,
+    observe_llm,
+    timed_node,
+    track_check,
+    track_pool,
+    track_queries,
+)
+from validation import apply_missing_repair, apply_team_repair, validate_game_result
+from comparison import (
+    compare_player_elims,
+    compare_results,
+    normalize_team_name,
+    rank_teams,
+)
+from schemas import (
+    DataError,
+    ErrorList,
+    GameResult,
+    PlayerResult,
+    TeamResult,
+    TieBreakStats,
+    empty_tiebreak_stats,
+)
 from sqlalchemy.orm import sessionmaker, Session
 
 load_dotenv()
 
-to_ranking_score = {
-    1: 16,
-    2: 12,
-    3: 10,
-    4: 8,
-    5: 6,
-    6: 5,
-    7: 4,
-    8: 3,
-    9: 2,
-    10: 1,
-}
-
-SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+@lru_cache(maxsize=None)
+def get_session_factory() -> sessionmaker:
+    # 检查流程使用的 engine 在这里接入连接池和查询耗时指标，models 不依赖 metrics
+    bind = get_engine()
+    track_pool(bind)
+    track_queries(bind)
+    return sessionmaker(bind=bind, autoflush=False, autocommit=False)
+
+
+def new_session() -> Session:
+    return get_session_factory()()
+
+
+T = TypeVar("T")
+
+# pymysql 是同步驱动，数据库查询放到有界线程池里执行，避免阻塞事件循环
+db_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("DB_EXECUTOR_WORKERS", "8")),
+    thread_name_prefix="db",
+)
+
+# 同时解析的截图数量上限
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
+# 批量复查时同时运行的比赛数量上限
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# 解析结果自洽性检查不通过时，针对性重新提取的最多轮数，0 表示不修复
+REPAIR_MAX_ROUNDS = int(os.getenv("REPAIR_MAX_ROUNDS", "2"))
+# 同分数据是否使用按赛段增量维护的内存缓存，关闭时每次用窗口查询重新计算
+STANDINGS_CACHE_ENABLED = os.getenv("STANDINGS_CACHE_ENABLED", "true").lower() == "true"
+# 排名和对比前是否把解析出的名字匹配为 team/player/ocr 表中登记的名字
+NAME_INDEX_ENABLED = os.getenv("NAME_INDEX_ENABLED", "true").lower() == "true"
+# 是否逐个选手核对淘汰数（PlayerResultStats）
+PLAYER_CHECK_ENABLED = os.getenv("PLAYER_CHECK_ENABLED", "true").lower() == "true"
 
 # Prompts
 IMAGE_PARSING_PROMPT = """
@@ -45,56 +105,38 @@ IMAGE_PARSING_PROMPT = """
 5. 你需要在结束后，基于注意事项，重新核查信息是否正确和符合规范
 """
 
+REPAIR_TEAM_PROMPT = IMAGE_PARSING_PROMPT + """
+本次只需要提取队伍 {team_name} 的结算信息，teams 中只返回这一支队伍。
+请逐一核对该队伍的排名和每位选手的淘汰数，total_elims 必须等于所有选手淘汰数之和。
+"""
 
-class TieBreakStats(TypedDict):
-    wwcd_count: int
-    stage_total_kill: int
-    stage_max_single_match_pts: int
-    stage_max_single_match_kill: int
-    last_match_total_pts: int
-    last_match_total_kill: int
-    last_match_place_pts: int
-
-
-# Pydantic models for structured output
-class PlayerResult(BaseModel):
-    player_name: str = Field(description="The name of the player")
-    elims: int = Field(description="The number of eliminations the player has")
-
-
-class TeamResult(BaseModel):
-    team_name: str = Field(description="The name of the team")
-    ranking: int = Field(description="The ranking of the team in the game")
-    total_elims: int = Field(
-        description="The total number of eliminations the team has, equals the sum of the eliminations of all players"
-    )
-    players: list[PlayerResult] = Field(
-        description="The list of player results in the team"
-    )
-    final_ranking: int = Field(
-        description="The final ranking of the team, ALWAYS keep it unset", default=0
-    )
-    tiebreak_stats: TieBreakStats = Field(
-        description="The tiebreak stats of the team, ALWAYS keep it unset",
-        default_factory=TieBreakStats,
-    )
-
+REPAIR_MISSING_PROMPT = IMAGE_PARSING_PROMPT + """
+本次只需要提取排名为 {rankings} 的队伍，teams 中只返回这些队伍；
+图片中没有这些排名的队伍时，teams 返回空列表。
+"""
 
-class GameResult(BaseModel):
-    teams: list[TeamResult] = Field(description="The list of team results in the game")
+# 本地数字识别全部高置信度时，LLM 只负责读取名字
+NAMES_ONLY_PROMPT = """
+以下图片为游戏结果图。你只需要提取每个队伍结算框中的队伍名和选手名。
+teams 按结算框在图片中的位置排列：从上到下，同一行从左到右；
+每个队伍的 players 按结算框中从上到下的顺序排列。
+ranking、total_elims 和 elims 一律填 0。
+**不要**捏造数据！！
+"""
 
 
-class DataError(BaseModel):
-    error_type: int = Field(
-        description="The type of error. 1: final ranking error, 2: ingame ranking error, 3: total elims error"
-    )
-    team: str = Field(description="name of the team that error occurs to")
-    original_data: str | int = Field(description="The original data from api")
-    correct_data: str | int = Field(description="The correct data from game client")
+class ParsedImage(TypedDict):
+    index: int
+    image_file: str
+    game_result: GameResult | None
+    error: str | None
 
 
-class ErrorList(BaseModel):
-    errors: list[DataError] = Field(description="The list of errors")
+class ImageTask(TypedDict):
+    index: int
+    image_file: str
+    data: bytes
+    use_cache: bool
 
 
 # Graph State model
@@ -102,16 +144,79 @@ class State(MessagesState):
     game_id: str
     stage: int
     error_list: ErrorList
+    # compare 排名后的解析结果，写入检查历史
+    game_result: GameResult | None
+    use_cache: bool
+    # 本次检查的截图 (文件名, 内容)：随请求上传的，或由 collect 从截图存储中读取
+    uploads: list[tuple[str, bytes]] | None
+    image_files: list[str]
+    parsed_images: Annotated[list[ParsedImage], operator.add]
+    # 批量复查时预先取好、多场比赛共用的数据，为空时由 compare 自行获取
+    api_result: list[dict] | None
+    tiebreak_stats: dict[str, TieBreakStats] | None
 
 
-llm = ChatOpenAI(model="openai/gpt-4.1-mini")
-llm_generating_game_result = llm.with_structured_output(GameResult)
+LLM_MODEL = "openai/gpt-4.1-mini"
+
+
+@lru_cache(maxsize=None)
+def get_game_result_llm() -> Runnable:
+    """
+    首次解析截图时才创建 LLM 客户端：langchain_openai 导入较慢，
+    且缺少 API key 时会直接报错，不应拖慢或阻断服务启动
+    """
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model=LLM_MODEL)
+    return llm.with_structured_output(GameResult)
 
 
 # tool functions
-def get_tiebreak_stats(session: Session, team_name: str, stage: int) -> dict:
+def tiebreak_stats_query(team_names: list[str] | None, stage: int) -> Select:
+    """
+    同分数据的窗口查询：聚合值按队伍分区计算，
+    最后一场比赛取每个分区内 created_at 最新的一行。
+    team_names 为 None 时查询整个赛段的所有队伍。
+    由 MatchRanking 上的 ix_match_ranking_stage_team_created 索引覆盖。
     """
-    获取比较同分情况所需的队伍数据，规则如下：
+    by_team = {"partition_by": MatchRanking.team_name}
+    ranked = select(
+        MatchRanking.team_name,
+        # 队伍的胜场数(吃鸡)
+        func.sum(case((MatchRanking.ingame_rank == 1, 1), else_=0))
+        .over(**by_team)
+        .label("wwcd_count"),
+        # 当前阶段的总淘汰数
+        func.sum(MatchRanking.kill_pts).over(**by_team).label("stage_total_kill"),
+        # 当前阶段的单局最高积分 / 单局最高淘汰
+        func.max(MatchRanking.total_pts)
+        .over(**by_team)
+        .label("stage_max_single_match_pts"),
+        func.max(MatchRanking.kill_pts)
+        .over(**by_team)
+        .label("stage_max_single_match_kill"),
+        # 最后一场比赛的总积分 / 总淘汰数 / 生存排名
+        MatchRanking.total_pts.label("last_match_total_pts"),
+        MatchRanking.kill_pts.label("last_match_total_kill"),
+        MatchRanking.place_pts.label("last_match_place_pts"),
+        func.row_number()
+        .over(
+            order_by=(MatchRanking.created_at.desc(), MatchRanking.id.desc()),
+            **by_team,
+        )
+        .label("rn"),
+    ).where(MatchRanking.stage == stage)
+    if team_names is not None:
+        ranked = ranked.where(MatchRanking.team_name.in_(set(team_names)))
+    ranked = ranked.subquery()
+    return select(ranked).where(ranked.c.rn == 1)
+
+
+def get_tiebreak_stats(
+    session: Session, team_names: list[str] | None, stage: int
+) -> dict[str, TieBreakStats]:
+    """
+    批量获取比较同分情况所需的队伍数据，规则如下：
     在所有回合结束后，若出现平分，将根据以下顺序决定排名。
 
     1) 比较同分队伍的总获胜数
@@ -122,144 +227,415 @@ def get_tiebreak_stats(session: Session, team_name: str, stage: int) -> dict:
     6) 比较同分队伍最后一场比赛的总淘汰数
     7) 比较同分队伍最后一场比赛的生存排名
 
+    数据来自按赛段增量维护的积分榜缓存(standings_cache)；
+    关闭缓存时整个大厅的队伍通过一条窗口查询(tiebreak_stats_query)取回。
+    返回 {team_name: TieBreakStats}，没有历史数据的队伍各项均为 0；
+    team_names 为 None 时返回整个赛段有数据的所有队伍（批量复查时共用）。
+    查询失败时直接抛出异常：全为 0 的数据会让 rank_teams 排出错误的名次并误报错误。
     """
-    # session = SessionLocal()
-    try:
-        if not team_name or stage is None:
-            raise ValueError("team_name 和 stage 不能为空")
-        # 获取队伍的胜场数(吃鸡)
-        wwcd_count = (
-            session.query(MatchRanking)
-            .filter(
-                MatchRanking.team_name == team_name,
-                MatchRanking.stage == stage,
-                MatchRanking.ingame_rank == 1,
-            )
-            .count()
+    if team_names == [] or stage is None:
+        raise ValueError("team_names 和 stage 不能为空")
+
+    stats = {team_name: empty_tiebreak_stats() for team_name in team_names or []}
+
+    if STANDINGS_CACHE_ENABLED:
+        standings = standings_cache.get(session, stage)
+        for team_name in team_names if team_names is not None else standings:
+            if team_name in standings:
+                stats[team_name] = standings[team_name]
+    else:
+        rows = session.execute(tiebreak_stats_query(team_names, stage)).mappings()
+        for row in rows:
+            stats[row["team_name"]] = {
+                key: int(row[key] or 0) for key in TieBreakStats.__annotations__
+            }
+
+    return stats
+
+
+def get_game_snapshots(
+    session: Session, stage: int, game_ids: list[str]
+) -> dict[str, tuple[list[dict], dict[str, TieBreakStats]]]:
+    """
+    批量复查用：每场比赛当时的 API 数据和同分数据，返回 {game_id: (api_result, tiebreak_stats)}。
+
+    一次读取整个赛段的 match_ranking，按 (created_at, id) 顺序累加积分榜：
+    api_result 为这场比赛自己的行（字段与 match_ranking 接口一致），
+    tiebreak_stats 为累加到这场比赛最后一行为止的同分数据。
+    match_ranking 中没有数据的比赛不在返回值中。
+    """
+    rows = session.execute(
+        select(
+            MatchRanking.id,
+            MatchRanking.war_id,
+            MatchRanking.team_name,
+            MatchRanking.rank,
+            MatchRanking.ingame_rank,
+            MatchRanking.kill_pts,
+            MatchRanking.place_pts,
+            MatchRanking.total_pts,
+            MatchRanking.created_at,
         )
-        # 获取队伍的当前阶段的总淘汰数
-        # stage_total_kill = (
-        #     session.query(StageRanking.total_kill_pts)
-        #     .filter(StageRanking.team_name == team_name, StageRanking.stage == stage)
-        #     .scalar()
-        # )
-        stage_total_kill = (
-            session.query(
-                func.coalesce(func.sum(MatchRanking.kill_pts).label("stage_kill"), 0)
+        .where(MatchRanking.stage == stage)
+        .order_by(MatchRanking.created_at, MatchRanking.id)
+    ).all()
+
+    wanted = set(game_ids)
+    # 每场比赛的最后一行，累加到这一行之后记录同分数据
+    last_index = {
+        row.war_id: index for index, row in enumerate(rows) if row.war_id in wanted
+    }
+    ending_at: dict[int, list[str]] = {}
+    for game_id, index in last_index.items():
+        ending_at.setdefault(index, []).append(game_id)
+
+    api_results: dict[str, list[dict]] = {game_id: [] for game_id in last_index}
+    standings: dict[str, TeamStandings] = {}
+    snapshots = {}
+    for index, row in enumerate(rows):
+        standings.setdefault(row.team_name, TeamStandings()).add(row)
+        if row.war_id in api_results:
+            api_results[row.war_id].append(
+                {
+                    "team_name": row.team_name,
+                    "rank": row.rank,
+                    "ingame_rank": row.ingame_rank,
+                    "kill_pts": row.kill_pts,
+                }
             )
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .scalar()
-        )
-        # 获取队伍的当前阶段的单局最高积分
-        stage_max_single_match_pts = (
-            session.query(MatchRanking.total_pts)
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .order_by(MatchRanking.total_pts.desc())
-            .limit(1)
-            .scalar()
-        )
-        # 获取队伍的当前阶段的单局最高淘汰
-        stage_max_single_match_kill = (
-            session.query(MatchRanking.kill_pts)
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .order_by(MatchRanking.kill_pts.desc())
-            .limit(1)
-            .scalar()
-        )
-        # 获取队伍的最后一场比赛的总积分
-        last_match_total_pts = (
-            session.query(MatchRanking.total_pts)
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .order_by(MatchRanking.created_at.desc())
-            .limit(1)
-            .scalar()
-        )
-        # 获取队伍的最后一场比赛的总淘汰数
-        last_match_total_kill = (
-            session.query(MatchRanking.kill_pts)
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .order_by(MatchRanking.created_at.desc())
-            .limit(1)
-            .scalar()
-        )
-        # 获取队伍的最后一场比赛的生存排名
-        last_match_place_pts = (
-            session.query(MatchRanking.place_pts)
-            .filter(MatchRanking.team_name == team_name, MatchRanking.stage == stage)
-            .order_by(MatchRanking.created_at.desc())
-            .limit(1)
-            .scalar()
-        )
-        return {
-            "wwcd_count": wwcd_count or 0,
-            "stage_total_kill": stage_total_kill or 0,
-            "stage_max_single_match_pts": stage_max_single_match_pts or 0,
-            "stage_max_single_match_kill": stage_max_single_match_kill or 0,
-            "last_match_total_pts": last_match_total_pts or 0,
-            "last_match_total_kill": last_match_total_kill or 0,
-            "last_match_place_pts": last_match_place_pts or 0,
-        }
-    except Exception as e:
-        print(f"获取同分队伍数据失败: {e}")
-        return {}
+        for game_id in ending_at.get(index, []):
+            tiebreak_stats = {
+                team_name: team.tiebreak_stats()
+                for team_name, team in standings.items()
+            }
+            snapshots[game_id] = (api_results[game_id], tiebreak_stats)
+    return snapshots
 
 
 # Methods for the nodes of the graph
-def parse_game_result_image(state: State):
-    # 在 ./images 文件夹中查找匹配 {game_id}_rank_{number} 模式的图片
-    pattern_base = f"./images/{state['game_id']}_rank_*"
-    exts = [".jpg", ".jpeg", ".png"]
-    image_files = []
-    for ext in exts:
-        image_files.extend(glob.glob(pattern_base + ext))
-
-    if not image_files:
-        raise FileNotFoundError(
-            f"未找到匹配模式 {pattern_base}(.jpg/.jpeg/.png) 的图片文件"
-        )
+def get_player_kills(session: Session, war_id: str) -> dict[int, tuple[str, int]]:
+    """
+    本场比赛每个选手的 {uid: (选手名, 击杀数)}，按 uid 区分重名的选手。
+    (war_id, uid) 唯一索引只用来按 war_id 定位本场的行，选手名和击杀数仍需回表读取
+    """
+    rows = session.execute(
+        select(
+            PlayerResultStats.uid,
+            PlayerResultStats.player_name,
+            PlayerResultStats.total_kill,
+        ).where(PlayerResultStats.war_id == war_id)
+    )
+    return {row.uid: (row.player_name, row.total_kill) for row in rows}
 
-    # 按文件名排序，确保一致的处理顺序
-    image_files.sort()
 
-    # 准备 content 列表，先添加文本提示
-    content = [
-        {
-            "type": "text",
-            "text": IMAGE_PARSING_PROMPT,
-        }
+def prepare_compare(session: Session, war_id: str) -> dict[int, tuple[str, int]]:
+    """compare 开始前的数据库读取共用一次连接：刷新名字索引，取本场选手的击杀数"""
+    if NAME_INDEX_ENABLED:
+        name_resolver.refresh(session)
+    return get_player_kills(session, war_id) if PLAYER_CHECK_ENABLED else {}
+
+
+async def collect_images(state: State):
+    # 优先使用随请求上传的截图
+    uploaded = [
+        filename
+        for filename, _ in state.get("uploads") or []
+        if parse_game_id(filename) == state["game_id"]
     ]
+    if uploaded:
+        return {"image_files": sorted(uploaded)}
+
+    # 没有上传时使用截图存储中这场比赛之前保存的截图（已按文件名排序）
+    stored = await asyncio.to_thread(get_screenshot_store().load, state["game_id"])
+    if not stored:
+        raise FileNotFoundError(f"未找到比赛 {state['game_id']} 的截图")
+    return {
+        "uploads": stored,
+        "image_files": [filename for filename, _ in stored],
+    }
+
+
+def dispatch_images(state: State):
+    # 每张截图分发给一个独立的 parser 节点并发解析
+    uploads = dict(state["uploads"])
+    return [
+        Send(
+            "parser",
+            {
+                "index": index,
+                "image_file": image_file,
+                "data": uploads[image_file],
+                "use_cache": state.get("use_cache", True),
+            },
+        )
+        for index, image_file in enumerate(state["image_files"])
+    ]
+
+
+async def load_image(name: str, data: bytes) -> PreprocessedImage:
+    image = await asyncio.to_thread(preprocess_image, data)
+    logger.info(
+        f"预处理图片 {name}: {image.original_size} -> {image.size} 字节,"
+        f" 节省 {image.bytes_saved} 字节 ({image.mime_type})"
+    )
+    return image
 
-    # 为每张图片添加 image 内容
-    for image_file in image_files:
-        with open(image_file, "rb") as f:
-            image_content = f.read()
-            image_data = base64.b64encode(image_content).decode("utf-8")
-            content.append(
-                {
-                    "type": "image",
-                    "source_type": "base64",
-                    "data": image_data,
-                    "mime_type": "image/jpeg",
-                }
-            )
 
-    response = llm_generating_game_result.invoke(
+async def ask_model(
+    image: PreprocessedImage, prompt: str, use_cache: bool, cacheable: bool = True
+) -> GameResult:
+    """
+    用 prompt 解析一张截图。预处理结果是确定性的，
+    相同的截图和提示词直接复用之前的解析结果。
+    cacheable 为假时既不读也不写解析缓存（repair 的重新提取）
+    """
+    parse_cache = get_parse_cache()
+    cache_key = parse_cache.make_key([image.data], prompt, LLM_MODEL)
+    if use_cache and cacheable:
+        cached = await asyncio.to_thread(parse_cache.get, cache_key)
+        if cached is not None:
+            try:
+                return GameResult.model_validate_json(cached)
+            except ValueError:
+                pass
+
+    image_data = base64.b64encode(image.data).decode("utf-8")
+    llm_started = time.perf_counter()
+    game_result = await get_game_result_llm().ainvoke(
         [
             {
                 "role": "user",
-                "content": content,
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt,
+                    },
+                    {
+                        "type": "image",
+                        "source_type": "base64",
+                        "data": image_data,
+                        "mime_type": image.mime_type,
+                    },
+                ],
             }
         ]
     )
+    observe_llm(time.perf_counter() - llm_started)
+    if cacheable:
+        await asyncio.to_thread(
+            parse_cache.set, cache_key, game_result.model_dump_json()
+        )
+    return game_result
+
+
+async def parse_with_digits(
+    image: PreprocessedImage, data: bytes, use_cache: bool
+) -> GameResult | None:
+    """
+    数字快速路径：排名和淘汰数由本地模板匹配识别，LLM 只读取名字。
+    未启用、存在低置信度的格子或名字与结算框对不上时返回 None
+    """
+    digit_recognizer = get_digit_recognizer()
+    if digit_recognizer is None:
+        return None
+    readings = await asyncio.to_thread(digit_recognizer.read_slots, data)
+    if not readings or not all(
+        slot.confident(digit_recognizer.min_confidence) for slot in readings
+    ):
+        return None
+    names = await ask_model(image, NAMES_ONLY_PROMPT, use_cache)
+    return apply_digit_readings(names, readings)
+
+
+async def parse_game_result_image(task: ImageTask):
+    try:
+        image = await load_image(task["image_file"], task["data"])
+        game_result = await parse_with_digits(image, task["data"], task["use_cache"])
+        if game_result is None:
+            game_result = await ask_model(
+                image, IMAGE_PARSING_PROMPT, task["use_cache"]
+            )
+    except Exception as e:
+        # 单张图片解析失败不影响其它图片，由 merge 节点统一处理
+        logger.exception(f"解析图片 {task['image_file']} 失败: {e}")
+        return {
+            "parsed_images": [
+                {
+                    "index": task["index"],
+                    "image_file": task["image_file"],
+                    "game_result": None,
+                    "error": str(e),
+                }
+            ]
+        }
+
+    return {
+        "parsed_images": [
+            {
+                "index": task["index"],
+                "image_file": task["image_file"],
+                "game_result": game_result,
+                "error": None,
+            }
+        ]
+    }
+
+
+def merge_game_results(state: State):
+    parsed_images = sorted(state["parsed_images"], key=lambda x: x["index"])
+    failed = [p["image_file"] for p in parsed_images if p["game_result"] is None]
+    if len(failed) == len(parsed_images):
+        raise ValueError(f"所有图片均解析失败: {failed}")
+    if failed:
+        logger.warning(f"以下图片解析失败，结果可能不完整: {failed}")
+
+    # 相邻截图可能有重叠，同名队伍只保留一份，优先保留选手信息更完整的
+    teams: dict[str, TeamResult] = {}
+    for parsed_image in parsed_images:
+        if parsed_image["game_result"] is None:
+            continue
+        for team_result in parsed_image["game_result"].teams:
+            key = normalize_team_name(team_result.team_name)
+            existing = teams.get(key)
+            if existing is None or len(team_result.players) > len(existing.players):
+                teams[key] = team_result
+
+    if not teams:
+        raise ValueError("未能从图片中解析出任何队伍")
+
+    # 排名覆盖、淘汰数等校验由 repair 节点负责
+    game_result = GameResult(teams=list(teams.values()))
     return {
         "messages": [
             HumanMessage(content=IMAGE_PARSING_PROMPT),
-            AIMessage(content=response.model_dump_json()),
+            AIMessage(content=game_result.model_dump_json()),
         ],
     }
 
 
-def compare(state: State):
+async def repair_game_result(state: State):
+    """
+    校验合并后的解析结果（淘汰数之和、排名 1..N 不重复、队伍数与 API 一致），
+    不通过时只针对有问题的部分重新询问模型：
+    - 可疑队伍：只在包含该队伍的截图上重新提取这一支队伍
+    - 缺失排名：在所有截图上只提取这些排名的队伍
+    最多进行 REPAIR_MAX_ROUNDS 轮，仍不通过时保留现有结果交给 compare 报告差异。
+    API 数据在这里取得后写入 state，compare 不再重复请求。
+    """
+    api_result = await _state_or(
+        state.get("api_result"), match_ranking_client.fetch_match_ranking
+    )
+    game_result = GameResult.model_validate_json(state["messages"][-1].content)
+    report = validate_game_result(game_result, len(api_result))
+    if report.ok or REPAIR_MAX_ROUNDS <= 0:
+        if not report.ok:
+            logger.warning(f"解析结果校验未通过: {report.describe()}")
+        return {"api_result": api_result}
+
+    uploads = dict(state["uploads"])
+    parsed_images = [p for p in state["parsed_images"] if p["game_result"] is not None]
+    images = {}
+    semaphore = asyncio.Semaphore(PARSE_CONCURRENCY)
+
+    async def ask(image_file: str, prompt: str) -> list[TeamResult]:
+        async with semaphore:
+            try:
+                if image_file not in images:
+                    images[image_file] = await load_image(
+                        image_file, uploads[image_file]
+                    )
+                # 重新提取的回答不经过缓存：被校验拒绝的回答若写入缓存，
+                # 下一轮和之后的检查会原样拿回同一个错误回答
+                result = await ask_model(
+                    images[image_file], prompt, state["use_cache"], cacheable=False
+                )
+            except Exception as e:
+                logger.warning(f"重新提取 {image_file} 失败: {e}")
+                return []
+            return result.teams
+
+    def images_with(team_name: str) -> list[str]:
+        key = normalize_team_name(team_name)
+        return [
+            p["image_file"]
+            for p in parsed_images
+            if any(
+                normalize_team_name(team.team_name) == key
+                for team in p["game_result"].teams
+            )
+        ]
+
+    for round_index in range(1, REPAIR_MAX_ROUNDS + 1):
+        logger.info(f"解析结果校验未通过，第 {round_index} 轮修复: {report.describe()}")
+        team_requests = [
+            (team_name, image_file)
+            for team_name in report.suspect_teams
+            for image_file in images_with(team_name)
+        ]
+        missing_prompt = REPAIR_MISSING_PROMPT.format(rankings=report.missing_rankings)
+        missing_images = (
+            [p["image_file"] for p in parsed_images] if report.missing_rankings else []
+        )
+        answers = await asyncio.gather(
+            *(
+                ask(image_file, REPAIR_TEAM_PROMPT.format(team_name=team_name))
+                for team_name, image_file in team_requests
+            ),
+            *(ask(image_file, missing_prompt) for image_file in missing_images),
+        )
+
+        team_answers = answers[: len(team_requests)]
+        for (team_name, _), candidates in zip(team_requests, team_answers):
+            apply_team_repair(game_result, team_name, candidates)
+        apply_missing_repair(
+            game_result,
+            report.missing_rankings,
+            [team for teams in answers[len(team_requests) :] for team in teams],
+        )
+
+        report = validate_game_result(game_result, len(api_result))
+        if report.ok:
+            break
+    if not report.ok:
+        logger.warning(f"修复后解析结果仍未通过校验: {report.describe()}")
+
+    return {
+        "api_result": api_result,
+        "messages": [AIMessage(content=game_result.model_dump_json())],
+    }
+
+
+async def run_db(config: RunnableConfig, fn: Callable[..., T], *args) -> T:
+    """
+    在数据库线程池中以本次运行的 session 执行 fn(session, *args)。
+
+    每次图运行共用一个 session（由 acheck 通过 configurable.session 传入），
+    执行完立即把连接还给连接池，避免在等待 LLM 时长期占用连接。
+    """
+    session = config.get("configurable", {}).get("session")
+
+    def _run():
+        if session is None:
+            with new_session() as own_session:
+                checkout_connection(own_session)
+                return fn(own_session, *args)
+        try:
+            checkout_connection(session)
+            return fn(session, *args)
+        finally:
+            session.close()
+
+    # run_in_executor 不会传递 contextvars，手动复制以便 SQL 耗时计入本次检查
+    context = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, context.run, _run)
+
+
+async def _state_or(value: T | None, fetch: Callable[[], Awaitable[T]]) -> T:
+    return value if value is not None else await fetch()
+
+
+async def compare(state: State, config: RunnableConfig):
     # 判断最后一条message是不是AI，如果不是，直接报错
     last_message = state["messages"][-1]
     if not isinstance(last_message, AIMessage):
@@ -268,110 +644,230 @@ def compare(state: State):
     # 把AIMessage的json字符串内容解析为pydantic对象
     game_result = GameResult.model_validate_json(last_message.content)
 
-    # 获取API数据
-    api_result = requests.get("http://139.196.72.70:8111/match_ranking").json()["data"]
+    # 名字统一成后台登记的写法，同分数据和 API 数据都按登记的名字查找
+    player_kills = await run_db(config, prepare_compare, state["game_id"])
+    if NAME_INDEX_ENABLED:
+        name_resolver.canonicalize(game_result)
+
+    # 获取API数据和同分数据，两者互不依赖，并发执行
+    api_result, tiebreak_stats = await asyncio.gather(
+        _state_or(state.get("api_result"), match_ranking_client.fetch_match_ranking),
+        _state_or(
+            state.get("tiebreak_stats"),
+            lambda: run_db(
+                config,
+                get_tiebreak_stats,
+                [team_result.team_name for team_result in game_result.teams],
+                state["stage"],
+            ),
+        ),
+    )
 
     # 比较
-    for index, team_result in enumerate(game_result.teams):
-        session = SessionLocal()
-        team_result.final_ranking = index + 1
-        team_result.tiebreak_stats = get_tiebreak_stats(
-            session, team_result.team_name, state["stage"]
+    rank_teams(game_result, tiebreak_stats)
+    error_list = compare_results(game_result.teams, api_result)
+    if player_kills:
+        # 选手名在本场的选手中模糊匹配
+        lobby = NameIndex(name_resolver.min_similarity)
+        for uid, (player_name, _) in player_kills.items():
+            lobby.upsert("player_result_stats", str(uid), player_name)
+        name_counts = Counter(player_name for player_name, _ in player_kills.values())
+        duplicates = sorted(name for name, count in name_counts.items() if count > 1)
+        if duplicates:
+            logger.warning(
+                f"比赛 {state['game_id']} 有重名选手 {duplicates}，按击杀数对应"
+            )
+        error_list.errors.extend(
+            compare_player_elims(game_result.teams, player_kills, lobby.lookup)
         )
-        session.close()
-
-    game_result.teams.sort(
-        key=lambda x: (
-            to_ranking_score.get(x.ranking, 0) + x.total_elims,
-            x.tiebreak_stats["wwcd_count"],
-            x.total_elims,
-            # x.tiebreak_stats["stage_total_kill"],
-            x.tiebreak_stats["stage_max_single_match_pts"],
-            x.tiebreak_stats["stage_max_single_match_kill"],
-            x.tiebreak_stats["last_match_total_pts"],
-            x.tiebreak_stats["last_match_total_kill"],
-            x.tiebreak_stats["last_match_place_pts"],
-        ),
-        reverse=True,
+    elif PLAYER_CHECK_ENABLED:
+        logger.info(f"比赛 {state['game_id']} 没有选手数据，跳过选手淘汰数核对")
+    return {"error_list": error_list, "game_result": game_result}
+
+
+@lru_cache(maxsize=None)
+def get_graph() -> CompiledStateGraph:
+    graph_builder = StateGraph(State)
+    graph_builder.add_node("collect", timed_node("collect", collect_images))
+    graph_builder.add_node("parser", timed_node("parser", parse_game_result_image))
+    graph_builder.add_node("merge", timed_node("merge", merge_game_results))
+    graph_builder.add_node("repair", timed_node("repair", repair_game_result))
+    graph_builder.add_node("compare", timed_node("compare", compare))
+    graph_builder.add_edge(START, "collect")
+    graph_builder.add_conditional_edges("collect", dispatch_images, ["parser"])
+    graph_builder.add_edge("parser", "merge")
+    graph_builder.add_edge("merge", "repair")
+    graph_builder.add_edge("repair", "compare")
+    graph_builder.add_edge("compare", END)
+    return graph_builder.compile()
+
+
+# result = get_graph().invoke({"game_id": "1", "stage": 6})
+# print(result["error_list"])
+
+
+async def acheck(
+    game_id: str,
+    stage: int,
+    use_cache: bool = True,
+    api_result: list[dict] | None = None,
+    tiebreak_stats: dict[str, TieBreakStats] | None = None,
+    uploads: list[tuple[str, bytes]] | None = None,
+):
+    with track_check() as timings, new_session() as session:
+        result = await get_graph().ainvoke(
+            {
+                "game_id": game_id,
+                "stage": stage,
+                "use_cache": use_cache,
+                "uploads": uploads,
+                "api_result": api_result,
+                "tiebreak_stats": tiebreak_stats,
+            },
+            config={
+                "max_concurrency": PARSE_CONCURRENCY,
+                "configurable": {"session": session},
+            },
+        )
+    input_hashes = await asyncio.to_thread(
+        hash_inputs, result.get("uploads"), result.get("image_files")
     )
+    check_history.record(
+        game_id,
+        stage,
+        result.get("game_result"),
+        result["error_list"],
+        timings,
+        input_hashes,
+    )
+    return result["error_list"]
 
-    # print(game_result)
-
-    error_list = ErrorList(errors=[])
-    for index, team_result in enumerate(game_result.teams):
-        team_name = api_result[index]["team_name"]
-        if team_result.team_name != api_result[index]["team_name"]:
-            error_list.errors.append(
-                DataError(
-                    error_type=1,
-                    team=team_name,
-                    original_data=api_result[index]["rank"],
-                    correct_data=next(
-                        team_result.final_ranking
-                        for team_result in game_result.teams
-                        if team_result.team_name == team_name
-                    ),
-                )
-            )
-            api_team_data = next(
-                team
-                for team in api_result
-                if team["team_name"] == team_result.team_name
-            )
-            if team_result.ranking != api_team_data["ingame_rank"]:
-                error_list.errors.append(
-                    DataError(
-                        error_type=2,
-                        team=team_name,
-                        original_data=api_team_data["ingame_rank"],
-                        correct_data=team_result.ranking,
-                    )
-                )
-            if team_result.total_elims != api_team_data["kill_pts"]:
-                error_list.errors.append(
-                    DataError(
-                        error_type=3,
-                        team=team_name,
-                        original_data=api_team_data["kill_pts"],
-                        correct_data=team_result.total_elims,
-                    )
-                )
-        else:
-            if team_result.ranking != api_result[index]["ingame_rank"]:
-                error_list.errors.append(
-                    DataError(
-                        error_type=2,
-                        team=team_name,
-                        original_data=api_result[index]["ingame_rank"],
-                        correct_data=team_result.ranking,
-                    )
-                )
-            if team_result.total_elims != api_result[index]["kill_pts"]:
-                error_list.errors.append(
-                    DataError(
-                        error_type=3,
-                        team=team_name,
-                        original_data=api_result[index]["kill_pts"],
-                        correct_data=team_result.total_elims,
-                    )
-                )
-    print("error_list:", error_list)
-    return {"error_list": error_list}
 
+async def _check_once(game_id: str, stage: int, use_cache: bool):
+    try:
+        return await acheck(game_id, stage, use_cache)
+    finally:
+        # 事件循环结束后就无法再关闭 API 客户端的连接
+        await match_ranking_client.aclose()
 
-graph_builder = StateGraph(State)
-graph_builder.add_node("parser", parse_game_result_image)
-graph_builder.add_node("compare", compare)
-graph_builder.add_edge(START, "parser")
-graph_builder.add_edge("parser", "compare")
-graph_builder.add_edge("compare", END)
 
-graph = graph_builder.compile()
+def check(game_id: str, stage: int, use_cache: bool = True):
+    error_list = asyncio.run(_check_once(game_id, stage, use_cache))
+    # 命令行调用时没有后台写入任务，直接写入检查历史
+    check_history.flush()
+    return error_list
 
-# result = graph.invoke({"game_id": "1", "stage": 6})
-# print(result["error_list"])
 
+async def astream_check(
+    game_id: str,
+    stage: int,
+    use_cache: bool = True,
+    uploads: list[tuple[str, bytes]] | None = None,
+) -> AsyncIterator[tuple[str, dict]]:
+    """
+    以事件流的形式运行检查，逐步产出 (event, data)：
 
-def check(game_id: str, stage: int):
-    result = graph.invoke({"game_id": game_id, "stage": stage})
-    return result["error_list"]
+    - node_start / node_end: 节点开始和结束，data 为 {"node": 节点名}
+    - parsed_image: 单张截图的解析结果（或错误信息）
+    - parsed: 合并后的 GameResult
+    - errors: 对比得到的 ErrorList
+    """
+    uploads_used, image_files, compared = uploads, None, None
+    with track_check() as timings, new_session() as session:
+        async for mode, chunk in get_graph().astream(
+            {
+                "game_id": game_id,
+                "stage": stage,
+                "use_cache": use_cache,
+                "uploads": uploads,
+            },
+            config={
+                "max_concurrency": PARSE_CONCURRENCY,
+                "configurable": {"session": session},
+            },
+            stream_mode=["tasks", "updates"],
+        ):
+            if mode == "tasks":
+                if "input" in chunk:
+                    yield "node_start", {"node": chunk["name"]}
+                continue
+
+            for node, update in chunk.items():
+                yield "node_end", {"node": node}
+                if node == "collect":
+                    # 只有从截图存储读取时 collect 才会返回 uploads
+                    uploads_used = update.get("uploads", uploads_used)
+                    image_files = update["image_files"]
+                elif node == "parser":
+                    for parsed_image in update["parsed_images"]:
+                        game_result = parsed_image["game_result"]
+                        yield "parsed_image", {
+                            "index": parsed_image["index"],
+                            "image_file": parsed_image["image_file"],
+                            "game_result": game_result and game_result.model_dump(),
+                            "error": parsed_image["error"],
+                        }
+                elif node in ("merge", "repair") and "messages" in update:
+                    game_result = GameResult.model_validate_json(
+                        update["messages"][-1].content
+                    )
+                    yield "parsed", game_result.model_dump()
+                elif node == "compare":
+                    compared = update
+                    yield "errors", update["error_list"].model_dump()
+    if compared is not None:
+        input_hashes = await asyncio.to_thread(hash_inputs, uploads_used, image_files)
+        check_history.record(
+            game_id,
+            stage,
+            compared["game_result"],
+            compared["error_list"],
+            timings,
+            input_hashes,
+        )
+
+
+async def abatch_check(
+    game_ids: list[str],
+    stage: int,
+    use_cache: bool = True,
+    uploads: list[tuple[str, bytes]] | None = None,
+) -> AsyncIterator[tuple[str, ErrorList | Exception]]:
+    """
+    批量复查同一赛段的多场比赛，按完成顺序逐个产出 (game_id, 结果)。
+
+    每场比赛与 match_ranking 中这场比赛自己的数据对比，同分数据只累加到这场比赛为止
+    （见 get_game_snapshots），整个赛段只读取一次。
+    match_ranking 中还没有数据的比赛（通常是正在进行的这一场）使用 API 的当前数据
+    和整个赛段的同分数据，同样只获取一次。
+    同时运行的比赛数量受 BATCH_CONCURRENCY 限制。
+    单场失败时产出对应的异常，不影响其它比赛。
+    uploads 中包含各场比赛的截图，每场只使用文件名与其 game_id 匹配的部分。
+    """
+    with new_session() as session:
+        config = {"configurable": {"session": session}}
+        snapshots = await run_db(config, get_game_snapshots, stage, game_ids)
+        if any(game_id not in snapshots for game_id in game_ids):
+            api_result, tiebreak_stats = await asyncio.gather(
+                match_ranking_client.fetch_match_ranking(),
+                run_db(config, get_tiebreak_stats, None, stage),
+            )
+            for game_id in game_ids:
+                snapshots.setdefault(game_id, (api_result, tiebreak_stats))
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def _run(game_id: str):
+        async with semaphore:
+            try:
+                api_result, tiebreak_stats = snapshots[game_id]
+                error_list = await acheck(
+                    game_id, stage, use_cache, api_result, tiebreak_stats, uploads
+                )
+            except Exception as e:
+                logger.exception(f"复查比赛 {game_id} 失败: {e}")
+                return game_id, e
+            return game_id, error_list
+
+    for next_done in asyncio.as_completed([_run(game_id) for game_id in game_ids]):
+        yield await next_done
@@ -0,0 +1,225 @@
+"""
+检查历史：每次检查排名后的解析结果、错误列表、耗时明细和截图哈希写入 check_result 表。
+
+检查完成时只把记录放入内存缓冲区，由后台任务每隔 CHECK_HISTORY_FLUSH_SECONDS 秒或攒够
+CHECK_HISTORY_BATCH_SIZE 条时用一条批量 INSERT 写入，请求路径上不访问数据库。
+查询按 id 倒序做 keyset 分页（WHERE id < before），翻页不需要 OFFSET 扫描。
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+from datetime import datetime
+from typing import Callable
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from comparison import ERROR_TYPES
+from metrics import CheckTimings
+from models import CheckResult, get_engine
+from schemas import ErrorList, GameResult
+
+load_dotenv()
+
+
+def error_type_mask(error_list: ErrorList) -> int:
+    mask = 0
+    for error in error_list.errors:
+        mask |= 1 << error.error_type
+    return mask
+
+
+def error_types_from_mask(mask: int) -> list[int]:
+    return [
+        error_type for error_type in range(mask.bit_length()) if mask >> error_type & 1
+    ]
+
+
+def hash_inputs(
+    uploads: list[tuple[str, bytes]] | None, image_files: list[str] | None
+) -> list[dict]:
+    """
+    本场比赛实际使用的截图的文件名和 SHA-256。
+    批量复查时 uploads 包含所有比赛的截图，只计算 image_files 中的部分；
+    截图较大时耗时明显，调用方应放到线程中执行，不阻塞事件循环。
+    """
+    used = set(image_files or [])
+    return [
+        {"name": name, "sha256": hashlib.sha256(content).hexdigest()}
+        for name, content in uploads or []
+        if name in used
+    ]
+
+
+class CheckHistory:
+    def __init__(
+        self,
+        enabled: bool,
+        batch_size: int,
+        flush_seconds: float,
+        max_buffered: int,
+        session_factory: Callable[[], Session] | None = None,
+    ):
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.session_factory = session_factory or (lambda: Session(get_engine()))
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def record(
+        self,
+        game_id: str,
+        stage: int,
+        game_result: GameResult | None,
+        error_list: ErrorList,
+        timings: CheckTimings | None,
+        input_hashes: list[dict],
+    ):
+        """记录一次检查，只放入缓冲区。截图只保留哈希（见 hash_inputs），不持有截图内容"""
+        if not self.enabled:
+            return
+        timings_dict = None
+        if timings is not None:
+            timings_dict = timings.as_dict()
+            if timings_dict["total_seconds"] is None:
+                # 外层还在统计中（如 /upload 外面包了一层），按当前时间计算
+                timings_dict["total_seconds"] = timings.elapsed()
+        row = {
+            "game_id": game_id,
+            "stage": stage,
+            "error_count": len(error_list.errors),
+            "error_types": error_type_mask(error_list),
+            "game_result": game_result and game_result.model_dump(mode="json"),
+            "error_list": error_list.model_dump(mode="json"),
+            "timings": timings_dict,
+            "input_hashes": input_hashes,
+            "created_at": datetime.now(),
+        }
+        with self._lock:
+            if len(self._buffer) >= self.max_buffered:
+                self._buffer.pop(0)
+                logger.warning("检查历史缓冲区已满，丢弃最早的一条记录")
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.batch_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """把缓冲区中的记录用一条批量 INSERT 写入，返回写入的条数；失败时放回缓冲区"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            with self.session_factory() as session:
+                session.execute(insert(CheckResult), rows)
+                session.commit()
+        except Exception as e:
+            logger.warning(f"写入检查历史失败（{len(rows)} 条）: {e!r}")
+            with self._lock:
+                self._buffer = (rows + self._buffer)[-self.max_buffered :]
+            return 0
+        return len(rows)
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="check-history")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            await asyncio.to_thread(self.flush)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+def list_checks(
+    session: Session,
+    game_id: str | None = None,
+    stage: int | None = None,
+    error_type: int | None = None,
+    before: int | None = None,
+    limit: int = 50,
+) -> tuple[list[dict], int | None]:
+    """
+    按 id 倒序列出检查历史的摘要（不读取 JSON 列），
+    返回 (记录, 下一页的 before)；没有更多记录时后者为 None。
+    """
+    if error_type is not None and error_type not in ERROR_TYPES:
+        raise ValueError(f"未知的错误类型: {error_type}")
+    query = select(
+        CheckResult.id,
+        CheckResult.game_id,
+        CheckResult.stage,
+        CheckResult.error_count,
+        CheckResult.error_types,
+        CheckResult.created_at,
+    )
+    if game_id is not None:
+        query = query.where(CheckResult.game_id == game_id)
+    if stage is not None:
+        query = query.where(CheckResult.stage == stage)
+    if error_type is not None:
+        query = query.where(CheckResult.error_types.op("&")(1 << error_type) != 0)
+    if before is not None:
+        query = query.where(CheckResult.id < before)
+    rows = session.execute(query.order_by(CheckResult.id.desc()).limit(limit + 1)).all()
+
+    items = [
+        {
+            "id": row.id,
+            "game_id": row.game_id,
+            "stage": row.stage,
+            "error_count": row.error_count,
+            "error_types": error_types_from_mask(row.error_types),
+            "created_at": row.created_at.isoformat(),
+        }
+        for row in rows[:limit]
+    ]
+    next_before = items[-1]["id"] if len(rows) > limit else None
+    return items, next_before
+
+
+def get_check(session: Session, check_id: int) -> dict | None:
+    row = session.get(CheckResult, check_id)
+    if row is None:
+        return None
+    return {
+        "id": row.id,
+        "game_id": row.game_id,
+        "stage": row.stage,
+        "error_count": row.error_count,
+        "error_types": error_types_from_mask(row.error_types),
+        "game_result": row.game_result,
+        "error_list": row.error_list,
+        "timings": row.timings,
+        "input_hashes": row.input_hashes,
+        "created_at": row.created_at.isoformat(),
+    }
+
+
+check_history = CheckHistory(
+    enabled=os.getenv("CHECK_HISTORY_ENABLED", "true").lower() == "true",
+    batch_size=int(os.getenv("CHECK_HISTORY_BATCH_SIZE", "50")),
+    flush_seconds=float(os.getenv("CHECK_HISTORY_FLUSH_SECONDS", "2")),
+    max_buffered=int(os.getenv("CHECK_HISTORY_MAX_BUFFERED", "1000")),
+)
@@ -0,0 +1,352 @@
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterator
+
+from dotenv import load_dotenv
+from loguru import logger
+from pydantic import BaseModel
+
+from graph import acheck
+
+load_dotenv()
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def make_dedup_key(
+    game_id: str, stage: int, use_cache: bool, files: list[tuple[str, bytes]]
+) -> str:
+    """同一场比赛、同一批截图内容的提交得到相同的 key"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([game_id, stage, use_cache]).encode())
+    for filename, content in sorted(files):
+        digest.update(filename.encode())
+        digest.update(hashlib.sha256(content).digest())
+    return digest.hexdigest()
+
+
+def make_owner_id() -> str:
+    """标识一个正在运行的进程，进程重启后得到新的 ID"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class JobStore:
+    """
+    任务状态和结果的持久化存储（SQLite），同一台主机上的多个 worker 进程共用。
+
+    每个任务记录提交它的进程（owner）；各进程定期在 job_owners 表中续约心跳。
+    心跳超过 lease_seconds 未更新的进程视为已退出，它未完成的任务才会被标记为失败，
+    不会误伤仍在运行的其它 worker 的任务。
+    """
+
+    def __init__(self, path: str, retention_seconds: int, lease_seconds: int = 60):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    dedup_key TEXT NOT NULL,
+                    game_id TEXT NOT NULL,
+                    stage INTEGER NOT NULL,
+                    use_cache INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    owner TEXT
+                )
+                """)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                # 旧版本创建的任务表没有 owner 列
+                try:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+                except sqlite3.OperationalError:
+                    # 同时启动的其它 worker 已经添加
+                    pass
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_jobs_finished_at ON jobs (finished_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_jobs_status_owner ON jobs (status, owner)"
+            )
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_owners (
+                    owner TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+                """)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def create(
+        self,
+        job_id: str,
+        dedup_key: str,
+        game_id: str,
+        stage: int,
+        use_cache: bool,
+        owner: str,
+    ):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, dedup_key, game_id, stage, use_cache, status, created_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    dedup_key,
+                    game_id,
+                    stage,
+                    int(use_cache),
+                    QUEUED,
+                    time.time(),
+                    owner,
+                ),
+            )
+
+    def get(self, job_id: str) -> dict | None:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def mark_running(self, job_id: str):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), job_id),
+            )
+
+    def mark_finished(
+        self, job_id: str, status: str, result: str | None, error: str | None
+    ):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, now, job_id),
+            )
+            conn.execute(
+                "DELETE FROM jobs WHERE finished_at < ?",
+                (now - self.retention_seconds,),
+            )
+
+    def heartbeat(self, owner: str):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_owners (owner, heartbeat_at) VALUES (?, ?)",
+                (owner, time.time()),
+            )
+
+    def release(self, owner: str):
+        """进程正常退出时注销，它的任务已在退出前标记完成或失败"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_owners WHERE owner = ?", (owner,))
+
+    def fail_orphaned(self, error: str) -> int:
+        """
+        把心跳已过期的进程（崩溃或被强制结束）中未完成的任务标记为失败，
+        这些任务的截图只保存在那个进程的内存里，不会再被执行。
+        没有 owner 的任务来自旧版本，提交超过 lease_seconds 后才视为中断。
+        """
+        now = time.time()
+        expired = now - self.lease_seconds
+        with self._connect() as conn:
+            conn.execute("DELETE FROM job_owners WHERE heartbeat_at < ?", (expired,))
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? "
+                "WHERE status IN (?, ?) AND ("
+                "  (owner IS NULL AND created_at < ?)"
+                "  OR (owner IS NOT NULL AND owner NOT IN (SELECT owner FROM job_owners))"
+                ")",
+                (FAILED, error, now, QUEUED, RUNNING, expired),
+            )
+            return cursor.rowcount
+
+
+class JobQueue:
+    """
+    进程内的有界任务队列。
+
+    - 提交后立即返回任务 ID，由固定数量的后台 worker 依次执行
+    - 队列已满时抛出 QueueFullError，由调用方返回 429 让客户端稍后重试
+    - dedup_key 相同且仍在排队/执行中的任务直接复用，不重复执行
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        run: Callable[..., Awaitable[BaseModel]],
+        workers: int,
+        max_queued: int,
+    ):
+        self.store = store
+        self.run = run
+        self.workers = workers
+        self.max_queued = max_queued
+        self.owner = make_owner_id()
+        self._queue: asyncio.Queue[str] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._inflight: dict[str, str] = {}
+        # 排队中任务的截图内容只保存在内存里，不落盘
+        self._uploads: dict[str, list[tuple[str, bytes]]] = {}
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        await asyncio.to_thread(self.store.heartbeat, self.owner)
+        await self._fail_orphaned()
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._keepalive(), name="job-keepalive"))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.store.release, self.owner)
+
+    async def _fail_orphaned(self):
+        failed = await asyncio.to_thread(self.store.fail_orphaned, "服务重启，任务中断")
+        if failed:
+            logger.warning(f"{failed} 个已退出进程中未完成的任务被标记为失败")
+
+    async def _keepalive(self):
+        """续约本进程的心跳，并顺带清理已退出进程留下的任务"""
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, self.owner)
+                await self._fail_orphaned()
+            except Exception as e:
+                logger.warning(f"任务队列心跳失败: {e!r}")
+
+    def inflight_job(self, dedup_key: str) -> str | None:
+        return self._inflight.get(dedup_key)
+
+    def ensure_capacity(self):
+        if self._queue is None:
+            raise RuntimeError("任务队列尚未启动")
+        if self._queue.full():
+            raise QueueFullError("任务队列已满")
+
+    async def submit(
+        self,
+        dedup_key: str,
+        game_id: str,
+        stage: int,
+        use_cache: bool,
+        uploads: list[tuple[str, bytes]] | None = None,
+    ) -> tuple[str, bool]:
+        """返回 (任务 ID, 是否新建)"""
+        if dedup_key in self._inflight:
+            return self._inflight[dedup_key], False
+        self.ensure_capacity()
+
+        job_id = uuid.uuid4().hex
+        self._inflight[dedup_key] = job_id
+        try:
+            await asyncio.to_thread(
+                self.store.create,
+                job_id,
+                dedup_key,
+                game_id,
+                stage,
+                use_cache,
+                self.owner,
+            )
+            self._uploads[job_id] = uploads
+            self._queue.put_nowait(job_id)
+        except BaseException:
+            self._inflight.pop(dedup_key, None)
+            self._uploads.pop(job_id, None)
+            raise
+        return job_id, True
+
+    async def get(self, job_id: str) -> dict | None:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is not None and job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._execute(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        uploads = self._uploads.pop(job_id, None)
+        try:
+            await asyncio.to_thread(self.store.mark_running, job_id)
+            result = await self.run(
+                job["game_id"], job["stage"], bool(job["use_cache"]), uploads=uploads
+            )
+            await asyncio.to_thread(
+                self.store.mark_finished,
+                job_id,
+                SUCCEEDED,
+                result.model_dump_json(),
+                None,
+            )
+        except asyncio.CancelledError:
+            await asyncio.to_thread(
+                self.store.mark_finished, job_id, FAILED, None, "服务关闭，任务中断"
+            )
+            raise
+        except Exception as e:
+            logger.exception(f"任务 {job_id} 执行失败: {e}")
+            await asyncio.to_thread(
+                self.store.mark_finished, job_id, FAILED, None, str(e)
+            )
+        finally:
+            self._inflight.pop(job["dedup_key"], None)
+
+
+@lru_cache(maxsize=None)
+def get_job_queue() -> JobQueue:
+    """首次使用时才创建任务库（SQLite 文件），导入本模块没有副作用"""
+    job_store = JobStore(
+        path=os.getenv("JOB_DB_PATH", "./cache/jobs.sqlite3"),
+        retention_seconds=int(os.getenv("JOB_RETENTION_SECONDS", str(24 * 3600))),
+        lease_seconds=int(os.getenv("JOB_LEASE_SECONDS", "60")),
+    )
+    return JobQueue(
+        job_store,
+        run=acheck,
+        workers=int(os.getenv("JOB_WORKERS", "2")),
+        max_queued=int(os.getenv("JOB_QUEUE_SIZE", "20")),
+    )
@@ -1,14 +1,50 @@
+import time
+
+# 进程启动时间，用于统计启动耗时
+STARTED_AT = time.perf_counter()
+
+import json
 import os
-import shutil
-from fastapi import FastAPI, Form, HTTPException, UploadFile
+from contextlib import asynccontextmanager
+from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, UploadFile
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from graph import check
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from api_client import match_ranking_client
+from comparison import ERROR_TYPES
+from graph import abatch_check, acheck, astream_check, run_db
+from history import check_history, get_check, list_checks
+from jobs import QueueFullError, get_job_queue, make_dedup_key
+from metrics import UPLOAD_BYTES, render_metrics, track_check
+from screenshot_store import get_screenshot_store, parse_game_id
+from warmup import warmup
 from loguru import logger
 import uvicorn
 import sys
 
-app = FastAPI()
+# 单个截图文件的大小上限
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+# 是否把上传的截图存入截图存储，检查本身不依赖磁盘上的文件
+ARCHIVE_UPLOADS = os.getenv("ARCHIVE_UPLOADS", "true").lower() == "true"
+# 检查历史每页的最大条数
+HISTORY_PAGE_MAX = 200
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await get_job_queue().start()
+    await check_history.start()
+    # LLM 客户端、数据库连接和图都在后台预热，不阻塞 worker 开始接收请求
+    warmup.start()
+    app.state.startup_seconds = time.perf_counter() - STARTED_AT
+    logger.info(f"服务启动完成，耗时 {app.state.startup_seconds:.3f}s")
+    yield
+    await warmup.stop()
+    await get_job_queue().stop()
+    await check_history.stop()
+    await match_ranking_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # disabled, all logs should be managed by systemd
 logger.configure(
@@ -37,34 +73,98 @@ def favicon():
     return FileResponse("static/favicon.svg")
 
 
+@app.get("/healthz")
+def healthz():
+    """进程存活即返回 200"""
+    return {
+        "status": "ok",
+        "startup_seconds": app.state.startup_seconds,
+        "uptime_seconds": time.perf_counter() - STARTED_AT,
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+@app.get("/readyz")
+async def readyz():
+    """所有组件预热完成时返回 200，否则返回 503 并重新预热失败的组件"""
+    if not warmup.ready:
+        warmup.start()
+    return JSONResponse(
+        status_code=200 if warmup.ready else 503,
+        content={"ready": warmup.ready, "components": warmup.status()},
+    )
+
+
+async def read_uploads(files: list[UploadFile]) -> list[tuple[str, bytes]]:
+    # UploadFile 由 starlette 先缓存在内存、超过阈值后转存临时文件，这里只按上限读取
+    uploads = []
+    for file in files:
+        content = await file.read(UPLOAD_MAX_BYTES + 1)
+        if len(content) > UPLOAD_MAX_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"{file.filename} exceeds {UPLOAD_MAX_BYTES} bytes",
+            )
+        UPLOAD_BYTES.observe(len(content))
+        uploads.append((file.filename, content))
+    return uploads
+
+
+def write_uploads(uploads: list[tuple[str, bytes]]):
+    # 按文件名中的 game_id 分组保存，同名截图会被替换
+    by_game: dict[str, list[tuple[str, bytes]]] = {}
+    for filename, content in uploads:
+        game_id = parse_game_id(filename)
+        if game_id is None:
+            logger.warning(
+                f"截图文件名不符合 {{game_id}}_rank_{{number}} 格式: {filename}"
+            )
+            continue
+        by_game.setdefault(game_id, []).append((filename, content))
+    for game_id, images in by_game.items():
+        get_screenshot_store().save(game_id, images)
+
+
+def archive_uploads(
+    background_tasks: BackgroundTasks, uploads: list[tuple[str, bytes]]
+):
+    """响应返回后再把截图写入截图存储，不阻塞检查"""
+    if ARCHIVE_UPLOADS:
+        background_tasks.add_task(write_uploads, uploads)
+
+
 @app.post("/upload")
 async def upload(
-    files: list[UploadFile], game_id: str = Form(...), stage: int = Form(...)
+    files: list[UploadFile],
+    background_tasks: BackgroundTasks,
+    game_id: str = Form(...),
+    stage: int = Form(...),
+    no_cache: bool = Form(False),
+    timings: bool = Form(False),
 ):
+    """timings 为真时在响应中附带本次检查的耗时明细"""
     try:
-        for file in files:
-            file_location = f"./images/{file.filename}"
-            # 如果存在相同的截图文件，则替换
-            without_ext, _ = os.path.splitext(file_location)
-            potential_path = [
-                f"{without_ext}.jpg",
-                f"{without_ext}.jpeg",
-                f"{without_ext}.png",
-            ]
-            for path in potential_path:
-                if os.path.exists(path):
-                    os.remove(path)
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+        uploads = await read_uploads(files)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.exception(f"error handling file upload: {e}")
         raise HTTPException(
             status_code=500,
             detail="error handling file upload",
         )
+    archive_uploads(background_tasks, uploads)
 
     try:
-        error_list = check(game_id, stage)
+        with track_check() as check_timings:
+            error_list = await acheck(
+                game_id, stage, use_cache=not no_cache, uploads=uploads
+            )
     except Exception as e:
         logger.exception(f"error checking game result: {e}")
         raise HTTPException(
@@ -72,7 +172,225 @@ async def upload(
             detail="error checking game result",
         )
 
-    return {"error_list": error_list}
+    if not timings:
+        return {"error_list": error_list}
+    return {
+        "error_list": error_list,
+        "timings": {
+            **check_timings.as_dict(),
+            "upload_bytes": sum(len(content) for _, content in uploads),
+        },
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    files: list[UploadFile],
+    background_tasks: BackgroundTasks,
+    game_id: str = Form(...),
+    stage: int = Form(...),
+    no_cache: bool = Form(False),
+):
+    """
+    与 /upload 相同，但不等待检查完成：立即返回 202 和任务 ID，
+    由后台 worker 执行检查，结果通过 GET /jobs/{job_id} 查询。
+    相同内容的任务仍在排队或执行时直接返回已有任务的 ID；
+    队列已满时返回 429，客户端应稍后重试。
+    """
+    use_cache = not no_cache
+    try:
+        uploads = await read_uploads(files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"error handling file upload: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="error handling file upload",
+        )
+
+    job_queue = get_job_queue()
+    dedup_key = make_dedup_key(game_id, stage, use_cache, uploads)
+    job_id = job_queue.inflight_job(dedup_key)
+    if job_id is not None:
+        return {"job_id": job_id, "created": False}
+
+    try:
+        job_id, created = await job_queue.submit(
+            dedup_key, game_id, stage, use_cache, uploads
+        )
+    except QueueFullError:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "too many pending jobs"},
+            headers={"Retry-After": "10"},
+        )
+    except Exception as e:
+        logger.exception(f"error submitting job: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="error submitting job",
+        )
+
+    if created:
+        archive_uploads(background_tasks, uploads)
+    return {"job_id": job_id, "created": created}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return {
+        "job_id": job["id"],
+        "game_id": job["game_id"],
+        "stage": job["stage"],
+        "status": job["status"],
+        "error_list": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/upload/stream")
+async def upload_stream(
+    files: list[UploadFile],
+    background_tasks: BackgroundTasks,
+    game_id: str = Form(...),
+    stage: int = Form(...),
+    no_cache: bool = Form(False),
+):
+    """
+    与 /upload 相同，但以 Server-Sent Events 推送检查进度：
+    节点开始/结束、每张截图的解析结果、合并后的解析结果，最后是错误列表。
+    客户端断开连接时检查随之取消。
+    """
+    try:
+        uploads = await read_uploads(files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"error handling file upload: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="error handling file upload",
+        )
+    archive_uploads(background_tasks, uploads)
+
+    async def events():
+        try:
+            async for event, data in astream_check(
+                game_id, stage, use_cache=not no_cache, uploads=uploads
+            ):
+                yield _sse(event, data)
+        except Exception as e:
+            logger.exception(f"error checking game result: {e}")
+            yield _sse("error", {"detail": "error checking game result"})
+            return
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/batch")
+async def batch(
+    background_tasks: BackgroundTasks,
+    game_ids: list[str] = Form(...),
+    stage: int = Form(...),
+    files: list[UploadFile] = File(default=[]),
+    no_cache: bool = Form(False),
+):
+    """
+    批量复查同一赛段的多场比赛。
+
+    截图文件名需为 {game_id}_rank_{number}.ext；没有上传截图的比赛使用
+    截图存储中之前保存的截图（解析结果通常已在缓存中）。
+    每场比赛与 match_ranking 中这场比赛自己的数据及当时的同分数据对比，
+    还没有数据的比赛与 API 的当前数据对比。
+    每场比赛完成后立即以一行 JSON (NDJSON) 返回，先完成的先返回。
+    """
+    try:
+        uploads = await read_uploads(files)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception(f"error handling file upload: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="error handling file upload",
+        )
+    archive_uploads(background_tasks, uploads)
+
+    async def results():
+        try:
+            async for game_id, result in abatch_check(
+                game_ids, stage, use_cache=not no_cache, uploads=uploads
+            ):
+                if isinstance(result, Exception):
+                    line = {"game_id": game_id, "error": "error checking game result"}
+                else:
+                    line = {"game_id": game_id, "error_list": result.model_dump()}
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+        except Exception as e:
+            logger.exception(f"error checking batch: {e}")
+            yield json.dumps({"error": "error checking batch"}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.get("/history")
+async def history(
+    game_id: str | None = None,
+    stage: int | None = None,
+    error_type: int | None = None,
+    before: int | None = None,
+    limit: int = 50,
+):
+    """
+    检查历史，按时间倒序分页。下一页把上一页返回的 next_before 作为 before 传入，
+    next_before 为 null 时没有更多记录。
+    """
+    if not 1 <= limit <= HISTORY_PAGE_MAX:
+        raise HTTPException(
+            status_code=422, detail=f"limit must be between 1 and {HISTORY_PAGE_MAX}"
+        )
+    if error_type is not None and error_type not in ERROR_TYPES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"error_type must be between {ERROR_TYPES.start} and "
+            f"{ERROR_TYPES.stop - 1}",
+        )
+    try:
+        items, next_before = await run_db(
+            {}, list_checks, game_id, stage, error_type, before, limit
+        )
+    except Exception as e:
+        logger.exception(f"error listing check history: {e}")
+        raise HTTPException(status_code=500, detail="error listing check history")
+    return {"items": items, "next_before": next_before}
+
+
+@app.get("/history/{check_id}")
+async def history_detail(check_id: int):
+    try:
+        check = await run_db({}, get_check, check_id)
+    except Exception as e:
+        logger.exception(f"error loading check history: {e}")
+        raise HTTPException(status_code=500, detail="error loading check history")
+    if check is None:
+        raise HTTPException(status_code=404, detail="check not found")
+    return check
 
 
 # only enabled when developing
@@ -0,0 +1,281 @@
+"""
+Prometheus 指标，以及单次检查的耗时明细。
+
+进程级的直方图/计数器通过 /metrics 暴露；检查过程中的耗时同时累加到
+当前上下文的 CheckTimings 中，/upload 可以把它作为本次请求的耗时明细返回。
+使用 gunicorn 多进程部署时设置 PROMETHEUS_MULTIPROC_DIR，由各进程共享指标。
+"""
+
+import asyncio
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+NODE_SECONDS = Histogram(
+    "resultschecker_node_duration_seconds",
+    "LangGraph 节点耗时",
+    ["node"],
+)
+CHECK_SECONDS = Histogram(
+    "resultschecker_check_duration_seconds",
+    "单场比赛检查的端到端耗时",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+LLM_SECONDS = Histogram(
+    "resultschecker_llm_duration_seconds",
+    "单次 LLM 解析调用耗时",
+    buckets=(0.5, 1, 2, 5, 10, 20, 30, 60),
+)
+API_SECONDS = Histogram(
+    "resultschecker_match_ranking_api_duration_seconds",
+    "match_ranking 接口单次 HTTP 请求耗时",
+    ["outcome"],
+)
+DB_QUERIES = Counter(
+    "resultschecker_db_queries_total",
+    "执行的 SQL 语句数",
+)
+DB_QUERY_SECONDS = Histogram(
+    "resultschecker_db_query_duration_seconds",
+    "单条 SQL 语句耗时",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_QUERIES_PER_CHECK = Histogram(
+    "resultschecker_db_queries_per_check",
+    "单场比赛检查执行的 SQL 语句数",
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+DB_POOL_EVENTS = Counter(
+    "resultschecker_db_pool_events_total",
+    "数据库连接池事件数：connect 新建连接, checkout 取出, checkin 归还, invalidate 作废",
+    ["event"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "resultschecker_db_pool_wait_seconds",
+    "从连接池获取连接的等待时间",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "resultschecker_db_pool_connections",
+    "连接池状态：size 常驻连接数, checked_out 使用中的连接数, overflow 溢出连接数",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+UPLOAD_BYTES = Histogram(
+    "resultschecker_upload_bytes",
+    "上传的单个截图文件大小",
+    buckets=(64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6),
+)
+
+
+class CheckTimings:
+    """单次检查的耗时明细，节点可能并发执行（如多个 parser），累加时加锁"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.total_seconds: float | None = None
+        self.nodes: dict[str, list[float]] = {}
+        self.llm_seconds = 0.0
+        self.api_seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add_node(self, node: str, seconds: float):
+        with self._lock:
+            self.nodes.setdefault(node, []).append(seconds)
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + seconds)
+
+    def add_query(self, seconds: float):
+        with self._lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "total_seconds": self.total_seconds,
+                "nodes": {
+                    node: {
+                        "calls": len(values),
+                        "seconds": sum(values),
+                        "max_seconds": max(values),
+                    }
+                    for node, values in self.nodes.items()
+                },
+                "llm_seconds": self.llm_seconds,
+                "api_seconds": self.api_seconds,
+                "db_queries": self.db_queries,
+                "db_seconds": self.db_seconds,
+            }
+
+
+current_timings: ContextVar[CheckTimings | None] = ContextVar(
+    "current_timings", default=None
+)
+
+
+@contextmanager
+def track_check() -> Iterator[CheckTimings]:
+    """
+    统计一次检查。已处于某次检查的统计中时直接复用外层的 CheckTimings，
+    因此调用方可以在 acheck 外再包一层以取得明细。
+    """
+    timings = current_timings.get()
+    if timings is not None:
+        yield timings
+        return
+
+    timings = CheckTimings()
+    token = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+        timings.total_seconds = time.perf_counter() - timings.started
+        CHECK_SECONDS.observe(timings.total_seconds)
+        DB_QUERIES_PER_CHECK.observe(timings.db_queries)
+
+
+def observe_llm(seconds: float):
+    LLM_SECONDS.observe(seconds)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add("llm_seconds", seconds)
+
+
+def observe_api_wait(seconds: float):
+    """检查等待 API 数据的时间（包括命中缓存、共享同一次请求的情况）"""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add("api_seconds", seconds)
+
+
+def observe_query(seconds: float):
+    DB_QUERIES.inc()
+    DB_QUERY_SECONDS.observe(seconds)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add_query(seconds)
+
+
+def observe_pool_event(event: str):
+    DB_POOL_EVENTS.labels(event=event).inc()
+
+
+def observe_pool_wait(seconds: float):
+    DB_POOL_WAIT_SECONDS.observe(seconds)
+
+
+def observe_pool_state(size: int, checked_out: int, overflow: int):
+    DB_POOL_CONNECTIONS.labels(state="size").set(size)
+    DB_POOL_CONNECTIONS.labels(state="checked_out").set(checked_out)
+    # 未用满常驻连接时 QueuePool.overflow() 为负数
+    DB_POOL_CONNECTIONS.labels(state="overflow").set(max(overflow, 0))
+
+
+def track_pool(bind: Engine):
+    """连接池事件和使用情况记入 Prometheus 指标，由 /metrics 暴露"""
+    pool = bind.pool
+
+    def on_event(event_name: str):
+        def listener(*args):
+            observe_pool_event(event_name)
+            if not isinstance(pool, QueuePool):
+                return
+            checked_out, overflow = pool.checkedout(), pool.overflow()
+            if event_name == "checkin":
+                # checkin 事件在连接放回连接池之前触发；
+                # 队列已满（借出的全是溢出连接）时这个连接会被关闭，溢出数减一
+                if checked_out == overflow > 0:
+                    overflow -= 1
+                checked_out -= 1
+            observe_pool_state(pool.size(), checked_out, overflow)
+
+        return listener
+
+    for event_name in ("connect", "checkout", "checkin", "invalidate"):
+        event.listen(bind, event_name, on_event(event_name))
+
+
+def track_queries(bind: Engine):
+    """记录每条 SQL 语句的耗时，计入 Prometheus 指标和当前检查的耗时明细"""
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        observe_query(time.perf_counter() - conn.info["query_started"].pop())
+
+    event.listen(bind, "before_cursor_execute", before)
+    event.listen(bind, "after_cursor_execute", after)
+
+
+def checkout_connection(session: Session):
+    """为 session 获取数据库连接，并记录在连接池上等待的时间"""
+    start = time.perf_counter()
+    session.connection()
+    observe_pool_wait(time.perf_counter() - start)
+
+
+def timed_node(name: str, fn: Callable) -> Callable:
+    """包装 LangGraph 节点，记录节点耗时；保留原函数签名，节点仍能拿到 config"""
+
+    def _observe(seconds: float):
+        NODE_SECONDS.labels(node=name).observe(seconds)
+        timings = current_timings.get()
+        if timings is not None:
+            timings.add_node(name, seconds)
+
+    if asyncio.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                _observe(time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
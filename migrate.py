@@ -0,0 +1,119 @@
+"""
+数据库表和索引引导脚本。
+
+    python migrate.py create-tables
+        创建本服务自己写入的表（检查历史 check_result），其余表由后台维护
+    python migrate.py create-indexes
+        在数据库中创建 models 中声明、但尚不存在的索引
+    python migrate.py check-indexes
+        EXPLAIN 同分数据查询，查询未命中索引时以非零状态退出
+    python migrate.py check-indexes --url sqlite://
+        在临时 SQLite 库中建表后再检查，不依赖线上 MySQL，可用于 CI
+"""
+
+import argparse
+import sys
+
+from sqlalchemy import Engine, create_engine, inspect, text
+
+from models import Base, CheckResult, MatchRanking, get_engine
+
+# 本服务自己写入的表
+OWNED_TABLES = [CheckResult.__table__]
+
+
+def create_tables(bind: Engine) -> list[str]:
+    for table in OWNED_TABLES:
+        table.create(bind=bind, checkfirst=True)
+    return [table.name for table in OWNED_TABLES]
+
+
+def create_indexes(bind: Engine) -> list[str]:
+    """
+    数据库中还不存在的表跳过（本服务自己的表先执行 create-tables 创建，
+    建表时会一并创建索引）
+    """
+    existing = set(inspect(bind).get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+            created.append(index.name)
+    return created
+
+
+def explain_tiebreak_query(bind: Engine) -> list[str]:
+    """
+    返回同分数据查询在 match_ranking 表上的访问方式，每行一条。
+    未使用索引的访问以 "FULL SCAN" 开头。
+    """
+    from graph import tiebreak_stats_query
+
+    sql = str(
+        tiebreak_stats_query(["team_a", "team_b"], 1).compile(
+            bind, compile_kwargs={"literal_binds": True}
+        )
+    )
+    table = MatchRanking.__tablename__
+    plans = []
+    with bind.connect() as conn:
+        if bind.dialect.name == "sqlite":
+            for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).mappings():
+                detail = row["detail"]
+                if f" {table} " not in f"{detail} ":
+                    continue
+                if "USING" in detail and "INDEX" in detail:
+                    plans.append(detail)
+                else:
+                    plans.append(f"FULL SCAN: {detail}")
+        else:
+            for row in conn.execute(text(f"EXPLAIN {sql}")).mappings():
+                if row["table"] != table:
+                    continue
+                if row["key"] is None or row["type"] == "ALL":
+                    plans.append(f"FULL SCAN: type={row['type']} key={row['key']}")
+                else:
+                    plans.append(f"type={row['type']} key={row['key']}")
+    return plans
+
+
+def check_indexes(bind: Engine) -> bool:
+    plans = explain_tiebreak_query(bind)
+    for plan in plans:
+        print(plan)
+    if not plans:
+        print(f"查询计划中未找到 {MatchRanking.__tablename__} 表")
+        return False
+    return not any(plan.startswith("FULL SCAN") for plan in plans)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库表、索引引导与检查")
+    parser.add_argument(
+        "command", choices=["create-tables", "create-indexes", "check-indexes"]
+    )
+    parser.add_argument(
+        "--url", help="数据库连接串，默认使用 .env 中配置的 MySQL", default=None
+    )
+    args = parser.parse_args()
+
+    bind = create_engine(args.url) if args.url else get_engine()
+    if args.url and bind.dialect.name == "sqlite":
+        MatchRanking.__table__.create(bind, checkfirst=True)
+        create_tables(bind)
+
+    if args.command == "create-tables":
+        for name in create_tables(bind):
+            print(f"table ok: {name}")
+    elif args.command == "create-indexes":
+        for name in create_indexes(bind):
+            print(f"index ok: {name}")
+    elif not check_indexes(bind):
+        print("同分数据查询未使用索引")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ from sqlalchemy import (
     DateTime,
     JSON,
     UniqueConstraint,
+    Index,
+    Engine,
     create_engine,
     null,
     text,
@@ -15,6 +17,7 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import declarative_base
 from dotenv import load_dotenv
+from functools import lru_cache
 import os
 
 
@@ -546,6 +549,20 @@ class MatchRanking(Base):
     __tablename__ = "match_ranking"
     __table_args__ = (
         UniqueConstraint("war_id", "team_name", name="uix_match_ranking_war_team"),
+        # 覆盖同分数据查询：按 (stage, team_name) 过滤、按 created_at 取最后一场，
+        # 其余列用于聚合，查询无需回表
+        Index(
+            "ix_match_ranking_stage_team_created",
+            "stage",
+            "team_name",
+            "created_at",
+            "ingame_rank",
+            "kill_pts",
+            "place_pts",
+            "total_pts",
+        ),
+        # 覆盖积分榜缓存的变更探测：按 stage 过滤后取行数、最大 id、最大 updated_at
+        Index("ix_match_ranking_stage_updated", "stage", "updated_at"),
     )
 
     id = Column(Integer, primary_key=True, autoincrement=True, comment="唯一主键")
@@ -939,18 +956,52 @@ class OCR(Base):
     )
 
 
+class CheckResult(Base):
+    """本服务自己写入的检查历史，其余表由后台维护"""
+
+    __tablename__ = "check_result"
+    __table_args__ = (
+        # 历史记录按 id 倒序做 keyset 分页，按比赛或赛段过滤时沿索引顺序读取
+        Index("ix_check_result_game_id", "game_id", "id"),
+        Index("ix_check_result_stage", "stage", "id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True, comment="唯一主键")
+    game_id = Column(String(255), nullable=False, comment="比赛id")
+    stage = Column(Integer, nullable=False, default=0, comment="赛段")
+    error_count = Column(Integer, nullable=False, default=0, comment="错误数")
+    error_types = Column(
+        Integer, nullable=False, default=0, comment="错误类型位掩码，第n位表示存在类型n的错误"
+    )
+    game_result = Column(JSON, nullable=True, comment="排名后的解析结果(GameResult)")
+    error_list = Column(JSON, nullable=True, comment="错误列表(ErrorList)")
+    timings = Column(JSON, nullable=True, comment="耗时明细")
+    input_hashes = Column(JSON, nullable=True, comment="截图文件名及SHA-256")
+    created_at = Column(
+        DateTime,
+        server_default=text("CURRENT_TIMESTAMP"),
+        nullable=False,
+        comment="记录生成的时间",
+    )
+
+
 # -----------------------------
 # Create all tables in database
 # -----------------------------
 
-engine = create_engine(
-    f"mysql+pymysql://{db_username}:{db_password}@{db_url}",
-    echo=False,
-    future=True,
-    # pool_pre_ping=True,
-    # pool_size=30,  # 最大连接数为 30
-    # max_overflow=50,  # 允许的最大溢出连接数
-    # pool_timeout=30,  # 连接池获取连接的超时时间
-    # pool_recycle=3600,  # 连接池中的连接每小时重置一次（防止超时）
-)
-# Base.metadata.create_all(engine)
+@lru_cache(maxsize=None)
+def get_engine() -> Engine:
+    """首次使用时才创建 engine，导入 models 时不会读取数据库配置或加载驱动"""
+    return create_engine(
+        f"mysql+pymysql://{db_username}:{db_password}@{db_url}",
+        echo=False,
+        future=True,
+        pool_pre_ping=os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+        pool_size=int(os.getenv("DB_POOL_SIZE", "10")),  # 常驻连接数
+        max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),  # 允许的最大溢出连接数
+        pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),  # 连接池获取连接的超时时间
+        pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "3600")),  # 连接定期重置（防止 MySQL 断开空闲连接）
+    )
+
+
+# Base.metadata.create_all(get_engine())
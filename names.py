@@ -0,0 +1,293 @@
+"""
+队伍名/选手名的模糊匹配索引。
+
+LLM 从截图中读出的名字经常与后台登记的名字有细微差别（大小写、全角字符、战队前缀等），
+逐字比较会产生误报。这里用 team、player、ocr 表中登记的名字建立索引，
+把解析出的名字统一成后台的写法后再排名和对比。
+"""
+
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from comparison import normalize_team_name
+from models import OCR, Player, Team
+from schemas import GameResult
+
+load_dotenv()
+
+# 名字开头用括号括起来的战队前缀，如 "[ABC]name"、"【ABC】name"
+_TAG_PATTERN = re.compile(r"^[\[【(（<《「{].{1,12}?[\]】)）>》」}]")
+
+
+def name_key(name: str) -> str:
+    """规范化后只保留字母、数字和汉字等文字字符"""
+    return "".join(ch for ch in normalize_team_name(name) if ch.isalnum())
+
+
+def untagged_key(name: str) -> str:
+    return name_key(_TAG_PATTERN.sub("", normalize_team_name(name), count=1))
+
+
+def trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str) -> int:
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(
+                min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            )
+        previous = current
+    return previous[-1]
+
+
+def similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    return 1 - edit_distance(a, b) / max(len(a), len(b))
+
+
+class NameIndex:
+    """
+    一类名字（队伍或选手）的索引：
+    规范化后完全相同的直接命中，否则用三元组（trigram）召回候选，再按编辑距离选出最相近的
+    """
+
+    # 参与编辑距离计算的候选数量
+    CANDIDATES = 8
+
+    def __init__(self, min_similarity: float):
+        self.min_similarity = min_similarity
+        # (来源表, 主键) -> 名字
+        self._entries: dict[tuple[str, str], str] = {}
+        # 名字 -> 引用次数，同一个名字可能在多张表、多行中出现
+        self._refs: Counter[str] = Counter()
+        self._keys: dict[str, set[str]] = {}
+        self._postings: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def copy(self) -> "NameIndex":
+        index = NameIndex(self.min_similarity)
+        index._entries = dict(self._entries)
+        index._refs = Counter(self._refs)
+        index._keys = {key: set(names) for key, names in self._keys.items()}
+        index._postings = {gram: set(names) for gram, names in self._postings.items()}
+        return index
+
+    def upsert(self, source: str, pk: str, name: str) -> None:
+        old = self._entries.get((source, pk))
+        if old == name:
+            return
+        if old is not None:
+            self._release(old)
+        if not name_key(name):
+            self._entries.pop((source, pk), None)
+            return
+        self._entries[(source, pk)] = name
+        self._refs[name] += 1
+        if self._refs[name] > 1:
+            return
+        for key in {name_key(name), untagged_key(name)} - {""}:
+            self._keys.setdefault(key, set()).add(name)
+        for gram in trigrams(name_key(name)):
+            self._postings.setdefault(gram, set()).add(name)
+
+    def _release(self, name: str) -> None:
+        self._refs[name] -= 1
+        if self._refs[name] > 0:
+            return
+        del self._refs[name]
+        for key in {name_key(name), untagged_key(name)} - {""}:
+            names = self._keys.get(key)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._keys[key]
+        for gram in trigrams(name_key(name)):
+            names = self._postings.get(gram)
+            if names is not None:
+                names.discard(name)
+                if not names:
+                    del self._postings[gram]
+
+    def lookup(self, name: str) -> str | None:
+        """返回登记的名字；没有足够相近的，或有多个同样相近的名字时返回 None"""
+        if name in self._refs:
+            return name
+        key = name_key(name)
+        if not key:
+            return None
+        for candidate_key in (key, untagged_key(name)):
+            exact = self._keys.get(candidate_key)
+            if exact:
+                return next(iter(exact)) if len(exact) == 1 else None
+
+        counts = Counter()
+        for gram in trigrams(key):
+            counts.update(self._postings.get(gram, ()))
+        scored = sorted(
+            (
+                (similarity(key, name_key(candidate)), candidate)
+                for candidate, _ in counts.most_common(self.CANDIDATES)
+            ),
+            reverse=True,
+        )
+        if not scored or scored[0][0] < self.min_similarity:
+            return None
+        if len(scored) > 1 and scored[1][0] == scored[0][0]:
+            return None
+        return scored[0][1]
+
+
+class NameResolver:
+    """
+    进程内缓存的队伍名/选手名索引。
+
+    refresh 按 updated_at 只读取上次刷新之后新增或修改的行，
+    两次刷新间隔不小于 refresh_seconds；删除的行无法增量感知，
+    索引超过 max_age_seconds 后整体重建。
+
+    查询数据库和更新索引都在锁外进行：刷新时在索引的副本上更新（重建时是新索引），
+    完成后在锁内整体替换，resolve_* 不会被刷新阻塞。同时只有一个线程刷新，
+    其余线程直接使用当前的索引。
+    """
+
+    SOURCES = (
+        ("team", Team.team_code, Team.team_name, Team.updated_at),
+        ("player", Player.uid, Player.player_name, Player.updated_at),
+        ("ocr", OCR.id, OCR.player_name, OCR.updated_at),
+    )
+
+    def __init__(
+        self, refresh_seconds: float, max_age_seconds: float, min_similarity: float
+    ):
+        self.refresh_seconds = refresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # invalidate 时递增，丢弃失效之前开始的刷新结果
+        self._generation = 0
+        self._reset()
+
+    def _reset(self) -> None:
+        self.teams = NameIndex(self.min_similarity)
+        self.players = NameIndex(self.min_similarity)
+        self._watermarks: dict[str, datetime | None] = {
+            source: None for source, *_ in self.SOURCES
+        }
+        self._built_at = time.monotonic()
+        self._refreshed_at: float | None = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._reset()
+
+    def refresh(self, session: Session) -> None:
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            self._refresh(session)
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh(self, session: Session) -> None:
+        now = time.monotonic()
+        with self._lock:
+            generation = self._generation
+            rebuild = (
+                self._refreshed_at is None
+                or now - self._built_at >= self.max_age_seconds
+            )
+            if not rebuild and now - self._refreshed_at < self.refresh_seconds:
+                return
+            if rebuild:
+                teams = NameIndex(self.min_similarity)
+                players = NameIndex(self.min_similarity)
+                watermarks = {source: None for source, *_ in self.SOURCES}
+                built_at = now
+            else:
+                teams, players = self.teams, self.players
+                watermarks = dict(self._watermarks)
+                built_at = self._built_at
+
+        rows = {
+            source: self._fetch(
+                session, pk_column, name_column, updated_column, watermarks[source]
+            )
+            for source, pk_column, name_column, updated_column in self.SOURCES
+        }
+        if not rebuild:
+            teams, players = teams.copy(), players.copy()
+        for source, source_rows in rows.items():
+            index = teams if source == "team" else players
+            watermark = watermarks[source]
+            for pk, name, updated_at in source_rows:
+                index.upsert(source, str(pk), name)
+                if watermark is None or updated_at > watermark:
+                    watermark = updated_at
+            watermarks[source] = watermark
+
+        with self._lock:
+            if self._generation != generation:
+                return
+            self.teams, self.players = teams, players
+            self._watermarks = watermarks
+            self._built_at = built_at
+            self._refreshed_at = time.monotonic()
+
+    @staticmethod
+    def _fetch(session: Session, pk_column, name_column, updated_column, watermark):
+        query = select(pk_column, name_column, updated_column)
+        # 用 >= 而不是 >，同一秒内稍后写入的行不会漏掉，重复读到的行 upsert 时忽略
+        if watermark is not None:
+            query = query.where(updated_column >= watermark)
+        return session.execute(query).all()
+
+    def resolve_team(self, name: str) -> str:
+        # 已发布的索引不再修改，读取不需要加锁
+        return self.teams.lookup(name) or name
+
+    def resolve_player(self, name: str) -> str:
+        return self.players.lookup(name) or name
+
+    def canonicalize(self, game_result: GameResult) -> int:
+        """把解析结果中的队伍名和选手名替换为登记的名字，返回修改的名字数"""
+        changed = 0
+        for team_result in game_result.teams:
+            team_name = self.resolve_team(team_result.team_name)
+            if team_name != team_result.team_name:
+                logger.info(f"队伍名 {team_result.team_name!r} 匹配为 {team_name!r}")
+                team_result.team_name = team_name
+                changed += 1
+            for player in team_result.players:
+                player_name = self.resolve_player(player.player_name)
+                if player_name != player.player_name:
+                    player.player_name = player_name
+                    changed += 1
+        return changed
+
+
+name_resolver = NameResolver(
+    refresh_seconds=float(os.getenv("NAME_INDEX_REFRESH_SECONDS", "30")),
+    max_age_seconds=float(os.getenv("NAME_INDEX_MAX_AGE_SECONDS", "3600")),
+    min_similarity=float(os.getenv("NAME_MATCH_MIN_SIMILARITY", "0.8")),
+)
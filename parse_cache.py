@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator
+
+from dotenv import load_dotenv
+
+from storage import REDIS_KEY_PREFIX, get_redis, shared_storage_enabled
+
+load_dotenv()
+
+
+class ParseCache:
+    """
+    LLM 解析结果的持久化缓存（SQLite）。
+
+    key 由模型名、提示词以及按顺序排列的图片字节共同计算 SHA-256 得到，
+    value 为校验通过的 GameResult JSON。
+    淘汰策略：超过 ttl_seconds 的记录视为过期；记录数超过 max_entries 时，
+    按最近使用时间淘汰最久未使用的记录。
+    path 为 None 时不使用本地文件，由子类在别处保存记录。
+    """
+
+    def __init__(self, path: str | None, ttl_seconds: int, max_entries: int | None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._create_table()
+
+    def _create_table(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS parse_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+                """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_parse_cache_last_used_at "
+                "ON parse_cache (last_used_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # 每次操作单独建立连接，可以安全地在线程池中调用
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(images: list[bytes], prompt: str, model: str) -> str:
+        digest = hashlib.sha256()
+        for part in (model.encode("utf-8"), prompt.encode("utf-8")):
+            digest.update(hashlib.sha256(part).digest())
+        for image in images:
+            digest.update(hashlib.sha256(image).digest())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM parse_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE parse_cache SET last_used_at = ? WHERE key = ?", (now, key)
+            )
+            return value
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (key, value, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute(
+            "DELETE FROM parse_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        conn.execute(
+            """
+            DELETE FROM parse_cache WHERE key IN (
+                SELECT key FROM parse_cache
+                ORDER BY last_used_at DESC
+                LIMIT -1 OFFSET ?
+            )
+            """,
+            (self.max_entries,),
+        )
+
+
+class RedisParseCache(ParseCache):
+    """
+    多台主机共享的解析缓存，key 的计算与 ParseCache 相同。
+    过期由 Redis 的 key TTL 负责；记录数上限不在这里维护，
+    由 Redis 的 maxmemory-policy（如 allkeys-lru）按最近使用淘汰。
+    """
+
+    def __init__(self, client, ttl_seconds: int, prefix: str = REDIS_KEY_PREFIX):
+        self.client = client
+        super().__init__(path=None, ttl_seconds=ttl_seconds, max_entries=None)
+        self.prefix = f"{prefix}parse_cache:"
+
+    def _create_table(self):
+        # 记录保存在 Redis，没有本地文件需要建立
+        pass
+
+    def get(self, key: str) -> str | None:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: str):
+        self.client.set(self.prefix + key, value, ex=self.ttl_seconds)
+
+
+def create_parse_cache() -> ParseCache:
+    ttl_seconds = int(os.getenv("PARSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    if shared_storage_enabled():
+        return RedisParseCache(get_redis(), ttl_seconds)
+    return ParseCache(
+        path=os.getenv("PARSE_CACHE_PATH", "./cache/parse_cache.sqlite3"),
+        ttl_seconds=ttl_seconds,
+        max_entries=int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "1000")),
+    )
+
+
+@lru_cache(maxsize=None)
+def get_parse_cache() -> ParseCache:
+    """首次使用时才创建（本地模式会建立 SQLite 文件），导入本模块没有副作用"""
+    return create_parse_cache()
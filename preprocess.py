@@ -0,0 +1,143 @@
+import io
+import os
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+from PIL import Image
+
+load_dotenv()
+
+# 常见图片格式的文件头
+_MAGIC_NUMBERS = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+]
+
+_FORMAT_MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """
+    图片预处理参数。
+
+    crop 为相对坐标 (left, top, right, bottom)，取值 0~1，用于裁剪出结算面板区域；
+    format 为 ORIGINAL 时只缩放/裁剪，不改变编码格式。
+    """
+
+    max_width: int = 1920
+    max_height: int = 1080
+    format: str = "JPEG"
+    quality: int = 85
+    crop: tuple[float, float, float, float] | None = None
+
+
+@dataclass(frozen=True)
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    original_size: int
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_size - self.size
+
+
+def detect_mime_type(data: bytes) -> str:
+    for magic, mime_type in _MAGIC_NUMBERS:
+        if data.startswith(magic):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    raise ValueError("无法识别的图片格式")
+
+
+def _parse_crop(value: str | None) -> tuple[float, float, float, float] | None:
+    if not value:
+        return None
+    left, top, right, bottom = (float(v) for v in value.split(","))
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        raise ValueError(f"IMAGE_CROP 取值不合法: {value}")
+    return left, top, right, bottom
+
+
+def load_options() -> PreprocessOptions:
+    return PreprocessOptions(
+        max_width=int(os.getenv("IMAGE_MAX_WIDTH", "1920")),
+        max_height=int(os.getenv("IMAGE_MAX_HEIGHT", "1080")),
+        format=os.getenv("IMAGE_FORMAT", "JPEG").upper(),
+        quality=int(os.getenv("IMAGE_QUALITY", "85")),
+        crop=_parse_crop(os.getenv("IMAGE_CROP")),
+    )
+
+
+def preprocess_image(
+    data: bytes, options: PreprocessOptions | None = None
+) -> PreprocessedImage:
+    """
+    裁剪、缩放并重新编码截图，减小发送给 LLM 的请求体积。
+
+    输出只取决于输入字节和参数（不保留 EXIF 等元数据），
+    因此可以直接作为解析缓存的 key。
+    如果处理后的图片反而比原图大，且没有发生裁剪或缩放，则保留原图。
+    """
+    options = options or default_options
+    original_mime_type = detect_mime_type(data)
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        changed = False
+
+        if options.crop is not None:
+            left, top, right, bottom = options.crop
+            width, height = image.size
+            image = image.crop(
+                (
+                    round(left * width),
+                    round(top * height),
+                    round(right * width),
+                    round(bottom * height),
+                )
+            )
+            changed = True
+
+        if image.width > options.max_width or image.height > options.max_height:
+            image.thumbnail(
+                (options.max_width, options.max_height), Image.Resampling.LANCZOS
+            )
+            changed = True
+
+        if options.format == "ORIGINAL":
+            if not changed:
+                return PreprocessedImage(data, original_mime_type, len(data))
+            save_format = image.format or original_mime_type.split("/")[1].upper()
+            mime_type = original_mime_type
+        else:
+            if options.format not in _FORMAT_MIME_TYPES:
+                raise ValueError(f"不支持的 IMAGE_FORMAT: {options.format}")
+            save_format = options.format
+            mime_type = _FORMAT_MIME_TYPES[save_format]
+
+        if save_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=save_format, quality=options.quality)
+        processed = buffer.getvalue()
+
+    if not changed and len(processed) >= len(data):
+        return PreprocessedImage(data, original_mime_type, len(data))
+    return PreprocessedImage(processed, mime_type, len(data))
+
+
+default_options = load_options()
@@ -0,0 +1,57 @@
+from typing import TypedDict
+from pydantic import BaseModel, Field
+
+
+class TieBreakStats(TypedDict):
+    wwcd_count: int
+    stage_total_kill: int
+    stage_max_single_match_pts: int
+    stage_max_single_match_kill: int
+    last_match_total_pts: int
+    last_match_total_kill: int
+    last_match_place_pts: int
+
+
+def empty_tiebreak_stats() -> TieBreakStats:
+    return {key: 0 for key in TieBreakStats.__annotations__}
+
+
+# Pydantic models for structured output
+class PlayerResult(BaseModel):
+    player_name: str = Field(description="The name of the player")
+    elims: int = Field(description="The number of eliminations the player has")
+
+
+class TeamResult(BaseModel):
+    team_name: str = Field(description="The name of the team")
+    ranking: int = Field(description="The ranking of the team in the game")
+    total_elims: int = Field(
+        description="The total number of eliminations the team has, equals the sum of the eliminations of all players"
+    )
+    players: list[PlayerResult] = Field(
+        description="The list of player results in the team"
+    )
+    final_ranking: int = Field(
+        description="The final ranking of the team, ALWAYS keep it unset", default=0
+    )
+    tiebreak_stats: TieBreakStats = Field(
+        description="The tiebreak stats of the team, ALWAYS keep it unset",
+        default_factory=TieBreakStats,
+    )
+
+
+class GameResult(BaseModel):
+    teams: list[TeamResult] = Field(description="The list of team results in the game")
+
+
+class DataError(BaseModel):
+    error_type: int = Field(
+        description="The type of error. 1: final ranking error, 2: ingame ranking error, 3: total elims error, 4: team missing from game client, 5: team missing from api, 6: player elims error, 7: player missing from api"
+    )
+    team: str = Field(description="name of the team that error occurs to")
+    original_data: str | int = Field(description="The original data from api")
+    correct_data: str | int = Field(description="The correct data from game client")
+
+
+class ErrorList(BaseModel):
+    errors: list[DataError] = Field(description="The list of errors")
@@ -0,0 +1,419 @@
+"""
+比赛截图存储。
+
+截图按内容寻址保存在 {root}/blobs/{hash[:2]}/{hash}{ext}，相同内容只存一份；
+{root}/index.sqlite3 记录每场比赛的截图（文件名 -> hash），按 game_id 直接查询，
+不再遍历整个目录。
+STORAGE_BACKEND=shared 时截图文件保存在 S3、索引保存在 Redis，由所有主机共享（见 storage.py）。
+
+    python screenshot_store.py import ./images
+        导入旧版平铺在目录中的 {game_id}_rank_{number}.ext 截图
+    python screenshot_store.py gc
+        立即执行一次过期清理
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterator
+
+from dotenv import load_dotenv
+from loguru import logger
+
+from storage import (
+    REDIS_KEY_PREFIX,
+    BlobStorage,
+    LocalBlobStorage,
+    create_blob_storage,
+    get_redis,
+    shared_storage_enabled,
+)
+
+load_dotenv()
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+def parse_game_id(filename: str) -> str | None:
+    """从 {game_id}_rank_{number}.ext 形式的文件名中取出 game_id"""
+    stem, ext = os.path.splitext(os.path.basename(filename))
+    if ext.lower() not in IMAGE_EXTS or "_rank_" not in stem:
+        return None
+    return stem.rsplit("_rank_", 1)[0]
+
+
+class ScreenshotStore:
+    """
+    淘汰策略：超过 retention_seconds 未更新的比赛截图被删除；
+    所有截图总大小超过 max_bytes 时，从最久未更新的比赛开始删除。
+    不再被任何比赛引用的截图文件随之删除。
+    清理在写入后进行，两次清理至少间隔 gc_interval_seconds。
+    root 为 None 时不使用本地目录，由子类在别处保存索引和截图文件。
+    """
+
+    def __init__(
+        self,
+        root: str | None,
+        retention_seconds: int,
+        max_bytes: int,
+        gc_interval_seconds: int = 3600,
+        blobs: BlobStorage | None = None,
+    ):
+        self.root = root
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        self.gc_interval_seconds = gc_interval_seconds
+        self.blobs = blobs or LocalBlobStorage(os.path.join(root, "blobs"))
+        self._last_gc = 0.0
+        self._gc_lock = threading.Lock()
+        self._create_index()
+
+    def _create_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    hash TEXT PRIMARY KEY,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                )
+                """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS game_images (
+                    game_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    hash TEXT NOT NULL REFERENCES blobs (hash),
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (game_id, name)
+                )
+                """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_game_images_hash ON game_images (hash)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_game_images_updated_at "
+                "ON game_images (updated_at)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(os.path.join(self.root, "index.sqlite3"), timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _blob_key(digest: str, ext: str) -> str:
+        return f"{digest[:2]}/{digest}{ext}"
+
+    def save(self, game_id: str, images: list[tuple[str, bytes]]):
+        """
+        保存一场比赛的截图。文件名相同（不含扩展名）的截图会被替换，
+        其它已保存的截图保留。
+        """
+        now = time.time()
+        # 与 gc 互斥，避免刚写入的文件被当作无人引用的文件删除
+        with self._gc_lock, self._connect() as conn:
+            for filename, content in images:
+                name, ext = os.path.splitext(os.path.basename(filename))
+                ext = ext.lower()
+                digest = hashlib.sha256(content).hexdigest()
+                # 相同内容已经以其它扩展名保存过时沿用已有的文件，不再写入一份无人引用的文件
+                row = conn.execute(
+                    "SELECT ext FROM blobs WHERE hash = ?", (digest,)
+                ).fetchone()
+                if row is None:
+                    self.blobs.put(self._blob_key(digest, ext), content)
+                    conn.execute(
+                        "INSERT INTO blobs (hash, ext, size) VALUES (?, ?, ?)",
+                        (digest, ext, len(content)),
+                    )
+                conn.execute(
+                    "INSERT OR REPLACE INTO game_images (game_id, name, hash, updated_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (game_id, name, digest, now),
+                )
+        self.maybe_gc()
+
+    def load(self, game_id: str) -> list[tuple[str, bytes]]:
+        """按文件名顺序返回一场比赛的截图 (文件名, 内容)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT g.name, b.hash, b.ext FROM game_images g "
+                "JOIN blobs b ON b.hash = g.hash "
+                "WHERE g.game_id = ? ORDER BY g.name",
+                (game_id,),
+            ).fetchall()
+
+        images = []
+        for name, digest, ext in rows:
+            content = self.blobs.get(self._blob_key(digest, ext))
+            if content is None:
+                logger.warning(f"截图文件缺失: {game_id}/{name}{ext} ({digest})")
+                continue
+            images.append((name + ext, content))
+        return images
+
+    def maybe_gc(self):
+        if time.time() - self._last_gc >= self.gc_interval_seconds:
+            self.gc()
+
+    def gc(self) -> int:
+        """执行一次清理，返回删除的截图文件数"""
+        with self._gc_lock:
+            now = time.time()
+            self._last_gc = now
+            with self._connect() as conn:
+                conn.execute(
+                    "DELETE FROM game_images WHERE updated_at < ?",
+                    (now - self.retention_seconds,),
+                )
+
+                # 按比赛最后更新时间从旧到新删除，直到总大小不超过上限
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM blobs "
+                    "WHERE hash IN (SELECT hash FROM game_images)"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    games = conn.execute(
+                        "SELECT game_id, MAX(updated_at) AS updated_at FROM game_images "
+                        "GROUP BY game_id ORDER BY updated_at"
+                    ).fetchall()
+                    for game_id, _ in games:
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute(
+                            "DELETE FROM game_images WHERE game_id = ?", (game_id,)
+                        )
+                        total = conn.execute(
+                            "SELECT COALESCE(SUM(size), 0) FROM blobs "
+                            "WHERE hash IN (SELECT hash FROM game_images)"
+                        ).fetchone()[0]
+
+                orphans = conn.execute(
+                    "SELECT hash, ext FROM blobs "
+                    "WHERE hash NOT IN (SELECT hash FROM game_images)"
+                ).fetchall()
+                conn.executemany(
+                    "DELETE FROM blobs WHERE hash = ?",
+                    [(digest,) for digest, _ in orphans],
+                )
+
+            for digest, ext in orphans:
+                self.blobs.delete(self._blob_key(digest, ext))
+            if orphans:
+                logger.info(f"截图清理完成，删除 {len(orphans)} 个文件")
+            return len(orphans)
+
+    def import_directory(self, directory: str) -> int:
+        """导入目录中平铺的截图，返回导入的文件数"""
+        if self.root is not None and os.path.realpath(directory) == os.path.realpath(
+            self.root
+        ):
+            raise ValueError(f"不能从截图存储自身的目录导入: {directory}")
+        by_game: dict[str, list[tuple[str, bytes]]] = {}
+        for filename in sorted(os.listdir(directory)):
+            game_id = parse_game_id(filename)
+            if game_id is None:
+                continue
+            with open(os.path.join(directory, filename), "rb") as f:
+                by_game.setdefault(game_id, []).append((filename, f.read()))
+        for game_id, images in by_game.items():
+            self.save(game_id, images)
+        return sum(len(images) for images in by_game.values())
+
+
+class RedisScreenshotStore(ScreenshotStore):
+    """
+    多台主机共享的截图存储，淘汰策略与 ScreenshotStore 相同。索引保存在 Redis：
+    - {prefix}screenshots:games      有序集合，game_id -> 最后更新时间
+    - {prefix}screenshots:game:{id}  哈希，文件名（不含扩展名） -> 截图 key
+    - {prefix}screenshots:blobs      哈希，截图 key -> 文件大小
+    登记索引和清理通过 Redis 锁互斥，避免刚写入的文件被其它主机的清理删除；
+    截图文件在加锁之前上传（见 save）。
+    """
+
+    def __init__(
+        self,
+        client,
+        blobs: BlobStorage,
+        retention_seconds: int,
+        max_bytes: int,
+        gc_interval_seconds: int = 3600,
+        prefix: str = REDIS_KEY_PREFIX,
+    ):
+        self.client = client
+        super().__init__(
+            root=None,
+            retention_seconds=retention_seconds,
+            max_bytes=max_bytes,
+            gc_interval_seconds=gc_interval_seconds,
+            blobs=blobs,
+        )
+        self._games_key = f"{prefix}screenshots:games"
+        self._game_prefix = f"{prefix}screenshots:game:"
+        self._blobs_key = f"{prefix}screenshots:blobs"
+        self._lock_key = f"{prefix}screenshots:lock"
+        # 清理执行次数，save 据此判断上传期间是否有文件被删除
+        self._gc_runs_key = f"{prefix}screenshots:gc_runs"
+
+    def _create_index(self):
+        # 索引保存在 Redis，没有本地目录需要建立
+        pass
+
+    def _lock(self):
+        return self.client.lock(self._lock_key, timeout=300, blocking_timeout=60)
+
+    def _put_missing(self, entries: list[tuple[str, str, bytes]], uploaded: set[str]):
+        """上传 blobs 哈希中还没有登记的截图文件"""
+        sizes = self.client.hmget(self._blobs_key, [key for _, key, _ in entries])
+        for (_, key, content), size in zip(entries, sizes):
+            if size is None and key not in uploaded:
+                self.blobs.put(key, content)
+                uploaded.add(key)
+
+    def save(self, game_id: str, images: list[tuple[str, bytes]]):
+        entries = []
+        for filename, content in images:
+            name, ext = os.path.splitext(os.path.basename(filename))
+            key = self._blob_key(hashlib.sha256(content).hexdigest(), ext.lower())
+            entries.append((name, key, content))
+
+        # 上传到 S3 可能很慢，在锁外进行，不阻塞其它主机的写入和清理。
+        # 尚未登记的文件不会被清理删除；已登记的文件可能在上传期间被清理删除，
+        # 因此加锁后如果清理执行过，重新上传仍未登记的文件
+        gc_runs = self.client.get(self._gc_runs_key)
+        uploaded: set[str] = set()
+        self._put_missing(entries, uploaded)
+
+        now = time.time()
+        with self._lock():
+            if self.client.get(self._gc_runs_key) != gc_runs:
+                uploaded.clear()
+                self._put_missing(entries, uploaded)
+            pipe = self.client.pipeline()
+            for name, key, content in entries:
+                pipe.hset(self._blobs_key, key, len(content))
+                pipe.hset(self._game_prefix + game_id, name, key)
+            pipe.zadd(self._games_key, {game_id: now})
+            pipe.execute()
+        self.maybe_gc()
+
+    def load(self, game_id: str) -> list[tuple[str, bytes]]:
+        images = []
+        for name, key in sorted(
+            self.client.hgetall(self._game_prefix + game_id).items()
+        ):
+            content = self.blobs.get(key)
+            if content is None:
+                logger.warning(f"截图文件缺失: {game_id}/{name} ({key})")
+                continue
+            images.append((name + os.path.splitext(key)[1], content))
+        return images
+
+    def _drop_games(self, game_ids: list[str]):
+        if game_ids:
+            pipe = self.client.pipeline()
+            pipe.delete(*(self._game_prefix + game_id for game_id in game_ids))
+            pipe.zrem(self._games_key, *game_ids)
+            pipe.execute()
+
+    def gc(self) -> int:
+        with self._lock():
+            try:
+                return self._gc_locked()
+            finally:
+                self.client.incr(self._gc_runs_key)
+
+    def _gc_locked(self) -> int:
+        now = time.time()
+        self._last_gc = now
+        self._drop_games(
+            self.client.zrangebyscore(
+                self._games_key, "-inf", now - self.retention_seconds
+            )
+        )
+
+        # 从旧到新的比赛及其引用的截图
+        game_ids = self.client.zrange(self._games_key, 0, -1)
+        pipe = self.client.pipeline()
+        for game_id in game_ids:
+            pipe.hvals(self._game_prefix + game_id)
+        refs = dict(zip(game_ids, (set(keys) for keys in pipe.execute())))
+        sizes = {
+            key: int(size) for key, size in self.client.hgetall(self._blobs_key).items()
+        }
+
+        def referenced() -> set[str]:
+            return set().union(*refs.values())
+
+        total = sum(sizes.get(key, 0) for key in referenced())
+        dropped = []
+        for game_id in game_ids:
+            if total <= self.max_bytes:
+                break
+            dropped.append(game_id)
+            del refs[game_id]
+            total = sum(sizes.get(key, 0) for key in referenced())
+        self._drop_games(dropped)
+
+        orphans = set(sizes) - referenced()
+        if orphans:
+            self.client.hdel(self._blobs_key, *orphans)
+        for key in orphans:
+            self.blobs.delete(key)
+        if orphans:
+            logger.info(f"截图清理完成，删除 {len(orphans)} 个文件")
+        return len(orphans)
+
+
+def create_screenshot_store() -> ScreenshotStore:
+    # 不与旧版平铺截图所在的 ./images 共用目录，导入旧截图时两者互不干扰
+    root = os.getenv("SCREENSHOT_STORE_PATH", "./images/store")
+    retention_seconds = int(
+        os.getenv("SCREENSHOT_RETENTION_SECONDS", str(90 * 24 * 3600))
+    )
+    max_bytes = int(os.getenv("SCREENSHOT_MAX_BYTES", str(5 * 1024**3)))
+    if shared_storage_enabled():
+        return RedisScreenshotStore(
+            client=get_redis(),
+            blobs=create_blob_storage(os.path.join(root, "blobs")),
+            retention_seconds=retention_seconds,
+            max_bytes=max_bytes,
+        )
+    return ScreenshotStore(
+        root=root, retention_seconds=retention_seconds, max_bytes=max_bytes
+    )
+
+
+@lru_cache(maxsize=None)
+def get_screenshot_store() -> ScreenshotStore:
+    """首次使用时才创建（本地模式会建立截图目录和索引），导入本模块没有副作用"""
+    return create_screenshot_store()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比赛截图存储维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="导入平铺目录中的截图")
+    import_parser.add_argument("directory")
+    subparsers.add_parser("gc", help="立即执行一次过期清理")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = get_screenshot_store().import_directory(args.directory)
+        print(f"imported {count} screenshots")
+    else:
+        print(f"removed {get_screenshot_store().gc()} screenshots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+按 MatchRanking 重新计算整个赛段的积分榜，核对 StageRanking 表。
+
+一个赛段的比赛数据用一条查询取回并转成列数组，各队的总分和同分规则
+（与 get_tiebreak_stats 相同的 7 项）用 numpy 分组聚合，再用 lexsort 得到应有的排名。
+
+    python stage_verifier.py            核对所有赛段
+    python stage_verifier.py 1 2        只核对指定赛段
+
+有差异时以非零状态退出。需要安装 numpy（pip install '.[verify]'）。
+"""
+
+import argparse
+import sys
+import time
+from dataclasses import dataclass
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import MatchRanking, StageRanking, get_engine
+
+
+@dataclass(frozen=True)
+class StageMismatch:
+    team_name: str
+    field: str
+    expected: int | str
+    actual: int | str
+
+
+@dataclass
+class StageStandingsArrays:
+    """按队伍聚合后的积分榜，各数组与 team_names 一一对应"""
+
+    team_names: np.ndarray
+    total_kill_pts: np.ndarray
+    total_place_pts: np.ndarray
+    stage_total_pts: np.ndarray
+    # 应有的排名；所有排序键都相同的队伍并列，rank_low 为并列区间的最后一名
+    rank: np.ndarray
+    rank_low: np.ndarray
+
+
+def _group_last(groups: np.ndarray, *keys: np.ndarray) -> np.ndarray:
+    """每组中按 keys 排序后最后一行的下标，groups 为从 0 开始的组号"""
+    order = np.lexsort((*reversed(keys), groups))
+    sorted_groups = groups[order]
+    last = np.flatnonzero(np.diff(sorted_groups, append=sorted_groups[-1] + 1))
+    return order[last]
+
+
+def compute_stage_standings(rows) -> StageStandingsArrays:
+    """
+    rows 为 (team_name, ingame_rank, kill_pts, place_pts, total_pts, created_at, id)。
+    排序：赛段总分，其次是同分规则
+    1) 总获胜数 2) 总淘汰数 3) 单局最高积分 4) 单局最高淘汰
+    5) 最后一场总积分 6) 最后一场淘汰数 7) 最后一场生存排名（排名分）
+    最后一场按 (created_at, id) 判断，与 tiebreak_stats_query 一致。
+    """
+    team_name, ingame_rank, kill_pts, place_pts, total_pts, created_at, ids = (
+        list(column) for column in zip(*rows)
+    )
+    team_names, team = np.unique(np.array(team_name, dtype=object), return_inverse=True)
+    team_count = len(team_names)
+    ingame_rank = np.asarray(ingame_rank, dtype=np.int64)
+    kill_pts = np.asarray(kill_pts, dtype=np.int64)
+    place_pts = np.asarray(place_pts, dtype=np.int64)
+    total_pts = np.asarray(total_pts, dtype=np.int64)
+    created_at = np.asarray(created_at, dtype="datetime64[us]").astype(np.int64)
+    ids = np.asarray(ids, dtype=np.int64)
+
+    def group_sum(values: np.ndarray) -> np.ndarray:
+        return np.bincount(team, weights=values, minlength=team_count).astype(np.int64)
+
+    def group_max(values: np.ndarray) -> np.ndarray:
+        result = np.full(team_count, np.iinfo(np.int64).min)
+        np.maximum.at(result, team, values)
+        return result
+
+    stage_total_pts = group_sum(total_pts)
+    last = _group_last(team, created_at, ids)
+    keys = [
+        stage_total_pts,
+        group_sum((ingame_rank == 1).astype(np.int64)),
+        group_sum(kill_pts),
+        group_max(total_pts),
+        group_max(kill_pts),
+        total_pts[last],
+        kill_pts[last],
+        place_pts[last],
+    ]
+    # lexsort 以最后一个键为主键，全部取负得到降序
+    order = np.lexsort([-key for key in reversed(keys)])
+    stacked = np.stack(keys, axis=1)[order]
+    new_group = np.r_[True, (np.diff(stacked, axis=0) != 0).any(axis=1)]
+    group_start = np.flatnonzero(new_group)
+    group_id = np.cumsum(new_group) - 1
+    group_end = np.r_[group_start[1:], team_count]
+
+    rank = np.empty(team_count, dtype=np.int64)
+    rank_low = np.empty(team_count, dtype=np.int64)
+    rank[order] = group_start[group_id] + 1
+    rank_low[order] = group_end[group_id]
+    return StageStandingsArrays(
+        team_names=team_names,
+        total_kill_pts=group_sum(kill_pts),
+        total_place_pts=group_sum(place_pts),
+        stage_total_pts=stage_total_pts,
+        rank=rank,
+        rank_low=rank_low,
+    )
+
+
+def verify_stage(session: Session, stage: int) -> list[StageMismatch]:
+    """对比按 MatchRanking 计算的积分榜与 StageRanking 中的记录"""
+    rows = session.execute(
+        select(
+            MatchRanking.team_name,
+            MatchRanking.ingame_rank,
+            MatchRanking.kill_pts,
+            MatchRanking.place_pts,
+            MatchRanking.total_pts,
+            MatchRanking.created_at,
+            MatchRanking.id,
+        ).where(MatchRanking.stage == stage)
+    ).all()
+    recorded = {
+        row.team_name: row
+        for row in session.execute(
+            select(
+                StageRanking.team_name,
+                StageRanking.rank,
+                StageRanking.total_kill_pts,
+                StageRanking.total_place_pts,
+                StageRanking.stage_total_pts,
+            ).where(StageRanking.stage == stage)
+        )
+    }
+
+    mismatches = []
+    if rows:
+        standings = compute_stage_standings(rows)
+        for index, team_name in enumerate(standings.team_names):
+            row = recorded.pop(team_name, None)
+            if row is None:
+                mismatches.append(
+                    StageMismatch(team_name, "team", "存在", "StageRanking 中不存在")
+                )
+                continue
+            rank, rank_low = int(standings.rank[index]), int(standings.rank_low[index])
+            if not rank <= row.rank <= rank_low:
+                expected = rank if rank == rank_low else f"{rank}-{rank_low}"
+                mismatches.append(StageMismatch(team_name, "rank", expected, row.rank))
+            for field in ("stage_total_pts", "total_kill_pts", "total_place_pts"):
+                expected = int(getattr(standings, field)[index])
+                if getattr(row, field) != expected:
+                    mismatches.append(
+                        StageMismatch(team_name, field, expected, getattr(row, field))
+                    )
+    for team_name in recorded:
+        mismatches.append(
+            StageMismatch(team_name, "team", "MatchRanking 中无数据", "存在")
+        )
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="核对 StageRanking 积分榜")
+    parser.add_argument("stages", nargs="*", type=int, help="默认核对所有赛段")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    failed = False
+    with Session(get_engine()) as session:
+        stages = args.stages or sorted(
+            set(session.scalars(select(MatchRanking.stage).distinct()))
+            | set(session.scalars(select(StageRanking.stage).distinct()))
+        )
+        for stage in stages:
+            mismatches = verify_stage(session, stage)
+            if not mismatches:
+                logger.info(f"赛段 {stage}: 一致")
+                continue
+            failed = True
+            logger.warning(f"赛段 {stage}: {len(mismatches)} 处不一致")
+            for mismatch in mismatches:
+                print(
+                    f"stage {stage} {mismatch.team_name}: {mismatch.field}"
+                    f" expected {mismatch.expected}, recorded {mismatch.actual}"
+                )
+    logger.info(f"核对 {len(stages)} 个赛段，耗时 {time.perf_counter() - started:.3f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+
+from dotenv import load_dotenv
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import MatchRanking
+from schemas import TieBreakStats
+
+load_dotenv()
+
+
+@dataclass
+class TeamStandings:
+    wwcd_count: int = 0
+    stage_total_kill: int = 0
+    stage_max_single_match_pts: int = 0
+    stage_max_single_match_kill: int = 0
+    # 最后一场比赛按 (created_at, id) 判断，与 tiebreak_stats_query 一致
+    last_match_key: tuple = ()
+    last_match_total_pts: int = 0
+    last_match_total_kill: int = 0
+    last_match_place_pts: int = 0
+
+    def add(self, row) -> None:
+        if row.ingame_rank == 1:
+            self.wwcd_count += 1
+        self.stage_total_kill += row.kill_pts
+        self.stage_max_single_match_pts = max(
+            self.stage_max_single_match_pts, row.total_pts
+        )
+        self.stage_max_single_match_kill = max(
+            self.stage_max_single_match_kill, row.kill_pts
+        )
+        key = (row.created_at, row.id)
+        if not self.last_match_key or key > self.last_match_key:
+            self.last_match_key = key
+            self.last_match_total_pts = row.total_pts
+            self.last_match_total_kill = row.kill_pts
+            self.last_match_place_pts = row.place_pts
+
+    def tiebreak_stats(self) -> TieBreakStats:
+        return {
+            "wwcd_count": self.wwcd_count,
+            "stage_total_kill": self.stage_total_kill,
+            "stage_max_single_match_pts": self.stage_max_single_match_pts,
+            "stage_max_single_match_kill": self.stage_max_single_match_kill,
+            "last_match_total_pts": self.last_match_total_pts,
+            "last_match_total_kill": self.last_match_total_kill,
+            "last_match_place_pts": self.last_match_place_pts,
+        }
+
+
+@dataclass
+class StageStandings:
+    teams: dict[str, TeamStandings] = field(default_factory=dict)
+    # 已累加的行数、最大 id、最大 updated_at，用于判断是否有新数据或数据被修改
+    row_count: int = 0
+    max_id: int = 0
+    max_updated_at: datetime | None = None
+    built_at: float = field(default_factory=time.monotonic)
+    # 最近一次用 signature_query 确认与数据库一致的时间
+    probed_at: float = field(default_factory=time.monotonic)
+
+    def add_rows(self, rows) -> None:
+        for row in rows:
+            self.teams.setdefault(row.team_name, TeamStandings()).add(row)
+            self.row_count += 1
+            self.max_id = max(self.max_id, row.id)
+            if self.max_updated_at is None or row.updated_at > self.max_updated_at:
+                self.max_updated_at = row.updated_at
+
+    def signature(self) -> tuple:
+        return self.row_count, self.max_id, self.max_updated_at
+
+
+def signature_query(stage: int):
+    """赛段的 (行数, 最大 id, 最大 updated_at)，由 ix_match_ranking_stage_updated 覆盖"""
+    return select(
+        func.count(MatchRanking.id),
+        func.max(MatchRanking.id),
+        func.max(MatchRanking.updated_at),
+    ).where(MatchRanking.stage == stage)
+
+
+class StandingsCache:
+    """
+    按赛段缓存同分规则所需的积分榜数据。
+
+    距上次探测不足 probe_interval_seconds 时直接返回内存中的数据，不访问数据库；
+    否则先用一条聚合查询（signature_query）取当前赛段的 (行数, 最大 id, 最大 updated_at)：
+    - 与缓存一致时直接返回内存中的数据
+    - 只多出了 id 更大的新行时，只查询这些新行并累加到缓存中
+    - 其余情况（旧行被修改或删除，即后台修正了数据）整个赛段重新构建
+    缓存超过 max_age_seconds 也会重新构建，作为兜底。
+
+    数据库查询不持有全局锁：每个赛段同时只有一个线程刷新，
+    其余线程在已有缓存时直接返回旧数据，刷新完成后整体替换缓存对象。
+    """
+
+    def __init__(self, max_age_seconds: float, probe_interval_seconds: float = 1.0):
+        self.max_age_seconds = max_age_seconds
+        self.probe_interval_seconds = probe_interval_seconds
+        self._stages: dict[int, StageStandings] = {}
+        self._refresh_locks: dict[int, threading.Lock] = {}
+        # invalidate 时递增，丢弃失效之前开始的刷新结果
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self, stage: int | None = None) -> None:
+        with self._lock:
+            self._generation += 1
+            if stage is None:
+                self._stages.clear()
+            else:
+                self._stages.pop(stage, None)
+
+    def get(self, session: Session, stage: int) -> dict[str, TieBreakStats]:
+        with self._lock:
+            standings = self._stages.get(stage)
+            refresh_lock = self._refresh_locks.setdefault(stage, threading.Lock())
+
+        if standings is None or not self._is_fresh(standings):
+            # 已有缓存时不排队等待其他线程的刷新
+            if refresh_lock.acquire(blocking=standings is None):
+                try:
+                    standings = self._refresh(session, stage)
+                finally:
+                    refresh_lock.release()
+
+        return {
+            team_name: team.tiebreak_stats()
+            for team_name, team in standings.teams.items()
+        }
+
+    def _is_fresh(self, standings: StageStandings) -> bool:
+        now = time.monotonic()
+        return (
+            now - standings.probed_at < self.probe_interval_seconds
+            and now - standings.built_at < self.max_age_seconds
+        )
+
+    def _refresh(self, session: Session, stage: int) -> StageStandings:
+        with self._lock:
+            standings = self._stages.get(stage)
+            generation = self._generation
+        # 等待刷新锁期间其他线程可能已经刷新过
+        if standings is not None and self._is_fresh(standings):
+            return standings
+
+        standings = self._sync(session, stage, standings)
+        with self._lock:
+            if self._generation == generation:
+                self._stages[stage] = standings
+        return standings
+
+    def _sync(
+        self, session: Session, stage: int, standings: StageStandings | None
+    ) -> StageStandings:
+        """返回与数据库一致的新缓存对象，不修改已发布的 standings"""
+        probed_at = time.monotonic()
+        row_count, max_id, max_updated_at = session.execute(
+            signature_query(stage)
+        ).one()
+        signature = (row_count, max_id or 0, max_updated_at)
+
+        if (
+            standings is not None
+            and probed_at - standings.built_at < self.max_age_seconds
+        ):
+            if standings.signature() == signature:
+                return replace(standings, probed_at=probed_at)
+
+            new_rows = self._fetch_rows(session, stage, standings.max_id)
+            updated = replace(
+                standings,
+                teams={
+                    name: TeamStandings(**vars(team))
+                    for name, team in standings.teams.items()
+                },
+                probed_at=probed_at,
+            )
+            updated.add_rows(new_rows)
+            if updated.signature() == signature:
+                return updated
+            logger.info(f"赛段 {stage} 的比赛数据被修改，重新构建积分榜缓存")
+
+        standings = StageStandings(built_at=probed_at, probed_at=probed_at)
+        standings.add_rows(self._fetch_rows(session, stage, 0))
+        return standings
+
+    @staticmethod
+    def _fetch_rows(session: Session, stage: int, after_id: int):
+        return session.execute(
+            select(
+                MatchRanking.id,
+                MatchRanking.team_name,
+                MatchRanking.ingame_rank,
+                MatchRanking.kill_pts,
+                MatchRanking.place_pts,
+                MatchRanking.total_pts,
+                MatchRanking.created_at,
+                MatchRanking.updated_at,
+            ).where(MatchRanking.stage == stage, MatchRanking.id > after_id)
+        ).all()
+
+
+standings_cache = StandingsCache(
+    max_age_seconds=float(os.getenv("STANDINGS_CACHE_MAX_AGE_SECONDS", "600")),
+    probe_interval_seconds=float(os.getenv("STANDINGS_CACHE_PROBE_SECONDS", "1")),
+)
@@ -13,8 +13,10 @@
     previewGrid: document.getElementById('previewGrid'),
     gameId: document.getElementById('gameId'),
     stage: document.getElementById('stage'),
+    noCache: document.getElementById('noCache'),
     uploadForm: document.getElementById('uploadForm'),
     submitBtn: document.getElementById('submitBtn'),
+    cancelBtn: document.getElementById('cancelBtn'),
     resultArea: document.getElementById('resultArea'),
     copyJsonBtn: document.getElementById('copyJsonBtn'),
     toast: document.getElementById('toast'),
@@ -27,12 +29,6 @@
     setTimeout(() => el.toast.classList.add('hidden'), 2400);
   }
 
-  function setLoading(loading) {
-    if (loading) el.backdrop.classList.remove('hidden');
-    else el.backdrop.classList.add('hidden');
-    el.submitBtn.disabled = !!loading;
-  }
-
   function refreshSummary() {
     const count = state.files.length;
     el.fileCount.textContent = String(count);
@@ -132,6 +128,10 @@
         case 1: return '最终排名错误';
         case 2: return '游戏内排名错误';
         case 3: return '队伍淘汰数错误';
+        case 4: return '队伍缺失（截图中未找到）';
+        case 5: return '多余队伍（API 中不存在）';
+        case 6: return '选手淘汰数错误';
+        case 7: return '多余选手（API 中不存在）';
         default: return '未知类型';
       }
     }
@@ -197,6 +197,7 @@
     const formData = new FormData();
     formData.append('game_id', gameId);
     formData.append('stage', stage);
+    if (el.noCache.checked) formData.append('no_cache', 'true');
 
     // 上传前将用户选择顺序作为 number 序号
     state.files.forEach((item, idx) => {
@@ -206,30 +207,152 @@
       formData.append('files', renamed);
     });
 
+    await runStreamingCheck(formData);
+  });
+
+  const NODE_LABELS = {
+    collect: '读取截图',
+    parser: '识别截图',
+    merge: '合并识别结果',
+    repair: '校验识别结果',
+    compare: '比对 API 数据',
+  };
+
+  let currentController = null;
+
+  function setRunning(running) {
+    el.submitBtn.disabled = !!running;
+    el.cancelBtn.classList.toggle('hidden', !running);
+  }
+
+  el.cancelBtn.addEventListener('click', () => {
+    if (currentController) currentController.abort();
+  });
+
+  function appendProgress(text, status) {
+    const log = el.resultArea.querySelector('.progress-log');
+    if (!log) return null;
+    const item = document.createElement('li');
+    item.className = status;
+    item.textContent = text;
+    log.appendChild(item);
+    return item;
+  }
+
+  function renderParsedTable(gameResult) {
+    const teams = Array.isArray(gameResult?.teams) ? gameResult.teams : [];
+    const rows = teams
+      .slice()
+      .sort((a, b) => a.ranking - b.ranking)
+      .map((t) => `<tr>
+        <td>${escapeHtml(t.ranking)}</td>
+        <td>${escapeHtml(t.team_name)}</td>
+        <td>${escapeHtml(t.total_elims)}</td>
+      </tr>`)
+      .join('');
+    return `
+      <table class="error-table">
+        <thead><tr><th>游戏内排名</th><th>队伍</th><th>淘汰数</th></tr></thead>
+        <tbody>${rows}</tbody>
+      </table>`;
+  }
+
+  function parseSseEvent(raw) {
+    let event = 'message';
+    const data = [];
+    raw.split('\n').forEach((line) => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    });
+    return { event, data: data.length ? JSON.parse(data.join('\n')) : null };
+  }
+
+  // 流式校验：边运行边展示各节点进度、识别结果和错误列表
+  async function runStreamingCheck(formData) {
+    currentController = new AbortController();
+    const running = {};
+    let parsed = null;
+    setRunning(true);
+    el.resultArea.classList.remove('empty');
+    el.resultArea.classList.remove('success');
+    el.resultArea.innerHTML = '<ul class="progress-log"></ul><div class="parsed-area"></div>';
+
+    function handleEvent({ event, data }) {
+      switch (event) {
+        case 'node_start':
+          running[data.node] = running[data.node] || [];
+          running[data.node].push(appendProgress(`${NODE_LABELS[data.node] || data.node}…`, 'running'));
+          break;
+        case 'node_end': {
+          const item = (running[data.node] || []).shift();
+          if (item) item.className = 'done';
+          break;
+        }
+        case 'parsed_image':
+          if (data.error) appendProgress(`第 ${data.index + 1} 张截图识别失败：${data.error}`, 'failed');
+          break;
+        case 'parsed':
+          parsed = data;
+          el.resultArea.querySelector('.parsed-area').innerHTML =
+            `<div class="empty-tip">识别结果（正在比对 API 数据）</div>${renderParsedTable(parsed)}`;
+          break;
+        case 'errors':
+          renderErrorTable(data);
+          if (parsed) {
+            el.resultArea.insertAdjacentHTML('beforeend', `
+              <details style="margin-top:10px;">
+                <summary>查看识别结果</summary>
+                ${renderParsedTable(parsed)}
+              </details>`);
+          }
+          showToast('上传并校验成功');
+          break;
+        case 'error':
+          throw new Error(data?.detail || '校验失败');
+        default:
+          break;
+      }
+    }
+
     try {
-      setLoading(true);
-      const resp = await fetch('/upload', {
+      const resp = await fetch('/upload/stream', {
         method: 'POST',
         body: formData,
+        signal: currentController.signal,
       });
       if (!resp.ok) {
         const text = await resp.text();
         throw new Error(text || `上传失败: ${resp.status}`);
       }
-      const data = await resp.json();
-      // 兼容两种返回：{ error_list: {...} } 或直接 {...}
-      const errorList = data.error_list?.errors ? data.error_list : data;
-      renderErrorTable(errorList);
-      showToast('上传并校验成功');
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let idx;
+        while ((idx = buffer.indexOf('\n\n')) !== -1) {
+          const raw = buffer.slice(0, idx);
+          buffer = buffer.slice(idx + 2);
+          if (raw.trim()) handleEvent(parseSseEvent(raw));
+        }
+      }
     } catch (err) {
+      if (err.name === 'AbortError') {
+        appendProgress('已取消', 'failed');
+        showToast('已取消校验');
+        return;
+      }
       console.error(err);
       el.resultArea.classList.add('empty');
       el.resultArea.innerHTML = `<div class="empty-tip">请求失败：${escapeHtml(err.message || String(err))}</div>`;
       showToast('请求失败');
     } finally {
-      setLoading(false);
+      currentController = null;
+      setRunning(false);
     }
-  });
+  }
 
   function getFileExtension(name) {
     const dot = name.lastIndexOf('.');
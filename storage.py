@@ -0,0 +1,112 @@
+"""
+截图文件和缓存的存储后端。
+
+默认（STORAGE_BACKEND=local）截图保存在本地目录、解析缓存和截图索引使用 SQLite，
+同一台主机上的多个 gunicorn worker 通过同一份文件共享。
+多台主机部署时设置 STORAGE_BACKEND=shared：截图文件保存到 S3（或 MinIO 等兼容 S3 的服务），
+解析缓存和截图索引保存到 Redis，无论请求落在哪个 worker 上都能读到其它 worker 写入的数据。
+shared 模式需要安装 boto3 和 redis（pip install '.[shared]'）。
+"""
+
+import os
+import threading
+from functools import lru_cache
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+# Redis 中所有 key 的前缀，多个环境共用一个 Redis 时用来区分
+REDIS_KEY_PREFIX = os.getenv("REDIS_KEY_PREFIX", "resultschecker:")
+
+
+def shared_storage_enabled() -> bool:
+    if STORAGE_BACKEND not in ("local", "shared"):
+        raise ValueError(f"未知的 STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return STORAGE_BACKEND == "shared"
+
+
+class LocalBlobStorage:
+    """按 key 保存在本地目录中的文件，key 为相对路径"""
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put(self, key: str, content: bytes):
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再改名，读取方不会看到写了一半的文件
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class S3BlobStorage:
+    """保存在 S3 bucket 中的文件，endpoint_url 可指向 MinIO 等兼容 S3 的服务"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: str | None = None):
+        import boto3
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def put(self, key: str, content: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=content)
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return response["Body"].read()
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+
+BlobStorage = LocalBlobStorage | S3BlobStorage
+
+
+def create_blob_storage(local_root: str) -> BlobStorage:
+    if not shared_storage_enabled():
+        return LocalBlobStorage(local_root)
+    return S3BlobStorage(
+        bucket=os.environ["S3_BUCKET"],
+        prefix=os.getenv("S3_PREFIX", ""),
+        endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    import redis
+
+    return redis.Redis.from_url(os.environ["REDIS_URL"], decode_responses=True)
+
+
+def ping_shared_storage():
+    """shared 模式下检查 Redis 是否可用，供启动预热使用"""
+    if shared_storage_enabled():
+        get_redis().ping()
@@ -0,0 +1,145 @@
+import io
+import os
+import tempfile
+from dataclasses import dataclass
+
+import httpx
+import pytest
+from PIL import Image
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 在导入任何业务模块之前把本地存储指向临时目录，测试不写入仓库目录
+_workdir = tempfile.mkdtemp(prefix="resultschecker-tests-")
+os.environ.setdefault("PARSE_CACHE_PATH", os.path.join(_workdir, "parse_cache.sqlite3"))
+os.environ.setdefault("SCREENSHOT_STORE_PATH", os.path.join(_workdir, "images"))
+os.environ.setdefault("JOB_DB_PATH", os.path.join(_workdir, "jobs.sqlite3"))
+os.environ.setdefault("STORAGE_BACKEND", "local")
+
+from models import Base  # noqa: E402
+from schemas import (  # noqa: E402
+    GameResult,
+    PlayerResult,
+    TeamResult,
+    empty_tiebreak_stats,
+)
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+@pytest.fixture
+def fixture_bytes():
+    def read(name: str) -> bytes:
+        with open(os.path.join(FIXTURES_DIR, name), "rb") as f:
+            return f.read()
+
+    return read
+
+
+class FakeLLM:
+    """替代 with_structured_output 之后的 LLM，记录调用的提示词并返回预设的结果"""
+
+    def __init__(self, game_result):
+        self.game_result = game_result
+        self.prompts: list[str] = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[0]["content"][0]["text"])
+        return self.game_result.model_copy(deep=True)
+
+
+@dataclass
+class Pipeline:
+    bind: Engine
+    llm: FakeLLM
+    api_result: list[dict]
+
+
+def make_game_result() -> GameResult:
+    return GameResult(
+        teams=[
+            TeamResult(
+                team_name="Alpha",
+                ranking=1,
+                total_elims=5,
+                players=[
+                    PlayerResult(player_name="alpha1", elims=3),
+                    PlayerResult(player_name="alpha2", elims=2),
+                ],
+                tiebreak_stats=empty_tiebreak_stats(),
+            ),
+            TeamResult(
+                team_name="Bravo",
+                ranking=2,
+                total_elims=1,
+                players=[
+                    PlayerResult(player_name="bravo1", elims=1),
+                    PlayerResult(player_name="bravo2", elims=0),
+                ],
+                tiebreak_stats=empty_tiebreak_stats(),
+            ),
+        ]
+    )
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path) -> Pipeline:
+    """
+    在 SQLite 内存库、假 LLM 和本地模拟的 match_ranking 接口上运行检查流程，
+    解析缓存使用本测试独立的临时文件
+    """
+    import api_client
+    import graph
+    import history
+    from parse_cache import ParseCache
+
+    bind = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind)
+    session_factory = sessionmaker(bind=bind, autoflush=False, autocommit=False)
+    monkeypatch.setattr(graph, "get_session_factory", lambda: session_factory)
+    monkeypatch.setattr(history.check_history, "session_factory", session_factory)
+    monkeypatch.setattr(history.check_history, "_buffer", [])
+
+    llm = FakeLLM(make_game_result())
+    monkeypatch.setattr(graph, "get_game_result_llm", lambda: llm)
+    parse_cache = ParseCache(
+        str(tmp_path / "parse_cache.sqlite3"), ttl_seconds=3600, max_entries=100
+    )
+    monkeypatch.setattr(graph, "get_parse_cache", lambda: parse_cache)
+    graph.standings_cache.invalidate()
+
+    api_result = [
+        {"team_name": "Alpha", "rank": 1, "ingame_rank": 1, "kill_pts": 5},
+        {"team_name": "Bravo", "rank": 2, "ingame_rank": 2, "kill_pts": 1},
+    ]
+    client = api_client.match_ranking_client
+    monkeypatch.setattr(
+        client,
+        "transport",
+        httpx.MockTransport(
+            lambda request: httpx.Response(200, json={"data": api_result})
+        ),
+    )
+    monkeypatch.setattr(client, "_client", None)
+    monkeypatch.setattr(client, "_data", None)
+    monkeypatch.setattr(client, "_etag", None)
+    return Pipeline(bind=bind, llm=llm, api_result=api_result)
+
+
+@pytest.fixture
+def make_screenshot():
+    """内容各不相同的小截图，避免不同用例之间命中解析缓存"""
+
+    def make(seed: int) -> bytes:
+        buffer = io.BytesIO()
+        Image.new("RGB", (64, 36), (seed % 256, seed // 256 % 256, 128)).save(
+            buffer, "PNG"
+        )
+        return buffer.getvalue()
+
+    return make
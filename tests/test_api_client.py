@@ -0,0 +1,168 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from api_client import MatchRankingClient
+
+DATA = [{"team_name": "Alpha", "rank": 1, "ingame_rank": 1, "kill_pts": 5}]
+
+
+class StubServer:
+    """
+    本地 match_ranking 接口。responses 中依次取出每个请求的应答：
+    状态码，或 ("sleep", 秒数) 表示先等待再正常返回；取完后都返回 200
+    """
+
+    def __init__(self):
+        self.responses: list = []
+        self.requests: list[dict] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stub.requests.append(
+                    {
+                        "port": self.client_address[1],
+                        "if_none_match": self.headers.get("If-None-Match"),
+                    }
+                )
+                response = stub.responses.pop(0) if stub.responses else 200
+                if isinstance(response, tuple):
+                    time.sleep(response[1])
+                    response = 200
+                if response == 200 and self.headers.get("If-None-Match") == '"v1"':
+                    response = 304
+                body = json.dumps({"data": DATA}).encode() if response == 200 else b""
+                self.send_response(response)
+                self.send_header("ETag", '"v1"')
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+def make_client(stub: StubServer, **kwargs) -> MatchRankingClient:
+    options = {"read_timeout": 1.0, "backoff": 0.01, "cache_ttl": 0}
+    options.update(kwargs)
+    return MatchRankingClient(stub.base_url, **options)
+
+
+async def fetch_then_close(client: MatchRankingClient, times: int = 1):
+    try:
+        return [await client.fetch_match_ranking() for _ in range(times)]
+    finally:
+        await client.aclose()
+
+
+def test_retries_server_errors(stub):
+    stub.responses = [503, 502]
+
+    results = asyncio.run(fetch_then_close(make_client(stub, max_retries=2)))
+
+    assert results == [DATA]
+    assert len(stub.requests) == 3
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.responses = [503, 503]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fetch_then_close(make_client(stub, max_retries=1)))
+    assert len(stub.requests) == 2
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.responses = [404]
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(fetch_then_close(make_client(stub, max_retries=2)))
+    assert len(stub.requests) == 1
+
+
+def test_read_timeout_is_retried(stub):
+    stub.responses = [("sleep", 0.5)]
+
+    results = asyncio.run(
+        fetch_then_close(make_client(stub, read_timeout=0.2, max_retries=1))
+    )
+
+    assert results == [DATA]
+    assert len(stub.requests) == 2
+
+
+def test_read_timeout_without_retries_raises(stub):
+    stub.responses = [("sleep", 0.5)]
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(
+            fetch_then_close(make_client(stub, read_timeout=0.2, max_retries=0))
+        )
+
+
+def test_reuses_one_connection_and_revalidates_with_etag(stub):
+    results = asyncio.run(fetch_then_close(make_client(stub), times=3))
+
+    assert results == [DATA] * 3
+    assert len({request["port"] for request in stub.requests}) == 1
+    assert [request["if_none_match"] for request in stub.requests] == [
+        None,
+        '"v1"',
+        '"v1"',
+    ]
+
+
+def test_cached_result_skips_request(stub):
+    results = asyncio.run(fetch_then_close(make_client(stub, cache_ttl=60), times=3))
+
+    assert results == [DATA] * 3
+    assert len(stub.requests) == 1
+
+
+def test_client_of_another_loop_is_closed_before_replacing(stub):
+    client = make_client(stub)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        asyncio.run_coroutine_threadsafe(client.fetch_match_ranking(), loop).result(5)
+        stale = client._client
+
+        asyncio.run(fetch_then_close(client))
+
+        deadline = time.monotonic() + 5
+        while not stale.is_closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert stale.is_closed
+        assert client._client is None
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+import main
+from graph import get_game_snapshots
+from history import check_history
+from models import MatchRanking
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def add_match(bind, war_id: str, minute: int, teams: list[tuple[str, int, int]]):
+    """teams 为按名次排列的 (队伍名, 游戏内排名, 淘汰数)"""
+    with Session(bind) as session:
+        for rank, (team_name, ingame_rank, kill_pts) in enumerate(teams, start=1):
+            session.add(
+                MatchRanking(
+                    war_id=war_id,
+                    team_name=team_name,
+                    stage=1,
+                    rank=rank,
+                    ingame_rank=ingame_rank,
+                    kill_pts=kill_pts,
+                    place_pts=10 - ingame_rank,
+                    total_pts=kill_pts + 10 - ingame_rank,
+                    created_at=BASE_TIME + timedelta(minutes=minute),
+                    updated_at=BASE_TIME + timedelta(minutes=minute),
+                )
+            )
+        session.commit()
+
+
+def test_batch_records_only_each_games_screenshots(pipeline, make_screenshot):
+    screenshots = {
+        "g1_rank_1.png": make_screenshot(11),
+        "g1_rank_2.png": make_screenshot(12),
+        "g2_rank_1.png": make_screenshot(21),
+    }
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/batch",
+        data={"game_ids": ["g1", "g2"], "stage": "1"},
+        files=[
+            ("files", (name, content, "image/png"))
+            for name, content in screenshots.items()
+        ],
+    )
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["game_id"] for line in lines) == ["g1", "g2"]
+    assert all(line["error_list"] == {"errors": []} for line in lines)
+
+    records = {record["game_id"]: record for record in check_history._buffer}
+    for game_id in ("g1", "g2"):
+        assert records[game_id]["input_hashes"] == [
+            {"name": name, "sha256": hashlib.sha256(content).hexdigest()}
+            for name, content in screenshots.items()
+            if name.startswith(f"{game_id}_")
+        ]
+
+
+def test_batch_compares_each_game_with_its_own_rows(pipeline, make_screenshot):
+    add_match(pipeline.bind, "g1", 0, [("Alpha", 1, 5), ("Bravo", 2, 1)])
+    add_match(pipeline.bind, "g2", 1, [("Alpha", 1, 9), ("Bravo", 2, 1)])
+    # 接口当前返回的是最新一场（还没写入 match_ranking）的数据
+    pipeline.api_result[0]["kill_pts"] = 7
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/batch",
+        data={"game_ids": ["g1", "g2", "g3"], "stage": "1"},
+        files=[
+            ("files", (f"{game_id}_rank_1.png", make_screenshot(seed), "image/png"))
+            for seed, game_id in enumerate(["g1", "g2", "g3"], start=31)
+        ],
+    )
+
+    assert response.status_code == 200
+    results = {
+        line["game_id"]: line["error_list"]["errors"]
+        for line in map(json.loads, response.text.splitlines())
+    }
+    assert results["g1"] == []
+    assert [(e["error_type"], e["original_data"]) for e in results["g2"]] == [(3, 9)]
+    assert [(e["error_type"], e["original_data"]) for e in results["g3"]] == [(3, 7)]
+
+
+def test_game_snapshots_accumulate_tiebreak_stats_up_to_each_game(pipeline):
+    add_match(pipeline.bind, "g1", 0, [("Alpha", 1, 5), ("Bravo", 2, 1)])
+    add_match(pipeline.bind, "g2", 1, [("Bravo", 1, 4), ("Alpha", 2, 2)])
+    add_match(pipeline.bind, "g3", 2, [("Alpha", 1, 3), ("Bravo", 2, 0)])
+
+    with Session(pipeline.bind) as session:
+        snapshots = get_game_snapshots(session, 1, ["g2", "g1", "missing"])
+
+    assert set(snapshots) == {"g1", "g2"}
+    api_result, tiebreak_stats = snapshots["g1"]
+    assert api_result == [
+        {"team_name": "Alpha", "rank": 1, "ingame_rank": 1, "kill_pts": 5},
+        {"team_name": "Bravo", "rank": 2, "ingame_rank": 2, "kill_pts": 1},
+    ]
+    assert tiebreak_stats["Bravo"]["wwcd_count"] == 0
+    assert tiebreak_stats["Alpha"]["stage_total_kill"] == 5
+
+    api_result, tiebreak_stats = snapshots["g2"]
+    assert [team["team_name"] for team in api_result] == ["Bravo", "Alpha"]
+    assert tiebreak_stats["Bravo"]["wwcd_count"] == 1
+    assert tiebreak_stats["Alpha"]["stage_total_kill"] == 7
+    assert tiebreak_stats["Alpha"]["last_match_total_kill"] == 2
@@ -0,0 +1,114 @@
+import pytest
+
+from comparison import (
+    FINAL_RANKING_ERROR,
+    INGAME_RANKING_ERROR,
+    TEAM_MISSING_IN_API,
+    TEAM_MISSING_IN_GAME,
+    TOTAL_ELIMS_ERROR,
+    compare_results,
+)
+from schemas import TeamResult, empty_tiebreak_stats
+
+
+def make_team(team_name: str, final_ranking: int, ranking: int, elims: int):
+    return TeamResult(
+        team_name=team_name,
+        ranking=ranking,
+        total_elims=elims,
+        final_ranking=final_ranking,
+        players=[],
+        tiebreak_stats=empty_tiebreak_stats(),
+    )
+
+
+def api_team(team_name: str, rank: int, ingame_rank: int, kill_pts: int) -> dict:
+    return {
+        "team_name": team_name,
+        "rank": rank,
+        "ingame_rank": ingame_rank,
+        "kill_pts": kill_pts,
+    }
+
+
+def errors_of(teams, api_result) -> list[tuple]:
+    return [
+        (error.error_type, error.team, error.original_data, error.correct_data)
+        for error in compare_results(teams, api_result).errors
+    ]
+
+
+def test_matching_results_report_nothing():
+    teams = [make_team("Alpha", 1, 1, 5), make_team("Bravo", 2, 2, 1)]
+    api_result = [api_team("Bravo", 2, 2, 1), api_team("Alpha", 1, 1, 5)]
+
+    assert errors_of(teams, api_result) == []
+
+
+@pytest.mark.parametrize(
+    "api, expected",
+    [
+        (api_team("Alpha", 2, 1, 5), [(FINAL_RANKING_ERROR, "Alpha", 2, 1)]),
+        (api_team("Alpha", 1, 3, 5), [(INGAME_RANKING_ERROR, "Alpha", 3, 1)]),
+        (api_team("Alpha", 1, 1, 4), [(TOTAL_ELIMS_ERROR, "Alpha", 4, 5)]),
+        (
+            api_team("Alpha", 2, 3, 4),
+            [
+                (FINAL_RANKING_ERROR, "Alpha", 2, 1),
+                (INGAME_RANKING_ERROR, "Alpha", 3, 1),
+                (TOTAL_ELIMS_ERROR, "Alpha", 4, 5),
+            ],
+        ),
+    ],
+)
+def test_field_mismatches(api, expected):
+    assert errors_of([make_team("Alpha", 1, 1, 5)], [api]) == expected
+
+
+def test_team_missing_in_game_is_type_4():
+    teams = [make_team("Alpha", 1, 1, 5)]
+    api_result = [api_team("Alpha", 1, 1, 5), api_team("Bravo", 2, 2, 1)]
+
+    assert errors_of(teams, api_result) == [
+        (TEAM_MISSING_IN_GAME, "Bravo", 2, "截图中未找到")
+    ]
+
+
+def test_team_missing_in_api_is_type_5():
+    teams = [make_team("Alpha", 1, 1, 5), make_team("Bravo", 2, 2, 1)]
+
+    assert errors_of(teams, [api_team("Alpha", 1, 1, 5)]) == [
+        (TEAM_MISSING_IN_API, "Bravo", "API 中不存在", 2)
+    ]
+
+
+def test_normalized_names_match_and_report_the_api_name():
+    teams = [make_team("ＡＬＰＨＡ ", 2, 1, 5)]
+
+    assert errors_of(teams, [api_team("alpha", 1, 1, 5)]) == [
+        (FINAL_RANKING_ERROR, "alpha", 1, 2)
+    ]
+
+
+def test_colliding_api_names_are_not_merged():
+    teams = [make_team("Alpha", 1, 1, 5)]
+    api_result = [api_team("Alpha", 1, 1, 5), api_team("ALPHA", 2, 2, 1)]
+
+    assert errors_of(teams, api_result) == [
+        (TEAM_MISSING_IN_GAME, "ALPHA", 2, "截图中未找到")
+    ]
+
+
+def test_colliding_names_prefer_the_exact_name():
+    teams = [make_team("ALPHA", 2, 2, 1), make_team("Alpha", 1, 1, 5)]
+    api_result = [api_team("Alpha", 1, 1, 5), api_team("ALPHA", 2, 2, 1)]
+
+    assert errors_of(teams, api_result) == []
+
+
+def test_colliding_game_names_match_one_api_team():
+    teams = [make_team("Alpha", 1, 1, 5), make_team("alpha", 2, 2, 1)]
+
+    assert errors_of(teams, [api_team("Alpha", 1, 1, 5)]) == [
+        (TEAM_MISSING_IN_API, "alpha", "API 中不存在", 2)
+    ]
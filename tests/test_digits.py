@@ -0,0 +1,180 @@
+import asyncio
+import io
+import json
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+import graph
+from digits import DigitRecognizer, apply_digit_readings
+from preprocess import PreprocessedImage
+from schemas import GameResult, PlayerResult, TeamResult
+
+FONT = ImageFont.load_default(size=40)
+CELL_WIDTH, CELL_HEIGHT = 120, 60
+
+
+def draw_cell(text: str) -> Image.Image:
+    image = Image.new("L", (CELL_WIDTH, CELL_HEIGHT), 20)
+    ImageDraw.Draw(image).text((10, 5), text, fill=230, font=FONT)
+    return image
+
+
+def gray(image: Image.Image) -> np.ndarray:
+    return np.asarray(image, dtype=np.float32) / 255
+
+
+@pytest.fixture
+def templates_dir(tmp_path):
+    directory = tmp_path / "templates"
+    directory.mkdir()
+    for digit in range(10):
+        draw_cell(str(digit)).save(directory / f"{digit}.png")
+    return directory
+
+
+def make_recognizer(templates_dir, slots=(), rank_suffix=False) -> DigitRecognizer:
+    layout_path = templates_dir.parent / "layout.json"
+    layout_path.write_text(
+        json.dumps({"slots": list(slots), "rank_suffix": rank_suffix})
+    )
+    return DigitRecognizer.from_files(str(templates_dir), str(layout_path), 0.85)
+
+
+@pytest.mark.parametrize("text, value", [("0", 0), ("7", 7), ("12", 12), ("40", 40)])
+def test_read_number(templates_dir, text, value):
+    reading = make_recognizer(templates_dir).read_number(gray(draw_cell(text)))
+
+    assert reading.value == value
+    assert reading.confidence > 0.95
+
+
+@pytest.mark.parametrize(
+    "text, value", [("1ST", 1), ("2ND", 2), ("3RD", 3), ("4TH", 4), ("15TH", 15)]
+)
+def test_read_rank_with_suffix(templates_dir, text, value):
+    reading = make_recognizer(templates_dir).read_number(gray(draw_cell(text)), 2)
+
+    assert reading.value == value
+    assert reading.confidence > 0.95
+
+
+@pytest.mark.parametrize("text", ["1ST", "S", "B8", "X"])
+def test_letters_are_never_confident(templates_dir, text):
+    # 没有配置后缀时 "1ST" 的字母也按数字匹配，不会读成 1 或 15 后被当作可信结果
+    reading = make_recognizer(templates_dir).read_number(gray(draw_cell(text)))
+
+    assert reading.confidence < 0.85
+
+
+def test_empty_cell(templates_dir):
+    reading = make_recognizer(templates_dir).read_number(gray(draw_cell("")))
+
+    assert reading.value is None
+
+
+# 两个结算框，每个框一个排名格、两个淘汰数格，横向排成一行
+SLOTS = [
+    {
+        "rank": [0.0, 0.5 * row, 1 / 3, 0.5 * row + 0.5],
+        "elims": [
+            [1 / 3, 0.5 * row, 2 / 3, 0.5 * row + 0.5],
+            [2 / 3, 0.5 * row, 1.0, 0.5 * row + 0.5],
+        ],
+    }
+    for row in range(2)
+]
+
+
+def draw_screenshot(rows: list[list[str]]) -> bytes:
+    image = Image.new("L", (CELL_WIDTH * 3, CELL_HEIGHT * 2), 20)
+    for row, texts in enumerate(rows):
+        for column, text in enumerate(texts):
+            image.paste(draw_cell(text), (column * CELL_WIDTH, row * CELL_HEIGHT))
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_read_slots_skips_empty_slots(templates_dir):
+    recognizer = make_recognizer(templates_dir, SLOTS, rank_suffix=True)
+
+    readings = recognizer.read_slots(
+        draw_screenshot([["1ST", "3", "12"], ["", "", ""]])
+    )
+
+    assert len(readings) == 1
+    assert readings[0].rank.value == 1
+    assert [cell.value for cell in readings[0].elims] == [3, 12]
+    assert readings[0].confident(recognizer.min_confidence)
+
+
+def names_only() -> GameResult:
+    return GameResult(
+        teams=[
+            TeamResult(
+                team_name=team_name,
+                ranking=0,
+                total_elims=0,
+                players=[
+                    PlayerResult(player_name=f"{team_name.lower()}{n}", elims=0)
+                    for n in (1, 2)
+                ],
+            )
+            for team_name in ("Alpha", "Bravo")
+        ]
+    )
+
+
+def test_apply_digit_readings(templates_dir):
+    recognizer = make_recognizer(templates_dir, SLOTS, rank_suffix=True)
+    readings = recognizer.read_slots(
+        draw_screenshot([["1ST", "3", "2"], ["2ND", "1", "0"]])
+    )
+
+    game_result = apply_digit_readings(names_only(), readings)
+
+    assert [(t.ranking, t.total_elims) for t in game_result.teams] == [(1, 5), (2, 1)]
+    assert apply_digit_readings(names_only(), readings[:1]) is None
+
+
+def parse(data: bytes) -> GameResult | None:
+    image = PreprocessedImage(data=data, mime_type="image/png", original_size=len(data))
+    return asyncio.run(graph.parse_with_digits(image, data, use_cache=False))
+
+
+def test_parse_with_digits_uses_llm_only_for_names(
+    pipeline, templates_dir, monkeypatch
+):
+    recognizer = make_recognizer(templates_dir, SLOTS, rank_suffix=True)
+    monkeypatch.setattr(graph, "get_digit_recognizer", lambda: recognizer)
+
+    game_result = parse(draw_screenshot([["1ST", "3", "2"], ["2ND", "1", "0"]]))
+
+    assert pipeline.llm.prompts == [graph.NAMES_ONLY_PROMPT]
+    assert [t.total_elims for t in game_result.teams] == [5, 1]
+
+
+def test_low_confidence_cell_falls_back_to_llm(pipeline, templates_dir, monkeypatch):
+    recognizer = make_recognizer(templates_dir, SLOTS, rank_suffix=True)
+    monkeypatch.setattr(graph, "get_digit_recognizer", lambda: recognizer)
+    # 淘汰数格被遮挡成字母
+    data = draw_screenshot([["1ST", "3", "X"], ["2ND", "1", "0"]])
+
+    assert parse(data) is None
+    assert pipeline.llm.prompts == []
+
+    update = asyncio.run(
+        graph.parse_game_result_image(
+            {
+                "index": 0,
+                "image_file": "g1_rank_1.png",
+                "data": data,
+                "use_cache": False,
+            }
+        )
+    )
+
+    assert update["parsed_images"][0]["error"] is None
+    assert pipeline.llm.prompts == [graph.IMAGE_PARSING_PROMPT]
@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+import main
+from comparison import FINAL_RANKING_ERROR, PLAYER_ELIMS_ERROR, TOTAL_ELIMS_ERROR
+from history import error_types_from_mask
+from models import CheckResult
+
+
+def seed_checks(bind, count: int) -> dict[int, list[int]]:
+    """所有记录的 created_at 相同；返回 {id: 错误类型}"""
+    rows = []
+    with Session(bind) as session:
+        for index in range(count):
+            if index % 4 == 0:
+                error_types = [TOTAL_ELIMS_ERROR]
+            elif index % 5 == 0:
+                error_types = [FINAL_RANKING_ERROR, PLAYER_ELIMS_ERROR]
+            else:
+                error_types = []
+            rows.append(
+                CheckResult(
+                    game_id=f"g{index % 3}",
+                    stage=1,
+                    error_count=len(error_types),
+                    error_types=sum(1 << error_type for error_type in error_types),
+                    error_list={"errors": []},
+                    created_at=datetime(2026, 1, 1),
+                )
+            )
+        session.add_all(rows)
+        session.commit()
+        return {row.id: error_types_from_mask(row.error_types) for row in rows}
+
+
+def walk_pages(client: TestClient, **params) -> list[dict]:
+    items, before = [], None
+    while True:
+        page_params = dict(params) if before is None else {**params, "before": before}
+        page = client.get("/history", params=page_params).json()
+        items.extend(page["items"])
+        before = page["next_before"]
+        if before is None:
+            return items
+
+
+@pytest.mark.parametrize("error_type", [-1, 0, 8, 64, 10**30])
+def test_history_rejects_unknown_error_type(pipeline, error_type):
+    response = TestClient(main.app).get("/history", params={"error_type": error_type})
+
+    assert response.status_code == 422
+
+
+def test_history_filters_by_error_type(pipeline):
+    response = TestClient(main.app).get("/history", params={"error_type": 3})
+
+    assert response.status_code == 200
+    assert response.json() == {"items": [], "next_before": None}
+
+
+def test_history_pages_through_every_row_once(pipeline):
+    checks = seed_checks(pipeline.bind, 23)
+    client = TestClient(main.app)
+
+    items = walk_pages(client, limit=5)
+
+    ids = [item["id"] for item in items]
+    assert ids == sorted(checks, reverse=True)
+    assert [item["error_types"] for item in items] == [checks[i] for i in ids]
+
+
+def test_history_pages_filtered_by_error_type(pipeline):
+    checks = seed_checks(pipeline.bind, 23)
+    client = TestClient(main.app)
+
+    for error_type in (TOTAL_ELIMS_ERROR, PLAYER_ELIMS_ERROR):
+        items = walk_pages(client, error_type=error_type, limit=2)
+
+        expected = [i for i in sorted(checks, reverse=True) if error_type in checks[i]]
+        assert expected
+        assert [item["id"] for item in items] == expected
+
+
+def test_history_filters_by_game_id(pipeline):
+    checks = seed_checks(pipeline.bind, 10)
+    client = TestClient(main.app)
+
+    items = walk_pages(client, game_id="g1", limit=2)
+
+    assert len(items) == len([i for i in range(10) if i % 3 == 1]) == 3
+    assert all(item["game_id"] == "g1" for item in items)
+    assert all(item["id"] in checks for item in items)
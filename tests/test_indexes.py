@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, inspect, text
+
+from migrate import create_indexes, explain_tiebreak_query
+from models import MatchRanking, Team
+
+
+def test_tiebreak_query_uses_covering_index():
+    bind = create_engine("sqlite://")
+    MatchRanking.__table__.create(bind)
+
+    plans = explain_tiebreak_query(bind)
+
+    assert plans
+    assert not [plan for plan in plans if plan.startswith("FULL SCAN")]
+    assert all(
+        "COVERING INDEX ix_match_ranking_stage_team_created" in plan for plan in plans
+    )
+
+
+def test_create_indexes_skips_missing_tables(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path / 'legacy.sqlite3'}")
+    # 只有后台维护的旧表，还没有 check_result
+    MatchRanking.__table__.create(bind)
+    Team.__table__.create(bind)
+    with bind.begin() as conn:
+        conn.execute(text("DROP INDEX ix_match_ranking_stage_team_created"))
+
+    created = create_indexes(bind)
+
+    assert "ix_match_ranking_stage_team_created" in created
+    assert not [name for name in created if name.startswith("ix_check_result")]
+    tables = inspect(bind).get_table_names()
+    assert "check_result" not in tables
+    indexes = {index["name"] for index in inspect(bind).get_indexes("match_ranking")}
+    assert "ix_match_ranking_stage_team_created" in indexes
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from jobs import FAILED, RUNNING, SUCCEEDED, JobQueue, JobStore
+from schemas import ErrorList
+
+
+def make_queue(path: str, run) -> JobQueue:
+    return JobQueue(
+        JobStore(path, retention_seconds=3600, lease_seconds=60),
+        run=run,
+        workers=1,
+        max_queued=10,
+    )
+
+
+async def wait_for_status(queue: JobQueue, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        job = await queue.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} is {job['status']}, expected {status}")
+
+
+def test_starting_a_worker_keeps_sibling_jobs_running(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    release = asyncio.Event()
+
+    async def run(game_id, stage, use_cache, uploads=None):
+        await release.wait()
+        return ErrorList(errors=[])
+
+    async def scenario():
+        first = make_queue(path, run)
+        await first.start()
+        job_id, _ = await first.submit("key", "g1", 1, True)
+        await wait_for_status(first, job_id, RUNNING)
+
+        # 另一个 worker 进程启动（或滚动重启）时不能把这个任务标记为失败
+        second = make_queue(path, run)
+        await second.start()
+        assert (await second.get(job_id))["status"] == RUNNING
+
+        release.set()
+        job = await wait_for_status(first, job_id, SUCCEEDED)
+        assert job["result"] == {"errors": []}
+        await first.stop()
+        await second.stop()
+
+    asyncio.run(scenario())
+
+
+def test_starting_a_worker_fails_jobs_of_exited_processes(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path, retention_seconds=3600, lease_seconds=60)
+    store.heartbeat("crashed")
+    with store._connect() as conn:
+        conn.execute(
+            "UPDATE job_owners SET heartbeat_at = ? WHERE owner = 'crashed'",
+            (time.time() - 120,),
+        )
+    store.create("stale", "key-1", "g1", 1, True, "crashed")
+    store.mark_running("stale")
+    store.create("alive", "key-2", "g2", 1, True, "sibling")
+    store.heartbeat("sibling")
+
+    async def run(game_id, stage, use_cache, uploads=None):
+        return ErrorList(errors=[])
+
+    async def scenario():
+        queue = make_queue(path, run)
+        await queue.start()
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+    assert store.get("stale")["status"] == FAILED
+    assert store.get("alive")["status"] != FAILED
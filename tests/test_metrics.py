@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from metrics import track_pool
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def pool_connections(state: str) -> float:
+    return REGISTRY.get_sample_value(
+        "resultschecker_db_pool_connections", {"state": state}
+    )
+
+
+def test_pool_state_exported_to_prometheus(tmp_path):
+    bind = create_engine(
+        f"sqlite:///{tmp_path / 'pool.sqlite3'}",
+        poolclass=QueuePool,
+        pool_size=2,
+        max_overflow=2,
+    )
+    track_pool(bind)
+    checkouts = (
+        REGISTRY.get_sample_value(
+            "resultschecker_db_pool_events_total", {"event": "checkout"}
+        )
+        or 0
+    )
+
+    connections = [bind.connect() for _ in range(3)]
+    assert pool_connections("size") == 2
+    assert pool_connections("checked_out") == 3
+    assert pool_connections("overflow") == 1
+    assert (
+        REGISTRY.get_sample_value(
+            "resultschecker_db_pool_events_total", {"event": "checkout"}
+        )
+        == checkouts + 3
+    )
+
+    for connection in reversed(connections):
+        connection.close()
+    assert pool_connections("checked_out") == 0
+    assert pool_connections("overflow") == 0
+    bind.dispose()
+
+
+def test_models_does_not_import_metrics():
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, models; assert 'metrics' not in sys.modules",
+        ],
+        cwd=REPO_DIR,
+        check=True,
+    )
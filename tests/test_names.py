@@ -0,0 +1,191 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, event
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from models import OCR, Player, Team
+from names import NameIndex, NameResolver
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+def make_index(*names: str) -> NameIndex:
+    index = NameIndex(min_similarity=0.8)
+    for pk, name in enumerate(names):
+        index.upsert("team", str(pk), name)
+    return index
+
+
+@pytest.mark.parametrize(
+    "parsed, registered",
+    [
+        ("Phoenix Rising", "Phoenix Rising"),
+        ("PHOENIX rising", "Phoenix Rising"),
+        # 全角字符
+        ("Ｐｈｏｅｎｉｘ　Ｒｉｓｉｎｇ", "Phoenix Rising"),
+        # 战队前缀
+        ("[PR]Phoenix Rising", "Phoenix Rising"),
+        ("【PR】Phoenix Rising", "Phoenix Rising"),
+        # 少一个字母，相似度 12/13
+        ("Phoenix Risng", "Phoenix Rising"),
+    ],
+)
+def test_lookup_matches_registered_name(parsed, registered):
+    assert make_index("Phoenix Rising", "Shadow Wolves").lookup(parsed) == registered
+
+
+def test_lookup_rejects_names_below_threshold():
+    index = make_index("Phoenix Rising", "Shadow Wolves")
+
+    assert index.lookup("Phoenix") is None
+    assert index.lookup("Phantom Rider") is None
+    assert index.lookup("!!!") is None
+
+
+def test_lookup_rejects_ambiguous_names():
+    index = make_index("Team Alpha1", "Team Alpha2")
+
+    assert index.lookup("Team Alpha3") is None
+    assert index.lookup("team alpha1") == "Team Alpha1"
+
+
+def test_upsert_replaces_renamed_entry():
+    index = make_index("Phoenix Rising")
+    index.upsert("team", "0", "Shadow Wolves")
+
+    assert len(index) == 1
+    assert index.lookup("Phoenix Rising") is None
+    assert index.lookup("shadow wolves") == "Shadow Wolves"
+
+
+@pytest.fixture
+def bind():
+    bind = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    for model in (Team, Player, OCR):
+        model.__table__.create(bind)
+    return bind
+
+
+def add_team(session: Session, team_code: int, team_name: str, minute: int):
+    session.merge(
+        Team(
+            team_code=team_code,
+            team_id=str(team_code),
+            team_name=team_name,
+            updated_at=BASE_TIME + timedelta(minutes=minute),
+        )
+    )
+    session.commit()
+
+
+def make_resolver(**kwargs) -> NameResolver:
+    options = {"refresh_seconds": 0, "max_age_seconds": 3600, "min_similarity": 0.8}
+    options.update(kwargs)
+    return NameResolver(**options)
+
+
+def test_refresh_reads_only_rows_past_the_watermark(bind):
+    statements = []
+    event.listen(
+        bind,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    resolver = make_resolver()
+    with Session(bind) as session:
+        add_team(session, 1, "Phoenix Rising", 0)
+        session.add(Player(uid="u1", player_name="ShadowHunter", updated_at=BASE_TIME))
+        session.commit()
+        resolver.refresh(session)
+        assert resolver.resolve_team("phoenix rising") == "Phoenix Rising"
+        assert resolver.resolve_player("[PR]ShadowHunter") == "ShadowHunter"
+
+        add_team(session, 2, "Shadow Wolves", 1)
+        # 改名的行 updated_at 也会更新
+        add_team(session, 1, "Phoenix Reborn", 2)
+        statements.clear()
+        resolver.refresh(session)
+
+    team_queries = [sql for sql in statements if "FROM team" in sql]
+    assert len(team_queries) == 1
+    assert "team.updated_at >=" in team_queries[0]
+    assert resolver.resolve_team("shadow wolves") == "Shadow Wolves"
+    assert resolver.resolve_team("Phoenix Reborn") == "Phoenix Reborn"
+    assert resolver.resolve_team("Phoenix Rising") == "Phoenix Rising"
+    assert resolver.teams.lookup("Phoenix Rising") is None
+    assert len(resolver.teams) == 2
+
+
+def test_refresh_interval_skips_database(bind):
+    resolver = make_resolver(refresh_seconds=60)
+    with Session(bind) as session:
+        add_team(session, 1, "Phoenix Rising", 0)
+        resolver.refresh(session)
+        add_team(session, 2, "Shadow Wolves", 1)
+        resolver.refresh(session)
+
+    assert resolver.teams.lookup("Shadow Wolves") is None
+
+
+def test_rebuild_after_max_age_drops_deleted_rows(bind):
+    resolver = make_resolver(max_age_seconds=3600)
+    with Session(bind) as session:
+        add_team(session, 1, "Phoenix Rising", 0)
+        add_team(session, 2, "Shadow Wolves", 0)
+        resolver.refresh(session)
+
+        session.execute(delete(Team).where(Team.team_code == 2))
+        session.commit()
+        # 删除无法增量感知
+        resolver.refresh(session)
+        assert resolver.teams.lookup("Shadow Wolves") == "Shadow Wolves"
+
+        resolver.max_age_seconds = 0
+        resolver.refresh(session)
+
+    assert resolver.teams.lookup("Shadow Wolves") is None
+    assert resolver.teams.lookup("Phoenix Rising") == "Phoenix Rising"
+
+
+def test_resolve_is_not_blocked_by_a_running_refresh(bind, monkeypatch):
+    resolver = make_resolver()
+    with Session(bind) as session:
+        add_team(session, 1, "Phoenix Rising", 0)
+        resolver.refresh(session)
+
+    fetching = threading.Event()
+    release = threading.Event()
+    fetch = resolver._fetch
+
+    def slow_fetch(*args):
+        fetching.set()
+        release.wait(5)
+        return fetch(*args)
+
+    monkeypatch.setattr(resolver, "_fetch", slow_fetch)
+
+    def refresh():
+        with Session(bind) as session:
+            resolver.refresh(session)
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+    try:
+        assert fetching.wait(5)
+        resolved = []
+        reader = threading.Thread(
+            target=lambda: resolved.append(resolver.resolve_team("PHOENIX RISING"))
+        )
+        reader.start()
+        reader.join(1)
+        assert resolved == ["Phoenix Rising"]
+    finally:
+        release.set()
+        thread.join()
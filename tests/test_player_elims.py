@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+import graph
+from comparison import PLAYER_ELIMS_ERROR, PLAYER_MISSING_IN_API, compare_player_elims
+from models import PlayerResultStats
+from names import NameIndex
+from schemas import PlayerResult, TeamResult, empty_tiebreak_stats
+
+
+def make_team(team_name: str, players: dict[str, int]) -> TeamResult:
+    return TeamResult(
+        team_name=team_name,
+        ranking=1,
+        total_elims=sum(players.values()),
+        players=[
+            PlayerResult(player_name=name, elims=elims)
+            for name, elims in players.items()
+        ],
+        tiebreak_stats=empty_tiebreak_stats(),
+    )
+
+
+def lobby_lookup(player_kills: dict[int, tuple[str, int]]):
+    lobby = NameIndex(0.75)
+    for uid, (player_name, _) in player_kills.items():
+        lobby.upsert("player_result_stats", str(uid), player_name)
+    return lobby.lookup
+
+
+def compare(teams, player_kills):
+    errors = compare_player_elims(teams, player_kills, lobby_lookup(player_kills))
+    return [(error.error_type, error.team, error.original_data) for error in errors]
+
+
+def test_matching_players_report_nothing():
+    player_kills = {1: ("alpha1", 3), 2: ("alpha2", 2)}
+
+    assert compare([make_team("Alpha", {"alpha1": 3, "alpha2": 2})], player_kills) == []
+
+
+def test_elims_mismatch_is_type_6():
+    player_kills = {1: ("alpha1", 4), 2: ("alpha2", 2)}
+
+    assert compare([make_team("Alpha", {"alpha1": 3, "alpha2": 2})], player_kills) == [
+        (PLAYER_ELIMS_ERROR, "Alpha / alpha1", 4)
+    ]
+
+
+def test_unknown_player_is_type_7():
+    player_kills = {1: ("alpha1", 3)}
+
+    assert compare([make_team("Alpha", {"alpha1": 3, "zulu9": 1})], player_kills) == [
+        (PLAYER_MISSING_IN_API, "Alpha / zulu9", "API 中不存在")
+    ]
+
+
+def test_fuzzy_match_checks_the_registered_name():
+    player_kills = {1: ("ShadowHunter", 5)}
+
+    assert compare([make_team("Alpha", {"ShadowHunte": 5})], player_kills) == []
+    assert compare([make_team("Alpha", {"ShadowHunte": 4})], player_kills) == [
+        (PLAYER_ELIMS_ERROR, "Alpha / ShadowHunter", 5)
+    ]
+
+
+def test_duplicate_names_pair_by_elims():
+    player_kills = {1: ("ace", 2), 2: ("ace", 5)}
+    teams = [make_team("Alpha", {"ace": 5}), make_team("Bravo", {"ace": 2})]
+
+    assert compare(teams, player_kills) == []
+
+
+def test_duplicate_name_mismatch_names_the_row():
+    player_kills = {1: ("ace", 2), 2: ("ace", 5)}
+    teams = [make_team("Alpha", {"ace": 5}), make_team("Bravo", {"ace": 3})]
+
+    assert compare(teams, player_kills) == [
+        (PLAYER_ELIMS_ERROR, "Bravo / ace", "2（重名选手，uid 1）")
+    ]
+
+
+def test_two_players_matching_one_row_are_flagged():
+    player_kills = {1: ("ShadowHunter", 5)}
+    teams = [make_team("Alpha", {"ShadowHunter": 5, "ShadowHunte": 5})]
+
+    assert compare(teams, player_kills) == [
+        (
+            PLAYER_MISSING_IN_API,
+            "Alpha / ShadowHunte",
+            "与 ShadowHunter 匹配到同一选手 ShadowHunter",
+        )
+    ]
+
+
+def test_get_player_kills_keeps_duplicate_names(pipeline):
+    with Session(pipeline.bind) as session:
+        session.add_all(
+            [
+                PlayerResultStats(war_id="g1", uid=1, player_name="ace", total_kill=2),
+                PlayerResultStats(war_id="g1", uid=2, player_name="ace", total_kill=5),
+                PlayerResultStats(war_id="g2", uid=3, player_name="ace", total_kill=9),
+            ]
+        )
+        session.commit()
+
+        assert graph.get_player_kills(session, "g1") == {1: ("ace", 2), 2: ("ace", 5)}
+
+
+@pytest.mark.parametrize(
+    "rows, expected",
+    [
+        ({}, []),
+        (
+            {"alpha1": 3, "alpha2": 1, "bravo1": 1, "bravo2": 0},
+            [(PLAYER_ELIMS_ERROR, "Alpha / alpha2", 1)],
+        ),
+    ],
+)
+def test_check_compares_player_elims(pipeline, make_screenshot, rows, expected):
+    with Session(pipeline.bind) as session:
+        session.add_all(
+            PlayerResultStats(war_id="g1", uid=uid, player_name=name, total_kill=kill)
+            for uid, (name, kill) in enumerate(rows.items())
+        )
+        session.commit()
+
+    error_list = asyncio.run(
+        graph.acheck("g1", 1, uploads=[("g1_rank_1.png", make_screenshot(61))])
+    )
+
+    assert [
+        (error.error_type, error.team, error.original_data)
+        for error in error_list.errors
+    ] == expected
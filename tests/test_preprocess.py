@@ -0,0 +1,95 @@
+import io
+
+import pytest
+from PIL import Image
+
+from preprocess import PreprocessOptions, detect_mime_type, preprocess_image
+
+
+def open_image(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+@pytest.mark.parametrize(
+    "name, mime_type",
+    [
+        ("scoreboard_4k.png", "image/png"),
+        ("small.jpg", "image/jpeg"),
+        ("small.gif", "image/gif"),
+        ("small.bmp", "image/bmp"),
+        ("small.webp", "image/webp"),
+    ],
+)
+def test_detect_mime_type(fixture_bytes, name, mime_type):
+    assert detect_mime_type(fixture_bytes(name)) == mime_type
+
+
+def test_detect_mime_type_rejects_unknown_data():
+    with pytest.raises(ValueError):
+        detect_mime_type(b"not an image")
+
+
+def test_downscale_and_reencode_4k_png(fixture_bytes):
+    data = fixture_bytes("scoreboard_4k.png")
+    image = preprocess_image(data, PreprocessOptions())
+
+    assert image.mime_type == "image/jpeg"
+    assert detect_mime_type(image.data) == "image/jpeg"
+    assert open_image(image.data).size == (1920, 1080)
+    assert image.original_size == len(data)
+    assert image.bytes_saved == len(data) - len(image.data)
+
+
+def test_crop_to_scoreboard_region(fixture_bytes):
+    options = PreprocessOptions(crop=(0.25, 0.0, 0.75, 0.5), format="ORIGINAL")
+    image = preprocess_image(fixture_bytes("scoreboard_4k.png"), options)
+
+    # 裁剪后 1920x1080 恰好不超过上限，不再缩放，保留 PNG 编码
+    assert image.mime_type == "image/png"
+    assert open_image(image.data).size == (1920, 1080)
+
+
+def test_crop_then_downscale(fixture_bytes):
+    options = PreprocessOptions(max_width=800, max_height=800, crop=(0, 0, 0.5, 1))
+    image = preprocess_image(fixture_bytes("scoreboard_4k.png"), options)
+
+    # 1920x2160 按比例缩放到高度 800
+    assert open_image(image.data).size == (711, 800)
+
+
+def test_reencode_as_webp(fixture_bytes):
+    image = preprocess_image(
+        fixture_bytes("scoreboard_4k.png"), PreprocessOptions(format="WEBP")
+    )
+
+    assert image.mime_type == "image/webp"
+    assert detect_mime_type(image.data) == "image/webp"
+
+
+def test_original_format_passes_small_image_through(fixture_bytes):
+    data = fixture_bytes("small.gif")
+    image = preprocess_image(data, PreprocessOptions(format="ORIGINAL"))
+
+    assert image.data == data
+    assert image.mime_type == "image/gif"
+    assert image.bytes_saved == 0
+
+
+def test_keeps_original_when_reencode_is_larger(fixture_bytes):
+    data = fixture_bytes("small.webp")
+    image = preprocess_image(data, PreprocessOptions(format="JPEG", quality=100))
+
+    assert image.data == data
+    assert image.mime_type == "image/webp"
+
+
+def test_output_is_deterministic(fixture_bytes):
+    data = fixture_bytes("scoreboard_4k.png")
+    options = PreprocessOptions(crop=(0.1, 0.1, 0.9, 0.9))
+
+    assert preprocess_image(data, options) == preprocess_image(data, options)
+
+
+def test_rejects_unsupported_format(fixture_bytes):
+    with pytest.raises(ValueError):
+        preprocess_image(fixture_bytes("small.jpg"), PreprocessOptions(format="TIFF"))
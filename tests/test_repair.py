@@ -0,0 +1,26 @@
+import asyncio
+
+import graph
+
+
+def test_rejected_repair_answers_are_not_cached(pipeline, monkeypatch, make_screenshot):
+    # Alpha 的 total_elims 与选手淘汰数之和不符，每次重新提取都得到同样的错误回答
+    pipeline.llm.game_result.teams[0].total_elims = 6
+    monkeypatch.setattr(graph, "REPAIR_MAX_ROUNDS", 2)
+    uploads = [("g1_rank_1.png", make_screenshot(10))]
+
+    def repair_calls() -> int:
+        return sum(
+            prompt.startswith(graph.REPAIR_TEAM_PROMPT.format(team_name="Alpha"))
+            for prompt in pipeline.llm.prompts
+        )
+
+    asyncio.run(graph.acheck("g1", 1, uploads=uploads))
+    # 首次解析 1 次，两轮修复各重新提取 1 次
+    assert len(pipeline.llm.prompts) == 3
+    assert repair_calls() == 2
+
+    asyncio.run(graph.acheck("g1", 1, uploads=uploads))
+    # 首次解析命中缓存，修复仍然重新询问模型
+    assert len(pipeline.llm.prompts) == 5
+    assert repair_calls() == 4
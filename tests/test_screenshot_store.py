@@ -0,0 +1,118 @@
+import os
+
+import fakeredis
+import pytest
+
+from parse_cache import RedisParseCache
+from screenshot_store import (
+    RedisScreenshotStore,
+    ScreenshotStore,
+    create_screenshot_store,
+)
+from storage import LocalBlobStorage
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RedisScreenshotStore(
+        client=fakeredis.FakeRedis(decode_responses=True),
+        blobs=LocalBlobStorage(str(tmp_path / "blobs")),
+        retention_seconds=3600,
+        max_bytes=1024**2,
+        prefix="test:",
+    )
+
+
+def lock_held(store: RedisScreenshotStore) -> bool:
+    return store.client.exists(store._lock_key) == 1
+
+
+def test_blobs_are_uploaded_before_taking_the_lock(store, monkeypatch):
+    put = store.blobs.put
+    held = []
+
+    def tracking_put(key, content):
+        held.append(lock_held(store))
+        put(key, content)
+
+    monkeypatch.setattr(store.blobs, "put", tracking_put)
+    store.save("g1", [("g1_rank_1.png", b"one"), ("g1_rank_2.png", b"two")])
+
+    assert held == [False, False]
+    assert store.load("g1") == [("g1_rank_1.png", b"one"), ("g1_rank_2.png", b"two")]
+
+
+def test_known_blob_removed_by_gc_during_upload_is_uploaded_again(store, monkeypatch):
+    store.save("old", [("old_rank_1.png", b"shared")])
+    # 让旧比赛过期，下次清理时删除它引用的截图
+    store.client.zadd(store._games_key, {"old": 0})
+
+    put = store.blobs.put
+    gc_runs = []
+
+    def put_then_gc(key, content):
+        put(key, content)
+        # 上传新截图期间其它主机执行了一次清理
+        if content == b"new" and not gc_runs:
+            gc_runs.append(store.gc())
+
+    monkeypatch.setattr(store.blobs, "put", put_then_gc)
+    store.save("g2", [("g2_rank_1.png", b"shared"), ("g2_rank_2.png", b"new")])
+
+    assert store.load("g2") == [
+        ("g2_rank_1.png", b"shared"),
+        ("g2_rank_2.png", b"new"),
+    ]
+    assert gc_runs == [1]
+    assert store.load("old") == []
+
+
+@pytest.fixture
+def local_store(tmp_path):
+    return ScreenshotStore(
+        root=str(tmp_path / "store"), retention_seconds=3600, max_bytes=1024**2
+    )
+
+
+def blob_files(store: ScreenshotStore) -> list[str]:
+    return sorted(
+        name
+        for _, _, names in os.walk(os.path.join(store.root, "blobs"))
+        for name in names
+    )
+
+
+def test_same_bytes_with_another_extension_reuse_the_blob(local_store):
+    local_store.save("g1", [("g1_rank_1.png", b"same")])
+    local_store.save("g2", [("g2_rank_1.jpg", b"same")])
+
+    assert len(blob_files(local_store)) == 1
+    assert local_store.load("g2") == [("g2_rank_1.png", b"same")]
+    assert local_store.gc() == 0
+
+
+def test_import_refuses_the_store_directory(local_store):
+    with pytest.raises(ValueError):
+        local_store.import_directory(local_store.root)
+
+
+def test_default_root_is_not_the_legacy_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("SCREENSHOT_STORE_PATH", raising=False)
+    (tmp_path / "images").mkdir()
+    (tmp_path / "images" / "g1_rank_1.png").write_bytes(b"legacy")
+
+    store = create_screenshot_store()
+
+    assert os.path.realpath(store.root) == str(tmp_path / "images" / "store")
+    assert store.import_directory("./images") == 1
+    assert store.load("g1") == [("g1_rank_1.png", b"legacy")]
+    assert sorted(os.listdir(tmp_path / "images")) == ["g1_rank_1.png", "store"]
+
+
+def test_redis_backends_share_the_base_initialisation(store):
+    cache = RedisParseCache(fakeredis.FakeRedis(decode_responses=True), 60)
+
+    assert store.root is None and store._last_gc == 0.0
+    assert store._gc_lock is not None
+    assert cache.path is None and cache.ttl_seconds == 60
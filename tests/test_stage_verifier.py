@@ -0,0 +1,194 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from models import Base, MatchRanking, StageRanking
+from stage_verifier import StageMismatch, compute_stage_standings, verify_stage
+
+BASE_TIME = datetime(2026, 10, 1, 12, 0)
+STAGE = 3
+
+
+def reference_standings(rows) -> dict[str, dict]:
+    """逐行累加的参照实现：{队伍名: 总分、同分键和并列的排名区间}"""
+    teams: dict[str, dict] = {}
+    for team_name, ingame_rank, kill_pts, place_pts, total_pts, created_at, id_ in rows:
+        team = teams.setdefault(
+            team_name,
+            {
+                "stage_total_pts": 0,
+                "total_kill_pts": 0,
+                "total_place_pts": 0,
+                "wwcd": 0,
+                "max_pts": 0,
+                "max_kill": 0,
+                "last": None,
+            },
+        )
+        team["stage_total_pts"] += total_pts
+        team["total_kill_pts"] += kill_pts
+        team["total_place_pts"] += place_pts
+        team["wwcd"] += ingame_rank == 1
+        team["max_pts"] = max(team["max_pts"], total_pts)
+        team["max_kill"] = max(team["max_kill"], kill_pts)
+        if team["last"] is None or (created_at, id_) > team["last"][0]:
+            team["last"] = ((created_at, id_), total_pts, kill_pts, place_pts)
+
+    def key(team: dict) -> tuple:
+        return (
+            team["stage_total_pts"],
+            team["wwcd"],
+            team["total_kill_pts"],
+            team["max_pts"],
+            team["max_kill"],
+            *team["last"][1:],
+        )
+
+    for team in teams.values():
+        keys = [key(other) for other in teams.values()]
+        team["rank"] = 1 + sum(other > key(team) for other in keys)
+        team["rank_low"] = sum(other >= key(team) for other in keys)
+    return teams
+
+
+def seed_stage(session: Session, seed: int) -> list[tuple]:
+    """
+    随机生成一个赛段：Echo 与 Delta 每场成绩完全相同（完全并列），
+    Foxtrot 与 Delta 总分相同但最后一场不同（靠同分规则区分）
+    """
+    rng = random.Random(seed)
+    teams = ["Alpha", "Bravo", "Charlie", "Delta", "Echo", "Foxtrot", "Golf"]
+    for match in range(6):
+        war_id = f"s{STAGE}m{match}"
+        # 同一场的行 created_at 相同，最后一场由 id 决定
+        created_at = BASE_TIME + timedelta(minutes=30 * match)
+        order = rng.sample(teams, len(teams))
+        results = {}
+        for index, team_name in enumerate(order):
+            kill_pts = rng.randint(0, 6)
+            place_pts = max(0, 10 - 2 * index)
+            results[team_name] = (index + 1, kill_pts, place_pts)
+        rank, kill_pts, place_pts = results["Delta"]
+        if match == 5:
+            kill_pts = max(kill_pts, 1)
+            results["Delta"] = (rank, kill_pts, place_pts)
+        results["Echo"] = results["Delta"]
+        # 第 4 场多一个击杀、第 5 场少一个，总分与 Delta 相同
+        shift = {4: 1, 5: -1}.get(match, 0)
+        results["Foxtrot"] = (rank, kill_pts + shift, place_pts)
+        for team_name in teams:
+            rank, kill_pts, place_pts = results[team_name]
+            session.add(
+                MatchRanking(
+                    war_id=war_id,
+                    team_name=team_name,
+                    stage=STAGE,
+                    rank=rank,
+                    ingame_rank=rank,
+                    kill_pts=kill_pts,
+                    place_pts=place_pts,
+                    total_pts=kill_pts + place_pts,
+                    created_at=created_at,
+                    updated_at=created_at,
+                )
+            )
+    session.commit()
+    return session.execute(
+        select(
+            MatchRanking.team_name,
+            MatchRanking.ingame_rank,
+            MatchRanking.kill_pts,
+            MatchRanking.place_pts,
+            MatchRanking.total_pts,
+            MatchRanking.created_at,
+            MatchRanking.id,
+        ).where(MatchRanking.stage == STAGE)
+    ).all()
+
+
+def write_stage_ranking(session: Session, reference: dict[str, dict]) -> None:
+    """按参照结果写入 StageRanking，并列的队伍依次占用并列区间内的名次"""
+    taken: dict[int, int] = {}
+    for team_name in sorted(reference):
+        team = reference[team_name]
+        rank = team["rank"] + taken.get(team["rank"], 0)
+        taken[team["rank"]] = taken.get(team["rank"], 0) + 1
+        session.add(
+            StageRanking(
+                team_name=team_name,
+                stage=STAGE,
+                rank=rank,
+                total_kill_pts=team["total_kill_pts"],
+                total_place_pts=team["total_place_pts"],
+                stage_total_pts=team["stage_total_pts"],
+            )
+        )
+    session.commit()
+
+
+@pytest.fixture
+def session():
+    bind = create_engine("sqlite://")
+    Base.metadata.create_all(bind)
+    with Session(bind) as session:
+        yield session
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_reference(session, seed):
+    rows = seed_stage(session, seed)
+    reference = reference_standings(rows)
+
+    standings = compute_stage_standings(rows)
+
+    assert sorted(standings.team_names) == sorted(reference)
+    for index, team_name in enumerate(standings.team_names):
+        team = reference[team_name]
+        assert int(standings.rank[index]) == team["rank"], team_name
+        assert int(standings.rank_low[index]) == team["rank_low"], team_name
+        for field in ("stage_total_pts", "total_kill_pts", "total_place_pts"):
+            assert int(getattr(standings, field)[index]) == team[field]
+    # Echo 与 Delta 完全并列，Foxtrot 与 Delta 总分相同但名次不同
+    assert reference["Echo"]["rank"] == reference["Delta"]["rank"]
+    assert reference["Delta"]["rank_low"] == reference["Delta"]["rank"] + 1
+    assert (
+        reference["Foxtrot"]["stage_total_pts"] == reference["Delta"]["stage_total_pts"]
+    )
+    assert reference["Foxtrot"]["rank"] != reference["Delta"]["rank"]
+
+
+def test_verify_stage_accepts_written_standings(session):
+    reference = reference_standings(seed_stage(session, 1))
+    write_stage_ranking(session, reference)
+
+    assert verify_stage(session, STAGE) == []
+
+
+def test_verify_stage_reports_differences(session):
+    reference = reference_standings(seed_stage(session, 1))
+    write_stage_ranking(session, reference)
+    foxtrot = session.scalars(
+        select(StageRanking).where(StageRanking.team_name == "Foxtrot")
+    ).one()
+    recorded_rank = foxtrot.rank
+    foxtrot.rank = reference["Delta"]["rank"]
+    foxtrot.stage_total_pts += 1
+    session.add(StageRanking(team_name="Hotel", stage=STAGE, rank=8))
+    session.commit()
+
+    mismatches = verify_stage(session, STAGE)
+
+    assert recorded_rank == reference["Foxtrot"]["rank"]
+    assert mismatches == [
+        StageMismatch("Foxtrot", "rank", recorded_rank, reference["Delta"]["rank"]),
+        StageMismatch(
+            "Foxtrot",
+            "stage_total_pts",
+            reference["Foxtrot"]["stage_total_pts"],
+            reference["Foxtrot"]["stage_total_pts"] + 1,
+        ),
+        StageMismatch("Hotel", "team", "MatchRanking 中无数据", "存在"),
+    ]
@@ -0,0 +1,148 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, text, update
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from models import MatchRanking
+from standings import StandingsCache, signature_query
+
+BASE_TIME = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def bind():
+    bind = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    MatchRanking.__table__.create(bind)
+    return bind
+
+
+@pytest.fixture
+def statements(bind):
+    executed = []
+    event.listen(
+        bind,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: executed.append(statement),
+    )
+    return executed
+
+
+def add_match(session: Session, war_id: str, minute: int, kills: dict[str, int]):
+    for rank, (team_name, kill_pts) in enumerate(kills.items(), start=1):
+        session.add(
+            MatchRanking(
+                war_id=war_id,
+                team_name=team_name,
+                stage=1,
+                rank=rank,
+                ingame_rank=rank,
+                kill_pts=kill_pts,
+                place_pts=10 - rank,
+                total_pts=kill_pts + 10 - rank,
+                created_at=BASE_TIME + timedelta(minutes=minute),
+                updated_at=BASE_TIME + timedelta(minutes=minute),
+            )
+        )
+    session.commit()
+
+
+def test_probe_is_rate_limited(bind, statements):
+    cache = StandingsCache(max_age_seconds=600, probe_interval_seconds=60)
+    with Session(bind) as session:
+        add_match(session, "w1", 0, {"Alpha": 3, "Bravo": 1})
+        assert cache.get(session, 1)["Alpha"]["stage_total_kill"] == 3
+
+        statements.clear()
+        add_match(session, "w2", 1, {"Alpha": 2, "Bravo": 4})
+        statements.clear()
+        # 探测间隔内直接返回内存中的数据，不访问数据库
+        assert cache.get(session, 1)["Alpha"]["stage_total_kill"] == 3
+        assert statements == []
+
+
+def test_new_rows_are_added_incrementally(bind, statements):
+    cache = StandingsCache(max_age_seconds=600, probe_interval_seconds=0)
+    with Session(bind) as session:
+        add_match(session, "w1", 0, {"Alpha": 3, "Bravo": 1})
+        cache.get(session, 1)
+
+        add_match(session, "w2", 1, {"Bravo": 4, "Alpha": 2})
+        statements.clear()
+        stats = cache.get(session, 1)
+
+    assert stats["Alpha"]["stage_total_kill"] == 5
+    assert stats["Alpha"]["wwcd_count"] == 1
+    assert stats["Bravo"]["wwcd_count"] == 1
+    assert stats["Bravo"]["last_match_total_kill"] == 4
+    # 一次探测 + 一次只取新行的查询
+    assert len(statements) == 2
+    assert "match_ranking.id >" in statements[1]
+
+
+def test_modified_rows_rebuild_stage(bind):
+    cache = StandingsCache(max_age_seconds=600, probe_interval_seconds=0)
+    with Session(bind) as session:
+        add_match(session, "w1", 0, {"Alpha": 3, "Bravo": 1})
+        cache.get(session, 1)
+
+        session.execute(
+            update(MatchRanking)
+            .where(MatchRanking.team_name == "Alpha")
+            .values(kill_pts=7, updated_at=BASE_TIME + timedelta(hours=1))
+        )
+        session.commit()
+        assert cache.get(session, 1)["Alpha"]["stage_total_kill"] == 7
+
+
+def test_readers_do_not_wait_for_a_running_refresh(bind, monkeypatch):
+    cache = StandingsCache(max_age_seconds=600, probe_interval_seconds=0)
+    with Session(bind) as session:
+        add_match(session, "w1", 0, {"Alpha": 3, "Bravo": 1})
+        cache.get(session, 1)
+
+    refreshing = threading.Event()
+    release = threading.Event()
+    sync = cache._sync
+
+    def slow_sync(*args):
+        refreshing.set()
+        release.wait(5)
+        return sync(*args)
+
+    monkeypatch.setattr(cache, "_sync", slow_sync)
+
+    def refresh():
+        with Session(bind) as session:
+            cache.get(session, 1)
+
+    thread = threading.Thread(target=refresh)
+    thread.start()
+    try:
+        assert refreshing.wait(5)
+        # 另一个线程正在刷新同一赛段时，读取直接返回已有数据
+        with Session(bind) as session:
+            assert cache.get(session, 1)["Alpha"]["stage_total_kill"] == 3
+    finally:
+        release.set()
+        thread.join()
+
+
+def test_signature_query_uses_covering_index(bind):
+    sql = str(signature_query(1).compile(bind, compile_kwargs={"literal_binds": True}))
+    with bind.connect() as conn:
+        plans = [
+            row["detail"]
+            for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).mappings()
+        ]
+
+    assert plans
+    assert all(
+        "COVERING INDEX ix_match_ranking_stage_updated" in plan for plan in plans
+    )
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_main_has_no_side_effects(tmp_path):
+    # main 按相对路径挂载 static 目录
+    (tmp_path / "static").mkdir()
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(("PARSE_CACHE_", "SCREENSHOT_", "JOB_", "DIGITS_"))
+    }
+    env.update(
+        PYTHONPATH=REPO_DIR,
+        STORAGE_BACKEND="local",
+        # 模板目录不存在，导入时加载就会失败
+        DIGITS_TEMPLATES_DIR=str(tmp_path / "missing"),
+        DIGITS_LAYOUT_PATH=str(tmp_path / "missing.json"),
+    )
+
+    subprocess.run(
+        [sys.executable, "-c", "import main"], cwd=tmp_path, env=env, check=True
+    )
+
+    # 默认的 ./cache 和 ./images 都不应在导入时创建
+    assert os.listdir(tmp_path) == ["static"]
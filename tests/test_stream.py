@@ -0,0 +1,47 @@
+import hashlib
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+from history import check_history
+
+
+def parse_events(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_stream_check_with_uploaded_screenshots(pipeline, make_screenshot):
+    screenshots = {
+        "g1_rank_1.png": make_screenshot(1),
+        "g1_rank_2.png": make_screenshot(2),
+    }
+    client = TestClient(main.app)
+
+    response = client.post(
+        "/upload/stream",
+        data={"game_id": "g1", "stage": "1"},
+        files=[
+            ("files", (name, content, "image/png"))
+            for name, content in screenshots.items()
+        ],
+    )
+
+    assert response.status_code == 200
+    events = parse_events(response.text)
+    names = [event for event, _ in events]
+    assert "error" not in names
+    assert names[-2:] == ["errors", "done"]
+    assert names.count("parsed_image") == 2
+    assert events[-2][1] == {"errors": []}
+
+    record = check_history._buffer[-1]
+    assert record["game_id"] == "g1"
+    assert record["input_hashes"] == [
+        {"name": name, "sha256": hashlib.sha256(content).hexdigest()}
+        for name, content in screenshots.items()
+    ]
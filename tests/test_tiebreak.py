@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+import graph
+
+
+def test_tiebreak_stats_failure_fails_the_check(pipeline, make_screenshot, monkeypatch):
+    def broken(session, stage):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(graph.standings_cache, "get", broken)
+
+    with Session(pipeline.bind) as session, pytest.raises(RuntimeError):
+        graph.get_tiebreak_stats(session, ["Alpha", "Bravo"], 1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(
+            graph.acheck("g1", 1, uploads=[("g1_rank_1.png", make_screenshot(41))])
+        )
@@ -0,0 +1,107 @@
+from dataclasses import dataclass, field
+
+from comparison import normalize_team_name
+from schemas import GameResult, TeamResult
+
+
+@dataclass
+class ValidationReport:
+    """
+    解析结果的自洽性检查结果：
+    suspect_teams 为需要单独重新提取的队伍（淘汰数与选手之和不符，或排名重复），
+    missing_rankings 为 1..N 中没有任何队伍占据的排名。
+    """
+
+    suspect_teams: list[str] = field(default_factory=list)
+    missing_rankings: list[int] = field(default_factory=list)
+    extra_teams: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not self.suspect_teams and not self.missing_rankings
+
+    def describe(self) -> str:
+        parts = []
+        if self.suspect_teams:
+            parts.append(f"可疑队伍 {self.suspect_teams}")
+        if self.missing_rankings:
+            parts.append(f"缺失排名 {self.missing_rankings}")
+        if self.extra_teams:
+            parts.append(f"比预期多出 {self.extra_teams} 支队伍")
+        return ", ".join(parts) or "无问题"
+
+
+def elims_consistent(team_result: TeamResult) -> bool:
+    return not team_result.players or team_result.total_elims == sum(
+        player.elims for player in team_result.players
+    )
+
+
+def validate_game_result(
+    game_result: GameResult, expected_team_count: int | None = None
+) -> ValidationReport:
+    """
+    检查解析结果：
+    1) 每支队伍的 total_elims 等于选手淘汰数之和
+    2) 排名恰好覆盖 1..N 且不重复
+    3) 队伍数与 API 中的队伍数一致（expected_team_count 为 None 时不检查）
+    """
+    report = ValidationReport()
+    teams = game_result.teams
+
+    by_ranking: dict[int, list[str]] = {}
+    for team_result in teams:
+        by_ranking.setdefault(team_result.ranking, []).append(team_result.team_name)
+
+    suspects = {
+        team_result.team_name
+        for team_result in teams
+        if not elims_consistent(team_result)
+    }
+    for names in by_ranking.values():
+        if len(names) > 1:
+            suspects.update(names)
+    report.suspect_teams = sorted(suspects)
+
+    team_count = max(len(teams), expected_team_count or 0)
+    report.missing_rankings = [
+        ranking for ranking in range(1, team_count + 1) if ranking not in by_ranking
+    ]
+    if expected_team_count is not None and len(teams) > expected_team_count:
+        report.extra_teams = len(teams) - expected_team_count
+    return report
+
+
+def apply_team_repair(
+    game_result: GameResult, team_name: str, candidates: list[TeamResult]
+) -> bool:
+    """用重新提取的结果替换指定队伍，只接受淘汰数自洽的结果。返回是否替换"""
+    key = normalize_team_name(team_name)
+    for candidate in candidates:
+        if normalize_team_name(candidate.team_name) != key:
+            continue
+        if not elims_consistent(candidate):
+            continue
+        for index, team_result in enumerate(game_result.teams):
+            if normalize_team_name(team_result.team_name) == key:
+                game_result.teams[index] = candidate
+                return True
+    return False
+
+
+def apply_missing_repair(
+    game_result: GameResult, missing_rankings: list[int], candidates: list[TeamResult]
+) -> int:
+    """补充缺失排名的队伍，跳过已存在的队伍和排名不在缺失列表中的结果。返回补充数量"""
+    existing = {normalize_team_name(team.team_name) for team in game_result.teams}
+    missing = set(missing_rankings)
+    added = 0
+    for candidate in candidates:
+        key = normalize_team_name(candidate.team_name)
+        if key in existing or candidate.ranking not in missing:
+            continue
+        game_result.teams.append(candidate)
+        existing.add(key)
+        missing.discard(candidate.ranking)
+        added += 1
+    return added
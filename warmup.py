@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Callable
+
+from loguru import logger
+from sqlalchemy import text
+
+from digits import get_digit_recognizer
+from graph import get_game_result_llm, get_graph, new_session
+from models import get_engine
+from parse_cache import get_parse_cache
+from screenshot_store import get_screenshot_store
+from storage import ping_shared_storage
+
+
+def ping_database():
+    with new_session() as session:
+        session.execute(text("SELECT 1"))
+
+
+class Warmup:
+    """
+    服务启动后在后台依次初始化各个组件，记录每个组件是否就绪、耗时和失败原因。
+    组件本身都是惰性创建的，预热只是让第一个请求不必承担初始化开销。
+    """
+
+    def __init__(self, components: dict[str, Callable[[], object]]):
+        self.components = components
+        self._status = {
+            name: {"ready": False, "seconds": None, "error": None}
+            for name in components
+        }
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="warmup")
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def run(self):
+        for name, factory in self.components.items():
+            if self._status[name]["ready"]:
+                continue
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(factory)
+            except Exception as e:
+                logger.warning(f"预热 {name} 失败: {e!r}")
+                self._status[name].update(error=repr(e))
+                continue
+            seconds = time.perf_counter() - start
+            self._status[name].update(ready=True, seconds=seconds, error=None)
+            logger.info(f"预热 {name} 完成，耗时 {seconds:.3f}s")
+
+    @property
+    def ready(self) -> bool:
+        return all(status["ready"] for status in self._status.values())
+
+    def status(self) -> dict[str, dict]:
+        return {name: dict(status) for name, status in self._status.items()}
+
+
+warmup = Warmup(
+    {
+        "engine": get_engine,
+        "database": ping_database,
+        "llm": get_game_result_llm,
+        "graph": get_graph,
+        "storage": ping_shared_storage,
+        "parse_cache": get_parse_cache,
+        "screenshot_store": get_screenshot_store,
+        "digits": get_digit_recognizer,
+    }
+)